@@ -0,0 +1,59 @@
+"""
+Benchmark of the backtesting parameter sweeps
+
+Times the replay of a synthetic price history (one row per trading day)
+against every parameter set of a strategy grid, the prices being shared
+between the processes.
+
+    python benchmarks/bench_backtest.py --years 20 --assets 20 --sets 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from investporto.backtest import parameter_grid, sweep
+
+
+def bench(years: int, assets: int, sets: int, jobs: int, strategy: str):
+    generator = np.random.default_rng(0)
+    days = years * 252
+    prices = np.exp(generator.normal(0.0003, 0.01, (days, assets)).cumsum(axis=0))
+    target = np.full(assets, 1.0 / assets)
+    if strategy == "trend":
+        grid = {"window": np.arange(sets) % 250 + 20, "every": [5]}
+    elif strategy == "periodic":
+        grid = {"every": np.arange(sets) + 1}
+    else:
+        grid = {"band": np.linspace(0.001, 0.2, sets)}
+    combinations = parameter_grid(grid)
+    start = time.perf_counter()
+    results = sweep(prices, target, strategy, combinations, 1e6, 0.001, jobs)
+    seconds = time.perf_counter() - start
+    best = max(result["final_value"] for result in results)
+    print(f"{len(combinations)} {strategy} sets x {years} years x {assets} assets")
+    print(f"    {'sweep':<30} {seconds * 1000:10.1f} ms")
+    print(f"    {'per parameter set':<30} {seconds * 1000 / len(results):10.1f} ms")
+    print(f"    {'best final value':<30} {best:10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--assets", type=int, default=20)
+    parser.add_argument("--sets", type=int, default=100)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--strategy", default="threshold")
+    arguments = parser.parse_args()
+    bench(
+        arguments.years,
+        arguments.assets,
+        arguments.sets,
+        arguments.jobs,
+        arguments.strategy,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of the export
+
+Times the flattening of a synthetic plan (one symbol per leaf) with its
+valued positions, and its writing in every available format.
+
+    python benchmarks/bench_export.py --assets 10000 100000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from investporto.export_cli import export_chunk_rows, export_frame, writers
+from investporto.plan_analytics import compute_drift
+from investporto.plan_tree import PlanNode
+
+
+def synthetic_portfolio(assets: int, fan_out: int = 100):
+    """Plan of ``assets`` leaves below ``fan_out`` classes, random positions"""
+    root = PlanNode("entry")
+    classes = [
+        PlanNode(f"class_{number}", root, percentage=100 / fan_out)
+        for number in range(fan_out)
+    ]
+    paths = []
+    for number in range(assets):
+        asset_class = classes[number % fan_out]
+        PlanNode(f"asset_{number}", asset_class, percentage=100 * fan_out / assets)
+        paths.append(f"{asset_class.name}/asset_{number}")
+    generator = np.random.default_rng(0)
+    quantity = generator.integers(1, 100, assets).astype(float)
+    price = generator.uniform(1, 500, assets)
+    positions = pd.DataFrame(
+        {
+            "symbol": [f"SYM{number}" for number in range(assets)],
+            "path": paths,
+            "quantity": quantity,
+            "invested": quantity * price,
+            "last_price": price,
+            "value": quantity * price,
+            "lot_size": np.ones(assets),
+            "currency": ["EUR"] * assets,
+        }
+    )
+    return root, positions
+
+
+def bench(assets: int):
+    root, positions = synthetic_portfolio(assets)
+    start = time.perf_counter()
+    frame = export_frame(compute_drift(root, positions), positions)
+    print(f"{assets} assets, {len(frame)} rows")
+    print(f"    {'flatten':<30} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    with tempfile.TemporaryDirectory() as folder:
+        for name, writer in writers.items():
+            start = time.perf_counter()
+            try:
+                writer(frame, Path(folder) / f"export.{name}", export_chunk_rows)
+            except click.UsageError as error:
+                print(f"    {name}: skipped ({error})")
+                continue
+            seconds = time.perf_counter() - start
+            print(f"    {'write ' + name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, nargs="+", default=[10000, 100000])
+    arguments = parser.parse_args()
+    for assets in arguments.assets:
+        bench(assets)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the transaction ledger
+
+Times the bulk import of a synthetic history, the load of the memory-mapped
+segments and the aggregation into positions, before and after compaction.
+
+    python benchmarks/bench_holdings.py --transactions 100000 1000000
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from investporto.holdings_cli import Ledger
+
+
+def synthetic_history(transactions: int, symbols: int = 500) -> pd.DataFrame:
+    """Random buys and sales of ``symbols`` symbols over ten years"""
+    generator = np.random.default_rng(0)
+    days = np.datetime64("2012-01-01") + generator.integers(0, 3650, transactions)
+    return pd.DataFrame(
+        {
+            "date": days,
+            "symbol": [f"SYM{number}" for number in range(symbols)]
+            * (transactions // symbols)
+            + [f"SYM{number}" for number in range(transactions % symbols)],
+            "quantity": generator.integers(-5, 20, transactions).astype(float),
+            "price": generator.uniform(10, 500, transactions),
+        }
+    )
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(transactions: int):
+    history = synthetic_history(transactions)
+    with tempfile.TemporaryDirectory() as project:
+        results = {
+            "bulk import": timed(lambda: Ledger(project).extend(history), repeat=1)
+        }
+        results["load (journal)"] = timed(lambda: Ledger(project).transactions())
+        results["positions (journal)"] = timed(lambda: Ledger(project).positions())
+        results["compaction"] = timed(lambda: Ledger(project).compact(), repeat=1)
+        results["load (segment)"] = timed(lambda: Ledger(project).transactions())
+        results["positions (segment)"] = timed(lambda: Ledger(project).positions())
+        ledger = Ledger(project)
+        results["single append"] = timed(lambda: ledger.append("SYM0", 1, 100.0))
+    print(f"{transactions} transactions")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--transactions", type=int, nargs="+", default=[100000, 1000000]
+    )
+    arguments = parser.parse_args()
+    for transactions in arguments.transactions:
+        bench(transactions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of the portfolio optimization
+
+Times the covariance estimation (cold and cached) out of a synthetic price
+history and each optimization method.
+
+    python benchmarks/bench_optimization.py --assets 500 2000
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from investporto.optimization import estimate, methods, optimal_weights
+from investporto.prices_cli import PriceStore
+
+
+def timed(function, repeat: int = 1) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(assets: int, years: int = 3):
+    days = np.datetime64("2019-01-01") + np.arange(365 * years)
+    generator = np.random.default_rng(0)
+    factors = generator.normal(0, 0.01, (len(days), 5))
+    loadings = generator.normal(0, 0.3, (5, assets))
+    returns = factors @ loadings + generator.normal(0, 0.01, (len(days), assets))
+    prices = np.exp(returns.cumsum(axis=0))
+    symbols = [f"SYM{number}" for number in range(assets)]
+    window = (date(2019, 1, 1), date(2019 + years, 1, 1))
+    with tempfile.TemporaryDirectory() as project:
+        store = PriceStore(project)
+        for column, symbol in enumerate(symbols):
+            store.update(symbol, days, prices[:, column], save_index=False)
+        store._save_index()
+        cache = Path(project) / "cache"
+        results = {
+            "estimation": timed(lambda: estimate(store, symbols, *window, cache)),
+            "estimation (cached)": timed(
+                lambda: estimate(store, symbols, *window, cache), repeat=3
+            ),
+        }
+        mean, covariance = estimate(store, symbols, *window, cache)
+        for method in methods:
+            results[method] = timed(lambda: optimal_weights(method, mean, covariance))
+    print(f"{assets} assets, {years} years")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, nargs="+", default=[500, 2000])
+    arguments = parser.parse_args()
+    for assets in arguments.assets:
+        bench(assets)
+
+
+if __name__ == "__main__":
+    main()
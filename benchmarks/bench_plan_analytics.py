@@ -0,0 +1,69 @@
+"""
+Benchmark of the plan analytics
+
+Times the target amounts of a synthetic plan and its drift against one
+holding per leaf.
+
+    python benchmarks/bench_plan_analytics.py --leaves 10000 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from investporto.plan_analytics import compute_drift, compute_targets
+from investporto.plan_tree import PlanNode
+
+
+def synthetic_plan(leaves: int, fan_out: int = 100):
+    """Plan of ``leaves`` leaves below ``fan_out`` classes, and their paths"""
+    root = PlanNode("entry", budget=1e6)
+    classes = [
+        PlanNode(f"class_{number}", root, percentage=100 / fan_out)
+        for number in range(fan_out)
+    ]
+    paths = []
+    for number in range(leaves):
+        asset_class = classes[number % fan_out]
+        PlanNode(f"asset_{number}", asset_class, percentage=100 * fan_out / leaves)
+        paths.append(f"{asset_class.name}/asset_{number}")
+    return root, paths
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(leaves: int):
+    root, paths = synthetic_plan(leaves)
+    holdings = pd.DataFrame(
+        {"path": paths, "value": np.random.default_rng(0).uniform(1, 100, leaves)}
+    )
+    results = {
+        "target amounts": timed(lambda: compute_targets(root)),
+        "drift": timed(lambda: compute_drift(root, holdings)),
+        "drift against the budget": timed(lambda: compute_drift(root, holdings, True)),
+    }
+    print(f"{leaves} leaves")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--leaves", type=int, nargs="+", default=[10000, 100000])
+    arguments = parser.parse_args()
+    for leaves in arguments.leaves:
+        bench(leaves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of the plan import
+
+Times the build of a plan out of a synthetic table (one row per node, ten
+classes of equal leaves) and the single write of the imported plan.
+
+    python benchmarks/bench_plan_import.py --rows 10000 50000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from investporto.plan_import import plan_from_table
+from investporto.portfolio_plan_cli import Portfolio
+from investporto.types_and_vars import portfolio_plan_name
+
+
+def synthetic_table(rows: int, fan_out: int = 10) -> pd.DataFrame:
+    """``fan_out`` classes sharing ``rows - fan_out`` leaves"""
+    leaves = rows - fan_out
+    classes = [f"class_{number}" for number in range(fan_out)]
+    per_class = [
+        leaves // fan_out + (number < leaves % fan_out) for number in range(fan_out)
+    ]
+    paths = list(classes)
+    percentages = [100 / fan_out] * fan_out
+    for asset_class, count in zip(classes, per_class):
+        paths += [f"{asset_class}/asset_{number}" for number in range(count)]
+        percentages += [100 / count] * count
+    return pd.DataFrame({"path": paths, "percentage": percentages})
+
+
+def bench(rows: int):
+    table = synthetic_table(rows)
+    with tempfile.TemporaryDirectory() as project:
+        plan_file = Path(project) / portfolio_plan_name
+        plan_file.touch()
+        csv_file = Path(project) / "plan.csv"
+        table.to_csv(csv_file, index=False)
+        start = time.perf_counter()
+        rows_read = pd.read_csv(csv_file)
+        with Portfolio(plan_file, use_cache=False) as ppn:
+            ppn.replace_plan(plan_from_table(rows_read, ppn._plan))
+        seconds = time.perf_counter() - start
+    print(f"{rows} rows")
+    print(f"    {'import (read, build, save)':<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    arguments = parser.parse_args()
+    for rows in arguments.rows:
+        bench(rows)
+
+
+if __name__ == "__main__":
+    main()
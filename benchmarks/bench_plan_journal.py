@@ -0,0 +1,68 @@
+"""
+Benchmark of the journal of plan edits
+
+Compares one small edit of a synthetic ``porto_plan.yaml`` saved as a whole
+with the same edit appended to the journal, and the load of the plan with a
+full journal to replay.
+
+    python benchmarks/bench_plan_journal.py --nodes 10000 100000
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+from pathlib import Path
+
+import yaml
+
+from investporto.plan_journal import journal_max_records
+from investporto.portfolio_plan_cli import Portfolio, YamlDumper
+from investporto.types_and_vars import portfolio_plan_name
+
+from bench_plan_load import synthetic_plan, timed
+
+
+def bench(nodes: int):
+    with tempfile.TemporaryDirectory() as project:
+        project_plan = Path(project) / portfolio_plan_name
+        with open(project_plan, "w") as portfolio_plan_file:
+            yaml.dump(synthetic_plan(nodes), portfolio_plan_file, Dumper=YamlDumper)
+
+        def edit(use_journal: bool):
+            with Portfolio(project_plan, use_cache=True, use_journal=use_journal) as p:
+                p.allocate_budget(p._plan.budget + 1)
+
+        def load():
+            with Portfolio(project_plan, use_cache=True, read_only=True):
+                pass
+
+        # Prime the cache (and create the journal)
+        edit(True)
+        results = {
+            "edit, whole plan saved": timed(lambda: edit(False)),
+            "edit, journaled": timed(lambda: edit(True)),
+        }
+        results["load, 2 journaled edits"] = timed(load)
+        # Fill the journal up to the folding threshold
+        with Portfolio(
+            project_plan, use_cache=True, use_journal=True
+        ) as p, contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(journal_max_records - 1 - p._journal.records):
+                p.allocate_budget(p._plan.budget + 1)
+        results[f"load, {journal_max_records - 1} edits"] = timed(load)
+    print(f"{nodes} nodes")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 100000])
+    arguments = parser.parse_args()
+    for nodes in arguments.nodes:
+        bench(nodes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of the portfolio plan loading
+
+Compares the cold load of a synthetic ``porto_plan.yaml`` (pure python yaml
+loader, libyaml loader) with the warm load out of the binary sidecar cache.
+
+    python benchmarks/bench_plan_load.py --nodes 10000 100000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from investporto.portfolio_plan_cli import Portfolio, YamlDumper
+from investporto.types_and_vars import portfolio_plan_name
+
+
+def synthetic_plan(nodes: int, fan_out: int = 10) -> dict:
+    """Build a plan dict of (about) ``nodes`` nodes, ``fan_out`` children each"""
+    root = {"name": "entry", "budget": 100000.0, "children": []}
+    frontier = [root]
+    created = 1
+    while created < nodes:
+        parent = frontier.pop(0)
+        for number in range(min(fan_out, nodes - created)):
+            child = {"name": f"asset_{created}", "percentage": 100.0 / fan_out}
+            parent.setdefault("children", []).append(child)
+            frontier.append(child)
+            created += 1
+    return root
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(nodes: int):
+    with tempfile.TemporaryDirectory() as project:
+        project_plan = Path(project) / portfolio_plan_name
+        with open(project_plan, "w") as portfolio_plan_file:
+            yaml.dump(synthetic_plan(nodes), portfolio_plan_file, Dumper=YamlDumper)
+
+        def pure_python_load():
+            with open(project_plan, "r") as portfolio_plan_file:
+                yaml.load(portfolio_plan_file, Loader=yaml.SafeLoader)
+
+        def cold_load():
+            with Portfolio(project_plan, use_cache=False, read_only=True):
+                pass
+
+        def warm_load():
+            with Portfolio(project_plan, use_cache=True, read_only=True):
+                pass
+
+        # Prime the cache
+        warm_load()
+        results = {
+            "yaml.SafeLoader parse only": timed(pure_python_load, repeat=1),
+            "cold load": timed(cold_load),
+            "warm load (cache)": timed(warm_load),
+        }
+    print(f"{nodes} nodes")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 100000])
+    arguments = parser.parse_args()
+    for nodes in arguments.nodes:
+        bench(nodes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of the plan tree representation
+
+Compares memory and throughput of the generic ``anytree.Node`` with the
+``PlanNode`` used by the Portfolio, on a wide synthetic plan (every leaf is an
+instrument below one of a few subclasses).
+
+    python benchmarks/bench_plan_tree.py --leaves 100000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from anytree import Node
+from anytree.exporter import DictExporter
+from anytree.importer import DictImporter
+
+from investporto.plan_tree import PlanNode
+
+
+def synthetic_plan(leaves: int, subclasses: int = 10) -> dict:
+    """Plan dict of ``subclasses`` subclasses sharing ``leaves`` leaves"""
+    per_subclass = leaves // subclasses
+    return {
+        "name": "entry",
+        "budget": 100000.0,
+        "children": [
+            {
+                "name": "stocks",
+                "percentage": 100.0,
+                "children": [
+                    {
+                        "name": f"subclass_{subclass}",
+                        "percentage": 100.0 / subclasses,
+                        "children": [
+                            {"name": f"asset_{leaf}", "percentage": 100 / per_subclass}
+                            for leaf in range(per_subclass)
+                        ],
+                    }
+                    for subclass in range(subclasses)
+                ],
+            }
+        ],
+    }
+
+
+def measure(name: str, build, lookup, export):
+    tracemalloc.start()
+    start = time.perf_counter()
+    root = build()
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    lookup(root)
+    lookup_time = time.perf_counter() - start
+    start = time.perf_counter()
+    export(root)
+    export_time = time.perf_counter() - start
+    print(
+        f"    {name:<10} {memory / 2**20:8.1f} MiB"
+        f" | build {build_time * 1000:8.1f} ms"
+        f" | 1000 lookups {lookup_time * 1000:8.1f} ms"
+        f" | export {export_time * 1000:8.1f} ms"
+    )
+
+
+def anytree_lookup(root: Node):
+    subclass = root.children[0].children[-1]
+    for number in range(1000):
+        name = f"asset_{number}"
+        next((node for node in subclass.children if node.name == name), None)
+
+
+def plan_node_lookup(root: PlanNode):
+    subclass = root.children[0].children[-1]
+    for number in range(1000):
+        subclass.child(f"asset_{number}")
+
+
+def bench(leaves: int):
+    plan = synthetic_plan(leaves)
+    print(f"{leaves} leaves")
+    measure(
+        "anytree",
+        lambda: DictImporter(Node).import_(plan),
+        anytree_lookup,
+        DictExporter().export,
+    )
+    measure(
+        "PlanNode",
+        lambda: PlanNode.from_dict(plan),
+        plan_node_lookup,
+        PlanNode.to_dict,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--leaves", type=int, nargs="+", default=[10000, 100000])
+    arguments = parser.parse_args()
+    for leaves in arguments.leaves:
+        bench(leaves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark of the price store
+
+Fills the store with years of daily prices for many symbols, then times the
+daily update (one new day for every symbol), a one month read and the lookup
+of the latest prices.
+
+    python benchmarks/bench_prices.py --symbols 5000 --years 10
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from investporto.prices_cli import PriceStore
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(symbols: int, years: int):
+    names = [f"SYM{number}" for number in range(symbols)]
+    days = np.datetime64("2012-01-01") + np.arange(365 * years)
+    generator = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as project:
+        store = PriceStore(project)
+        start = time.perf_counter()
+        for name in names:
+            store.update(name, days, generator.uniform(1, 500, len(days)), False)
+        store._save_index()
+        fill = time.perf_counter() - start
+        new_day = pd.DataFrame(
+            {
+                "date": [str(days[-1] + 1)] * symbols,
+                "symbol": names,
+                "price": generator.uniform(1, 500, symbols),
+            }
+        )
+        results = {
+            "initial fill": fill,
+            "one new day, all symbols": timed(
+                lambda: PriceStore(project).update_many(new_day), repeat=1
+            ),
+            "one month, one symbol": timed(
+                lambda: np.nanmean(
+                    PriceStore(project).history("SYM0", days[-30], days[-1])[1]
+                )
+            ),
+            "latest, all symbols": timed(lambda: PriceStore(project).latest(names)),
+        }
+    print(f"{symbols} symbols, {years} years")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=10)
+    arguments = parser.parse_args()
+    bench(arguments.symbols, arguments.years)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the project archiving (close/open)
+
+Creates a synthetic project (price history csv files, already compressed
+files, many small transaction logs) of the given size and times the archive
+creation and extraction with one process and with all the cores.
+
+    python benchmarks/bench_project_archive.py --size-mb 4096
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from investporto.project_archive import extract_archive, write_archive
+
+
+def synthetic_project(project: Path, size: int):
+    """Fill the project: 60% csv, 30% compressed, 10% small files"""
+    (project / "prices").mkdir(parents=True)
+    (project / "archives").mkdir()
+    (project / "transactions").mkdir()
+    row = b"2022-01-03,aapl,182.01,181.12,182.88,179.12,104487900\n"
+    csv_size = 64 * 2**20
+    for number in range(max(1, int(size * 0.6) // csv_size)):
+        with open(project / "prices" / f"history_{number}.csv", "wb") as csv_file:
+            csv_file.write(row * (csv_size // len(row)))
+    random_size = 32 * 2**20
+    for number in range(max(1, int(size * 0.3) // random_size)):
+        with open(project / "archives" / f"backup_{number}.gz", "wb") as gz_file:
+            gz_file.write(os.urandom(random_size))
+    small_size = 512
+    for number in range(int(size * 0.1) // small_size // 64):
+        with open(project / "transactions" / f"{number}.log", "wb") as log_file:
+            log_file.write(os.urandom(small_size // 2).hex().encode())
+
+
+def bench(size_mb: int, jobs: int):
+    with tempfile.TemporaryDirectory() as directory:
+        project = Path(directory) / "project"
+        synthetic_project(project, size_mb * 2**20)
+        for job_count in sorted({1, jobs}):
+            archive_path = Path(directory) / f"project_{job_count}.zip"
+            start = time.perf_counter()
+            write_archive(project, archive_path, "password", jobs=job_count)
+            close_time = time.perf_counter() - start
+            start = time.perf_counter()
+            extract_archive(
+                archive_path,
+                Path(directory) / f"extracted_{job_count}",
+                "password",
+                jobs=job_count,
+            )
+            open_time = time.perf_counter() - start
+            print(
+                f"{size_mb} MiB, {job_count} process(es):"
+                f" close {close_time:7.2f} s | open {open_time:7.2f} s"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    arguments = parser.parse_args()
+    bench(arguments.size_mb, arguments.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of the rebalancing
+
+Times the orders computation for synthetic portfolios of one symbol per leaf,
+in full and in buy-only mode.
+
+    python benchmarks/bench_rebalance.py --assets 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from investporto.plan_analytics import compute_targets
+from investporto.plan_tree import PlanNode
+from investporto.rebalance import rebalance_orders
+
+
+def synthetic_portfolio(assets: int, fan_out: int = 100):
+    """Plan of ``assets`` leaves below ``fan_out`` classes, random positions"""
+    root = PlanNode("entry")
+    classes = [
+        PlanNode(f"class_{number}", root, percentage=100 / fan_out)
+        for number in range(fan_out)
+    ]
+    paths = []
+    for number in range(assets):
+        asset_class = classes[number % fan_out]
+        PlanNode(f"asset_{number}", asset_class, percentage=100 * fan_out / assets)
+        paths.append(f"{asset_class.name}/asset_{number}")
+    generator = np.random.default_rng(0)
+    quantity = generator.integers(1, 100, assets).astype(float)
+    price = generator.uniform(1, 500, assets)
+    positions = pd.DataFrame(
+        {
+            "symbol": [f"SYM{number}" for number in range(assets)],
+            "path": paths,
+            "quantity": quantity,
+            "last_price": price,
+            "value": quantity * price,
+            "lot_size": np.ones(assets),
+        }
+    )
+    return compute_targets(root), positions
+
+
+def timed(function, repeat: int = 3) -> float:
+    """Best wall time of ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(assets: int):
+    targets, positions = synthetic_portfolio(assets)
+    results = {
+        "full rebalance": timed(lambda: rebalance_orders(targets, positions, 1e5)),
+        "buy only": timed(
+            lambda: rebalance_orders(targets, positions, 1e5, buy_only=True)
+        ),
+    }
+    print(f"{assets} assets")
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, nargs="+", default=[1000, 10000])
+    arguments = parser.parse_args()
+    for assets in arguments.assets:
+        bench(assets)
+
+
+if __name__ == "__main__":
+    main()
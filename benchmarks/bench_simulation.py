@@ -0,0 +1,55 @@
+"""
+Benchmark of the Monte-Carlo simulation
+
+Times the simulation of a synthetic plan (one asset class per ten assets)
+with yearly periods, the paths being drawn in memory bounded chunks spread
+over the processes.
+
+    python benchmarks/bench_simulation.py --paths 100000 --years 30 --assets 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from investporto.simulation import SimulationModel, memory_budget, simulate
+
+
+def bench(paths: int, years: int, assets: int, jobs: int, memory: int, model: str):
+    generator = np.random.default_rng(0)
+    history = generator.normal(0.05, 0.2, (40, assets))
+    membership = np.zeros((assets, max(assets // 10, 1)))
+    membership[np.arange(assets), np.arange(assets) % membership.shape[1]] = 1
+    simulation = SimulationModel(
+        history, np.full(assets, 1.0 / assets), membership, 1e6, years, model
+    )
+    start = time.perf_counter()
+    outcomes = simulate(simulation, paths, seed=0, jobs=jobs, budget=memory)
+    seconds = time.perf_counter() - start
+    print(f"{paths} paths x {years} years x {assets} assets ({model})")
+    print(f"    {'simulation':<30} {seconds * 1000:10.1f} ms")
+    print(f"    {'median total':<30} {np.median(outcomes[:, -1]):10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--assets", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--memory", type=int, default=memory_budget)
+    parser.add_argument("--model", default="bootstrap")
+    arguments = parser.parse_args()
+    bench(
+        arguments.paths,
+        arguments.years,
+        arguments.assets,
+        arguments.jobs,
+        arguments.memory,
+        arguments.model,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the command line startup
+
+Measures the import of ``investporto.cli`` (``-X importtime``, best of the
+runs) and the wall time of ``investporto --help`` in a fresh interpreter.
+Exits with 1 when one of them is over its budget (a heavy dependency loaded
+at startup again, see tests/test_cli.py), which makes it usable as a gate.
+
+    python benchmarks/bench_startup.py --repeat 5 --import-budget 150
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+
+def import_time(module: str) -> float:
+    """Cumulative import time (seconds) of ``module`` and of its package"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(.*)$", line)
+        if match:
+            times[match.group(2).strip()] = int(match.group(1)) / 1e6
+    return sum(
+        seconds
+        for name, seconds in times.items()
+        if name == module or module.startswith(f"{name}.")
+    )
+
+
+def help_time() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "investporto", "--help"],
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--import-budget", type=float, default=150.0, help="milliseconds"
+    )
+    parser.add_argument("--help-budget", type=float, default=300.0, help="milliseconds")
+    arguments = parser.parse_args()
+    budgets = {
+        "import investporto.cli": arguments.import_budget,
+        "investporto --help": arguments.help_budget,
+    }
+    results = {
+        "import investporto.cli": min(
+            import_time("investporto.cli") for _ in range(arguments.repeat)
+        ),
+        "investporto --help": min(help_time() for _ in range(arguments.repeat)),
+    }
+    over_budget = False
+    for name, seconds in results.items():
+        print(f"    {name:<30} {seconds * 1000:10.1f} ms")
+        if seconds * 1000 > budgets[name]:
+            print(f"{name} is over its budget of {budgets[name]:.0f} ms")
+            over_budget = True
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
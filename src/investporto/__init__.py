@@ -16,5 +16,16 @@ investporto - small tool that allows you to manage your investmenet portfolio
 
 __version__ = "0.0.1"
 
+import importlib
+
 from . import types_and_vars
-from . import cli, project_meta_cli, portfolio_plan_cli
+
+# The cli modules pull in heavy dependencies (pyzipper, yaml, rich, pandas),
+# they are only imported when accessed (see investporto.cli for the commands)
+_lazy_submodules = ("cli", "project_meta_cli", "portfolio_plan_cli")
+
+
+def __getattr__(name: str):
+    if name in _lazy_submodules:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
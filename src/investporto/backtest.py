@@ -0,0 +1,280 @@
+"""
+Investment portfolio
+**************************
+
+:module: backtest
+
+:synopsis: Replay of the price history against selling/rebalancing strategies
+
+.. currentmodule:: backtest
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Trading days per year, to annualize the statistics
+periods_per_year = 252
+
+
+def rolling_mean(prices: np.ndarray, window: int) -> np.ndarray:
+    """Moving average of every column over ``window`` rows (NaN before)"""
+    cumulated = np.cumsum(prices, axis=0)
+    means = np.full_like(prices, np.nan)
+    means[window - 1 :] = cumulated[window - 1 :]
+    means[window:] -= cumulated[:-window]
+    means[window - 1 :] /= window
+    return means
+
+
+class Strategy:
+    """Decides, day by day, which weights the portfolio should go back to
+
+    Subclasses declare their ``parameters`` (name -> type) and the lowest
+    value allowed for them (``minimums``), precompute what
+    they need over the whole history in :meth:`prepare` (vectorized, once per
+    run) and answer :meth:`decide` every day: the new weights, or None to
+    keep the holdings as they are.
+    """
+
+    parameters: Dict[str, type] = {}
+    minimums: Dict[str, float] = {}
+
+    def __init__(self, **parameters):
+        unknown = set(parameters) - set(self.parameters)
+        if unknown:
+            raise TypeError(f"unknown parameters: {', '.join(sorted(unknown))}")
+        for name, kind in self.parameters.items():
+            if name in parameters:
+                value = kind(parameters[name])
+                if not value >= self.minimums.get(name, -np.inf):
+                    raise ValueError(
+                        f"{name} = {value} is not allowed"
+                        f" (at least {self.minimums[name]})"
+                    )
+                setattr(self, name, value)
+
+    def prepare(self, prices: np.ndarray, target: np.ndarray):
+        """Precompute the indicators (``prices``: days x assets)"""
+        self.target = target
+
+    def decide(self, day: int, weights: np.ndarray) -> Optional[np.ndarray]:
+        return None
+
+
+class BuyAndHold(Strategy):
+    """Buy the plan once, never trade again"""
+
+
+class PeriodicRebalance(Strategy):
+    """Go back to the plan every ``every`` days"""
+
+    parameters = {"every": int}
+    minimums = {"every": 1}
+    every = 21
+
+    def decide(self, day, weights):
+        if day % self.every == 0:
+            return self.target
+        return None
+
+
+class ThresholdRebalance(Strategy):
+    """Go back to the plan once a weight is off by more than ``band``
+    (0 to 1), e.g. to sell what grew disproportionately"""
+
+    parameters = {"band": float}
+    minimums = {"band": 0.0}
+    band = 0.05
+
+    def decide(self, day, weights):
+        if np.abs(weights - self.target).max() > self.band:
+            return self.target
+        return None
+
+
+class TrendFilter(Strategy):
+    """Only hold the assets trading above their ``window`` days moving
+    average (the other ones are sold to cash), checked every ``every`` days
+
+    Trades only when the set of held assets changes.
+    """
+
+    parameters = {"window": int, "every": int}
+    minimums = {"window": 1, "every": 1}
+    window = 200
+    every = 5
+
+    def prepare(self, prices, target):
+        super().prepare(prices, target)
+        # Before the first average, stay invested
+        self.above = ~(prices < rolling_mean(prices, self.window))
+        self.held = np.ones(len(target), dtype=bool)
+
+    def decide(self, day, weights):
+        if day % self.every or (self.above[day] == self.held).all():
+            return None
+        self.held = self.above[day]
+        return np.where(self.held, self.target, 0.0)
+
+
+strategies = {
+    "buy-and-hold": BuyAndHold,
+    "periodic": PeriodicRebalance,
+    "threshold": ThresholdRebalance,
+    "trend": TrendFilter,
+}
+
+
+def run_backtest(
+    prices: np.ndarray,
+    target: np.ndarray,
+    strategy: Strategy,
+    budget: float = 1.0,
+    cost: float = 0.0,
+) -> Tuple[np.ndarray, int]:
+    """Replay ``prices`` (days x assets, no NaN) day by day
+
+    The budget is invested according to ``target`` the first day, the
+    strategy then decides every day. Weights summing up to less than 1 leave
+    the rest in cash. ``cost`` is paid on every traded amount. Returns the
+    value of the portfolio every day and the number of trading days.
+    """
+    strategy.prepare(prices, target)
+    days = len(prices)
+    values = np.empty(days)
+    units = budget * target / prices[0]
+    cash = budget * (1 - target.sum())
+    trades = 0
+    for day in range(days):
+        price = prices[day]
+        held = units * price
+        value = held.sum() + cash
+        values[day] = value
+        wanted = strategy.decide(day, held / value) if day else None
+        if wanted is None:
+            continue
+        traded = np.abs(wanted * value - held).sum()
+        if not traded:
+            continue
+        value -= cost * traded
+        units = wanted * value / price
+        cash = value * (1 - wanted.sum())
+        trades += 1
+    return values, trades
+
+
+def statistics(values: np.ndarray, trades: int) -> Dict[str, float]:
+    """Final value, CAGR, volatility and maximum drawdown of a value curve"""
+    years = max(len(values) - 1, 1) / periods_per_year
+    returns = np.diff(np.log(values))
+    return {
+        "final_value": float(values[-1]),
+        "cagr": float((values[-1] / values[0]) ** (1 / years) - 1),
+        "volatility": (
+            float(returns.std() * np.sqrt(periods_per_year)) if len(returns) else 0.0
+        ),
+        "max_drawdown": float((1 - values / np.maximum.accumulate(values)).max()),
+        "trades": trades,
+    }
+
+
+def parameter_grid(grid: Dict[str, Iterable]) -> List[Dict[str, object]]:
+    """Every combination of the given parameter values"""
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+# Shared price array and run settings of the worker processes
+_worker = {}
+
+
+def _init_worker(name, shape, dtype, target, strategy, budget, cost):
+    memory = shared_memory.SharedMemory(name=name)
+    _worker.update(
+        memory=memory,
+        prices=np.ndarray(shape, dtype=dtype, buffer=memory.buf),
+        target=target,
+        strategy=strategy,
+        budget=budget,
+        cost=cost,
+    )
+
+
+def _run_parameters(parameters: Dict[str, object]) -> Dict[str, float]:
+    strategy = strategies[_worker["strategy"]](**parameters)
+    values, trades = run_backtest(
+        _worker["prices"],
+        _worker["target"],
+        strategy,
+        _worker["budget"],
+        _worker["cost"],
+    )
+    return statistics(values, trades)
+
+
+def sweep(
+    prices: np.ndarray,
+    target: np.ndarray,
+    strategy: str,
+    combinations: List[Dict[str, object]],
+    budget: float = 1.0,
+    cost: float = 0.0,
+    jobs: Optional[int] = None,
+) -> List[Dict[str, float]]:
+    """Backtest every parameter combination of a strategy
+
+    The combinations are spread over ``jobs`` processes (default: all
+    cores). The prices are put once in shared memory: the workers read them
+    in place instead of receiving a copy each.
+    """
+    if strategy not in strategies:
+        raise ValueError(f"unknown strategy: {strategy}")
+    for parameters in combinations:
+        # Reject bad parameters before starting any process
+        strategies[strategy](**parameters)
+    jobs = min(jobs or os.cpu_count() or 1, len(combinations))
+    if jobs <= 1:
+        return [
+            statistics(
+                *run_backtest(
+                    prices, target, strategies[strategy](**parameters), budget, cost
+                )
+            )
+            for parameters in combinations
+        ]
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    memory = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    try:
+        np.ndarray(prices.shape, dtype=prices.dtype, buffer=memory.buf)[:] = prices
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(
+                memory.name,
+                prices.shape,
+                prices.dtype,
+                target,
+                strategy,
+                budget,
+                cost,
+            ),
+        ) as executor:
+            chunk = max(len(combinations) // (jobs * 4), 1)
+            return list(executor.map(_run_parameters, combinations, chunksize=chunk))
+    finally:
+        memory.close()
+        memory.unlink()
@@ -14,13 +14,225 @@ Investment portfolio
     MIT License
 
 """
+import importlib
+
 import click
 
-from .project_meta_cli import project_meta
-from .portfolio_plan_cli import portfolio_plan
+
+class LazyCommandCollection(click.Group):
+    """Group whose subcommands are imported only when they are run
+
+    Each command is registered with the module defining it and its help line,
+    so that ``--help`` and the dispatch of one command do not import the
+    modules (and heavy dependencies: pyzipper, yaml, rich, pandas, ...) of
+    all the other commands.
+    """
+
+    def __init__(self, *args, lazy_commands: dict, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lazy_commands = lazy_commands
+
+    def list_commands(self, ctx: click.Context) -> list:
+        return sorted(self._lazy_commands)
+
+    def get_command(self, ctx: click.Context, cmd_name: str):
+        if cmd_name not in self._lazy_commands:
+            return None
+        module_name, command_name, _ = self._lazy_commands[cmd_name]
+        module = importlib.import_module(f".{module_name}", __package__)
+        return getattr(module, command_name)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter):
+        """List the commands out of the registry, without importing them"""
+        commands = self.list_commands(ctx)
+        if not commands:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in commands)
+        rows = [
+            (
+                name,
+                click.utils.make_default_short_help(
+                    self._lazy_commands[name][2], limit
+                ),
+            )
+            for name in commands
+        ]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+
+# command name -> (module, command object, help line)
+lazy_commands = {
+    # project_meta_cli
+    "create": (
+        "project_meta_cli",
+        "create_project",
+        "Create a project as folder structure",
+    ),
+    "delete": ("project_meta_cli", "delete_project", "Delete the project"),
+    "close": (
+        "project_meta_cli",
+        "close_project",
+        "Create an encrypt zip file out of the project and delete the worked one",
+    ),
+    "open": (
+        "project_meta_cli",
+        "open_project",
+        "Extract from the zip all the project back to the basic project structur",
+    ),
+    "fetch": (
+        "project_meta_cli",
+        "fetch_project_files",
+        "Extract files left in the archive by a partial open (glob patterns)",
+    ),
+    # portfolio_plan_cli
+    "add-asset-class": (
+        "portfolio_plan_cli",
+        "create_class_of_investment",
+        "Add new asset class (Stocks, ETFs, Bonds, ...)",
+    ),
+    "add-asset-subclass": (
+        "portfolio_plan_cli",
+        "create_subclass_of_investment",
+        "Add new asset subclass (Large Caps, Mid Caps, ...)",
+    ),
+    "remove-asset-class": (
+        "portfolio_plan_cli",
+        "remove_class_of_investment",
+        "Remove new asset class (Stocks, ETFs, Bonds, ...)",
+    ),
+    "remove-asset-subclass": (
+        "portfolio_plan_cli",
+        "remove_subclass_of_investment",
+        "Remove asset subclass large_market_caps, mid_market_caps, ...)",
+    ),
+    "add-node": (
+        "portfolio_plan_cli",
+        "add_plan_node",
+        "Add a node at any depth of the plan (e.g. stocks/large_caps/tech)",
+    ),
+    "remove-node": (
+        "portfolio_plan_cli",
+        "remove_plan_node",
+        "Remove a node at any depth of the plan, with its whole subtree",
+    ),
+    "move-node": (
+        "portfolio_plan_cli",
+        "move_plan_node",
+        "Move a node of the plan, with its whole subtree, below another node",
+    ),
+    "allocate-budget": (
+        "portfolio_plan_cli",
+        "assign_budget",
+        "Assign a budget to the portfolio",
+    ),
+    "compact-plan": (
+        "portfolio_plan_cli",
+        "compact_plan",
+        "Fold the journal of edits into the yaml file of the plan",
+    ),
+    "verify-allocation": (
+        "portfolio_plan_cli",
+        "verify_allocation",
+        "Verify if the allocation reach really the 100% per class",
+    ),
+    "visualize-allocation": (
+        "portfolio_plan_cli",
+        "visualize_allocation",
+        "Visualize the project allocation",
+    ),
+    "import-plan": (
+        "portfolio_plan_cli",
+        "import_plan",
+        "Replace the plan by the one of a csv or parquet table",
+    ),
+    "apply": (
+        "portfolio_plan_cli",
+        "apply_operations",
+        "Apply a batch of edit operations (yaml list, file or stdin) at once",
+    ),
+    "target-amounts": (
+        "portfolio_plan_cli",
+        "target_amounts",
+        "Compute the amount to invest in each node out of the budget",
+    ),
+    # holdings_cli
+    "add-symbol": (
+        "holdings_cli",
+        "add_symbol",
+        "Register a symbol and the leaf of the plan it belongs to",
+    ),
+    "buy": ("holdings_cli", "buy", "Record the purchase of a symbol"),
+    "sell": ("holdings_cli", "sell", "Record the sale of a symbol"),
+    "import-transactions": (
+        "holdings_cli",
+        "import_transactions",
+        "Import transactions from a csv (date,symbol,quantity,price[,fees])",
+    ),
+    "positions": ("holdings_cli", "positions", "Show the current positions"),
+    "drift": (
+        "holdings_cli",
+        "drift",
+        "Show the drift between the plan and the current positions per node",
+    ),
+    "rebalance": (
+        "holdings_cli",
+        "rebalance",
+        "Compute the orders bringing the positions back to the plan",
+    ),
+    "compact-ledger": (
+        "holdings_cli",
+        "compact_ledger",
+        "Merge the recorded transactions into one segment",
+    ),
+    # prices_cli
+    "import-prices": (
+        "prices_cli",
+        "import_prices",
+        "Import daily prices from a csv (date,symbol,price)",
+    ),
+    "import-fx-rates": (
+        "prices_cli",
+        "import_fx_rates",
+        "Import daily FX rates from a csv (date,pair,rate e.g. EURUSD or EUR/USD)",
+    ),
+    "price-history": (
+        "prices_cli",
+        "price_history",
+        "Show the stored prices of a symbol",
+    ),
+    # optimize_cli
+    "optimize": (
+        "optimize_cli",
+        "optimize",
+        "Propose the percentages of the plan leaves out of the price history",
+    ),
+    "simulate": (
+        "optimize_cli",
+        "simulate_plan",
+        "Project the budget forward and show the percentiles per asset class",
+    ),
+    "backtest": (
+        "optimize_cli",
+        "backtest",
+        "Replay the price history against a strategy for every parameter set",
+    ),
+    # export_cli
+    "export": (
+        "export_cli",
+        "export",
+        "Export the plan, the holdings and their valuation to a file",
+    ),
+    # shell_cli
+    "shell": (
+        "shell_cli",
+        "portfolio_shell",
+        "Interactive shell working on the portfolio plan kept in memory",
+    ),
+}
 
 
-main = click.CommandCollection(sources=[project_meta, portfolio_plan])
+main = LazyCommandCollection(lazy_commands=lazy_commands)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""
+Investment portfolio
+**************************
+
+:module: export_cli
+
+:synopsis: CLI section exporting the plan, the holdings and their valuation
+
+.. currentmodule:: export_cli
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import click
+import pandas as pd
+
+from .holdings_cli import by_plan, project_folder, valued_positions
+from .portfolio_plan_cli import Portfolio, project_path_option
+from .types_and_vars import portfolio_plan_name
+
+# Rows converted and written at once
+export_chunk_rows = 50000
+
+export_formats = ("csv", "parquet", "xlsx")
+
+# Rows of an Excel sheet, header included
+xlsx_max_rows = 1048576
+
+
+def export_frame(report: pd.DataFrame, positions: pd.DataFrame) -> pd.DataFrame:
+    """One row per node of the plan, the leaves being repeated per symbol
+    they hold
+
+    ``report`` is the drift report of the plan (see
+    :func:`investporto.plan_analytics.compute_drift`), ``positions`` the
+    valued positions. The positions outside of the plan come last.
+    """
+    positions = positions.rename(columns={"value": "position_value"})
+    in_plan = positions["path"].isin(report["path"])
+    frame = report.merge(positions[in_plan], on="path", how="left", sort=False)
+    return pd.concat([frame, positions[~in_plan]], ignore_index=True)
+
+
+def write_csv(frame: pd.DataFrame, output: Path, chunk_rows: int):
+    frame.to_csv(output, index=False, chunksize=chunk_rows)
+
+
+def write_parquet(frame: pd.DataFrame, output: Path, chunk_rows: int):
+    """One row group per chunk"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise click.UsageError("Parquet export requires pyarrow (pip install pyarrow)")
+    schema = pyarrow.Schema.from_pandas(frame, preserve_index=False)
+    with pyarrow.parquet.ParquetWriter(output, schema) as writer:
+        for start in range(0, len(frame), chunk_rows):
+            writer.write_table(
+                pyarrow.Table.from_pandas(
+                    frame.iloc[start : start + chunk_rows],
+                    schema=schema,
+                    preserve_index=False,
+                )
+            )
+
+
+def write_xlsx(frame: pd.DataFrame, output: Path, chunk_rows: int):
+    """Rows flushed to the file as they are written (constant memory)"""
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise click.UsageError(
+            "Excel export requires xlsxwriter (pip install xlsxwriter)"
+        )
+    if len(frame) >= xlsx_max_rows:
+        raise click.UsageError(
+            f"{len(frame)} rows do not fit in an Excel sheet, export as csv or parquet"
+        )
+    options = {"constant_memory": True, "nan_inf_to_errors": True}
+    with xlsxwriter.Workbook(str(output), options) as workbook:
+        sheet = workbook.add_worksheet("portfolio")
+        sheet.write_row(0, 0, list(frame.columns))
+        row = 1
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start : start + chunk_rows].astype(object)
+            for values in chunk.where(chunk.notna(), None).itertuples(index=False):
+                sheet.write_row(row, 0, values)
+                row += 1
+
+
+writers = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+#  Export the portfolio
+@click.group()
+def export_data():
+    """"""
+    pass
+
+
+@export_data.command("export")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@project_path_option
+@click.option(
+    "-f",
+    "--format",
+    "export_format",
+    type=click.Choice(export_formats),
+    required=False,
+    help="File format (default: out of the output extension)",
+)
+def export(projet_path: str, output: str, export_format: Optional[str]):
+    """Export the plan, the holdings and their valuation to a file
+
+    The format is csv, parquet or xlsx. One row per node of the plan with
+    its target and actual amounts, the leaves being repeated for every
+    symbol they hold. Amounts are in the currency of the plan. The rows are
+    written in chunks.
+    """
+    output = Path(output)
+    export_format = export_format or output.suffix.lstrip(".").lower()
+    if export_format not in writers:
+        raise click.UsageError(
+            f"Cannot guess the format of {output.name}, use --format"
+        )
+    project = project_folder(projet_path)
+    try:
+        with Portfolio(project / portfolio_plan_name, read_only=True) as ppn:
+            positions = valued_positions(project, ppn.currency)
+            report = ppn.compute_drift(by_plan(positions))
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+    frame = export_frame(report, positions)
+    writers[export_format](frame, output, export_chunk_rows)
+    click.echo(f"{len(frame)} rows exported to {output}")
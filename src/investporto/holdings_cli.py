@@ -0,0 +1,523 @@
+"""
+Investment portfolio
+**************************
+
+:module: holdings_cli
+
+:synopsis: CLI section for the holdings (transaction ledger)
+
+.. currentmodule:: holdings_cli
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+
+import click
+import numpy as np
+import pandas as pd
+
+from .portfolio_plan_cli import Portfolio, project_path_option
+from .prices_cli import PriceStore
+from .rebalance import rebalance_orders
+from .valuation import FxRates, to_base_currency
+from .types_and_vars import PathType, holdings_folder_name, portfolio_plan_name
+
+# One transaction: quantity < 0 for sales, fees in the price currency
+transaction_dtype = np.dtype(
+    [
+        ("date", "datetime64[D]"),
+        ("symbol", np.int32),
+        ("quantity", np.float64),
+        ("price", np.float64),
+        ("fees", np.float64),
+    ]
+)
+
+# Transactions appended before the journal is compacted into a segment
+compaction_threshold = 100000
+
+
+class Ledger:
+    """Append-only, columnar store of the transactions of a project
+
+    The transactions are fixed size records (see ``transaction_dtype``):
+
+    - new transactions are appended to ``transactions/journal-<n>.bin``,
+      which costs one small write whatever the size of the history,
+    - :meth:`compact` sorts the whole history by date into the
+      ``transactions/segment-<n+1>.npy`` file: the next generation, whose
+      journal starts empty,
+    - loading memory-maps the segment and the journal of the newest
+      generation: nothing is parsed or copied until used, aggregations are
+      vectorized numpy operations.
+
+    Renaming the new segment in place is the only step switching to the next
+    generation. The files of the older ones, left by a crash before they are
+    removed, are ignored (nothing is counted twice).
+
+    The symbols are stored once in ``symbols.json`` (the records only keep
+    their index), together with the leaf of the plan they belong to.
+    """
+
+    def __init__(self, project: PathType):
+        self._folder = Path(project) / holdings_folder_name
+        self._transactions = self._folder / "transactions"
+        self._symbols_file = self._folder / "symbols.json"
+        self._symbols: List[dict] = []
+        self._symbol_ids = {}
+        if self._symbols_file.is_file():
+            with open(self._symbols_file, "r") as symbols_file:
+                self._symbols = json.load(symbols_file)["symbols"]
+            self._symbol_ids = {
+                entry["symbol"]: number for number, entry in enumerate(self._symbols)
+            }
+
+    @property
+    def symbols(self) -> List[dict]:
+        """Registered symbols: {"symbol", "path", "lot_size", "currency"}"""
+        return self._symbols
+
+    def _save_symbols(self):
+        self._folder.mkdir(parents=True, exist_ok=True)
+        temporary_path = self._symbols_file.with_suffix(".tmp")
+        with open(temporary_path, "w") as symbols_file:
+            json.dump({"symbols": self._symbols}, symbols_file, indent=1)
+        os.replace(temporary_path, self._symbols_file)
+
+    def add_symbol(
+        self,
+        symbol: str,
+        path: Optional[str] = None,
+        lot_size: Optional[float] = None,
+        currency: Optional[str] = None,
+    ) -> int:
+        """Register (or update) a symbol, returns its index
+
+        ``path`` is the leaf of the plan the symbol is part of (e.g.
+        ``stocks/large_caps``).
+        """
+        number = self._register(symbol.upper())
+        entry = self._symbols[number]
+        if path is not None:
+            entry["path"] = path.lower().strip("/")
+        if lot_size is not None:
+            entry["lot_size"] = float(lot_size)
+        if currency is not None:
+            entry["currency"] = currency.upper()
+        self._save_symbols()
+        return number
+
+    def _register(self, symbol: str) -> int:
+        number = self._symbol_ids.get(symbol)
+        if number is None:
+            number = len(self._symbols)
+            self._symbols.append(
+                {"symbol": symbol, "path": None, "lot_size": 1.0, "currency": None}
+            )
+            self._symbol_ids[symbol] = number
+        return number
+
+    def symbol_id(self, symbol: str) -> int:
+        """Index of a symbol, registered on the fly if unknown"""
+        number = self._symbol_ids.get(symbol.upper())
+        if number is None:
+            number = self.add_symbol(symbol)
+        return number
+
+    def append(
+        self,
+        symbol: str,
+        quantity: float,
+        price: float,
+        fees: float = 0.0,
+        day: Optional[date] = None,
+    ):
+        """Append one transaction (O(1): one record written to the journal)"""
+        record = np.zeros(1, dtype=transaction_dtype)
+        record["date"] = np.datetime64(day or date.today(), "D")
+        record["symbol"] = self.symbol_id(symbol)
+        record["quantity"] = quantity
+        record["price"] = price
+        record["fees"] = fees
+        self._write_journal(record)
+
+    def extend(self, transactions: pd.DataFrame):
+        """Append many transactions at once
+
+        ``transactions`` has the columns date, symbol, quantity, price and
+        optionally fees.
+        """
+        symbols = transactions["symbol"].astype(str).str.upper()
+        known = len(self._symbols)
+        mapping = {symbol: self._register(symbol) for symbol in symbols.unique()}
+        if len(self._symbols) > known:
+            self._save_symbols()
+        records = np.zeros(len(transactions), dtype=transaction_dtype)
+        records["date"] = pd.to_datetime(transactions["date"]).to_numpy(
+            dtype="datetime64[D]"
+        )
+        records["symbol"] = symbols.map(mapping).to_numpy()
+        records["quantity"] = transactions["quantity"].to_numpy(dtype=np.float64)
+        records["price"] = transactions["price"].to_numpy(dtype=np.float64)
+        if "fees" in transactions:
+            records["fees"] = transactions["fees"].fillna(0).to_numpy(dtype=np.float64)
+        self._write_journal(records)
+
+    def _write_journal(self, records: np.ndarray):
+        self._transactions.mkdir(parents=True, exist_ok=True)
+        journal_path = self._journal_path(self._generation())
+        with open(journal_path, "ab") as journal:
+            journal.write(records.tobytes())
+        if journal_path.stat().st_size >= compaction_threshold * records.itemsize:
+            self.compact()
+
+    def _generation(self) -> int:
+        """Number of the newest segment (0 before the first compaction)"""
+        segments = sorted(self._transactions.glob("segment-*.npy"))
+        return int(segments[-1].stem.split("-")[1]) if segments else 0
+
+    def _segment_path(self, generation: int) -> Path:
+        return self._transactions / f"segment-{generation:06d}.npy"
+
+    def _journal_path(self, generation: int) -> Path:
+        return self._transactions / f"journal-{generation:06d}.bin"
+
+    def _journal_records(self, generation: int) -> np.ndarray:
+        journal_path = self._journal_path(generation)
+        if not journal_path.is_file():
+            return np.zeros(0, dtype=transaction_dtype)
+        # A record cut by a crash is ignored
+        count = journal_path.stat().st_size // transaction_dtype.itemsize
+        if not count:
+            return np.zeros(0, dtype=transaction_dtype)
+        return np.memmap(journal_path, dtype=transaction_dtype, mode="r", shape=count)
+
+    def transactions(self) -> np.ndarray:
+        """All the transactions (memory-mapped when a single file holds them)"""
+        generation = self._generation()
+        journal = self._journal_records(generation)
+        if not generation:
+            return journal
+        segment = np.load(self._segment_path(generation), mmap_mode="r")
+        if not len(journal):
+            return segment
+        return np.concatenate([segment, journal])
+
+    def compact(self):
+        """Merge the segment and the journal into the next generation (one
+        date sorted segment)"""
+        generation = self._generation()
+        transactions = self.transactions()
+        if not len(transactions):
+            return
+        transactions = transactions[np.argsort(transactions["date"], kind="stable")]
+        segment = self._segment_path(generation + 1)
+        temporary_path = segment.with_suffix(".tmp")
+        with open(temporary_path, "wb") as segment_file:
+            np.save(segment_file, transactions)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+        # Atomically switch to the new generation
+        os.replace(temporary_path, segment)
+        # The new segment holds everything, drop what it replaces
+        for pattern in ("segment-*.npy", "journal-*.bin"):
+            for old_file in self._transactions.glob(pattern):
+                if int(old_file.stem.split("-")[1]) <= generation:
+                    old_file.unlink(missing_ok=True)
+
+    def positions(self, prices: Optional[pd.Series] = None) -> pd.DataFrame:
+        """Current position per symbol
+
+        Columns: symbol, path (leaf of the plan), quantity, invested (cost of
+        the buys minus the sales, fees included), last_price (price of the last
+        transaction, or the one given in ``prices`` by symbol), value (quantity
+        x last price), lot_size and currency.
+        """
+        transactions = self.transactions()
+        count = len(self._symbols)
+        symbol = transactions["symbol"]
+        quantity = transactions["quantity"]
+        held = np.bincount(symbol, weights=quantity, minlength=count)
+        invested = np.bincount(
+            symbol,
+            weights=quantity * transactions["price"] + transactions["fees"],
+            minlength=count,
+        )
+        # Last transaction of each symbol in date order (segments are sorted,
+        # the journal usually is: only sort when needed)
+        last_price = np.full(count, np.nan)
+        dates = transactions["date"]
+        order = slice(None)
+        if not np.all(dates[1:] >= dates[:-1]):
+            order = np.argsort(dates, kind="stable")
+        last = pd.Series(transactions["price"][order]).groupby(symbol[order]).last()
+        last_price[last.index.to_numpy()] = last.to_numpy()
+        if prices is not None:
+            symbols = [entry["symbol"] for entry in self._symbols]
+            market = prices.reindex(symbols).to_numpy(dtype=np.float64)
+            last_price = np.where(np.isnan(market), last_price, market)
+        return pd.DataFrame(
+            {
+                "symbol": [entry["symbol"] for entry in self._symbols],
+                "path": [entry["path"] for entry in self._symbols],
+                "quantity": held,
+                "invested": invested,
+                "last_price": last_price,
+                "value": held * np.nan_to_num(last_price),
+                "lot_size": [entry["lot_size"] for entry in self._symbols],
+                "currency": [entry["currency"] for entry in self._symbols],
+            }
+        )
+
+    def positions_by_plan(self, prices: Optional[pd.Series] = None) -> pd.DataFrame:
+        """Positions summed up per leaf of the plan (see :func:`by_plan`)"""
+        return by_plan(self.positions(prices))
+
+
+def by_plan(positions: pd.DataFrame) -> pd.DataFrame:
+    """Positions summed up per leaf of the plan (symbols without a leaf are
+    reported under an empty path)"""
+    positions = positions.assign(path=positions["path"].fillna(""))
+    return (
+        positions.groupby("path", sort=True)[["invested", "value"]].sum().reset_index()
+    )
+
+
+#  Manage the holdings
+@click.group()
+def holdings():
+    """"""
+    pass
+
+
+def project_folder(projet_path: str) -> Path:
+    """Project folder out of the project path option"""
+    return Path(projet_path or ".").resolve()
+
+
+def market_prices(project: Path, ledger: Ledger) -> pd.Series:
+    """Last prices of the price store for the symbols of the ledger"""
+    return PriceStore(project).latest(entry["symbol"] for entry in ledger.symbols)
+
+
+def valued_positions(project: Path, currency: Optional[str] = None) -> pd.DataFrame:
+    """Positions at the market prices, in ``currency`` if given"""
+    ledger = Ledger(project)
+    positions = ledger.positions(market_prices(project, ledger))
+    if currency:
+        held = positions["quantity"] != 0
+        positions = to_base_currency(positions, currency, FxRates(project))
+        missing = positions.loc[held & positions["value"].isna(), "symbol"]
+        if len(missing):
+            click.echo(
+                f"No {currency.upper()} rate for: {', '.join(missing)}"
+                " (left out of the totals)"
+            )
+    return positions
+
+
+@holdings.command("add-symbol")
+@click.argument("symbol", type=click.STRING, required=True)
+@project_path_option
+@click.option(
+    "-ap",
+    "--asset-path",
+    type=click.STRING,
+    required=False,
+    help="Leaf of the plan the symbol belongs to (e.g. stocks/large_caps)",
+)
+@click.option("--lot-size", type=click.FLOAT, required=False, help="Tradable unit")
+@click.option("--currency", type=click.STRING, required=False, help="e.g. EUR")
+def add_symbol(
+    symbol: str,
+    projet_path: str,
+    asset_path: Optional[str],
+    lot_size: Optional[float],
+    currency: Optional[str],
+):
+    """Register a symbol and the leaf of the plan it belongs to"""
+    Ledger(project_folder(projet_path)).add_symbol(
+        symbol, asset_path, lot_size, currency
+    )
+    click.echo(f"{symbol.upper()} was registered")
+
+
+def transaction_options(function):
+    """Define the common options of a transaction"""
+    function = click.option(
+        "-q", "--quantity", type=click.FLOAT, required=True, help="Units traded"
+    )(function)
+    function = click.option(
+        "--price", type=click.FLOAT, required=True, help="Price of one unit"
+    )(function)
+    function = click.option(
+        "--fees", type=click.FLOAT, default=0.0, help="Fees of the transaction"
+    )(function)
+    function = click.option(
+        "--date",
+        "day",
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        required=False,
+        help="Day of the transaction (default: today)",
+    )(function)
+    return function
+
+
+@holdings.command("buy")
+@click.argument("symbol", type=click.STRING, required=True)
+@transaction_options
+@project_path_option
+def buy(symbol, quantity, price, fees, day, projet_path):
+    """Record the purchase of a symbol"""
+    Ledger(project_folder(projet_path)).append(
+        symbol, abs(quantity), price, fees, day and day.date()
+    )
+
+
+@holdings.command("sell")
+@click.argument("symbol", type=click.STRING, required=True)
+@transaction_options
+@project_path_option
+def sell(symbol, quantity, price, fees, day, projet_path):
+    """Record the sale of a symbol"""
+    Ledger(project_folder(projet_path)).append(
+        symbol, -abs(quantity), price, fees, day and day.date()
+    )
+
+
+@holdings.command("import-transactions")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@project_path_option
+def import_transactions(csv_file: str, projet_path: str):
+    """Import transactions from a csv (date,symbol,quantity,price[,fees])"""
+    transactions = pd.read_csv(csv_file)
+    missing = {"date", "symbol", "quantity", "price"} - set(transactions.columns)
+    if missing:
+        click.echo(f"Missing columns: {', '.join(sorted(missing))}")
+        exit(os.EX_DATAERR)
+    Ledger(project_folder(projet_path)).extend(transactions)
+    click.echo(f"{len(transactions)} transactions imported")
+
+
+@holdings.command("positions")
+@project_path_option
+@click.option("--by-plan", "per_leaf", is_flag=True, help="Sum up per plan leaf")
+@click.option(
+    "--currency", type=click.STRING, required=False, help="Convert into (e.g. EUR)"
+)
+def positions(projet_path: str, per_leaf: bool, currency: Optional[str]):
+    """Show the current positions"""
+    table = valued_positions(project_folder(projet_path), currency)
+    if per_leaf:
+        table = by_plan(table)
+    click.echo(table.to_string(index=False))
+
+
+@holdings.command("compact-ledger")
+@project_path_option
+def compact_ledger(projet_path: str):
+    """Merge the recorded transactions into one segment"""
+    Ledger(project_folder(projet_path)).compact()
+
+
+@holdings.command("drift")
+@project_path_option
+@click.option(
+    "--max-depth",
+    type=click.IntRange(min=0),
+    required=False,
+    help="Only report the nodes down to this depth",
+)
+@click.option(
+    "--threshold",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    help="Only report the nodes drifting by at least this many percentage points",
+)
+@click.option(
+    "--against-budget",
+    is_flag=True,
+    help="Compare with the plan budget instead of the current total value",
+)
+def drift(
+    projet_path: str, max_depth: Optional[int], threshold: float, against_budget: bool
+):
+    """Show the drift between the plan and the current positions per node"""
+    project = project_folder(projet_path)
+    try:
+        with Portfolio(project / portfolio_plan_name, read_only=True) as ppn:
+            report = ppn.compute_drift(
+                by_plan(valued_positions(project, ppn.currency)), against_budget
+            )
+            entry_name = ppn._plan.name
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+    selected = report["weight_drift"].abs() * 100 >= threshold
+    if max_depth is not None:
+        selected &= report["depth"] <= max_depth
+    report = report.assign(path=report["path"].replace("", entry_name))[selected]
+    if report.empty:
+        click.echo("No drift beyond the threshold")
+        return
+    click.echo(
+        report[
+            [
+                "path",
+                "target_weight",
+                "actual_weight",
+                "weight_drift",
+                "target_amount",
+                "actual_amount",
+                "drift_amount",
+                "relative_drift",
+            ]
+        ].to_string(index=False)
+    )
+
+
+@holdings.command("rebalance")
+@project_path_option
+@click.option(
+    "--cash", type=click.FLOAT, default=0.0, help="New cash to invest (default: 0)"
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0, max=100),
+    default=1.0,
+    help="Percentage points a leaf may drift before being traded (default: 1)",
+)
+@click.option("--buy-only", is_flag=True, help="Only invest the new cash, never sell")
+def rebalance(projet_path: str, cash: float, tolerance: float, buy_only: bool):
+    """Compute the orders bringing the positions back to the plan"""
+    project = project_folder(projet_path)
+    try:
+        with Portfolio(project / portfolio_plan_name, read_only=True) as ppn:
+            targets = ppn.compute_targets()
+            currency = ppn.currency
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+    orders, left = rebalance_orders(
+        targets,
+        valued_positions(project, currency),
+        cash,
+        tolerance / 100,
+        buy_only,
+    )
+    if orders.empty:
+        click.echo("Nothing to trade")
+    else:
+        click.echo(orders.to_string(index=False))
+    click.echo(f"Cash left: {left:.2f}")
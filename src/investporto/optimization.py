@@ -0,0 +1,240 @@
+"""
+Investment portfolio
+**************************
+
+:module: optimization
+
+:synopsis: Portfolio weights optimization out of the price history
+
+.. currentmodule:: optimization
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import hashlib
+from datetime import date
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .prices_cli import PriceStore
+
+# Trading days per year, to annualize the daily statistics
+periods_per_year = 252
+
+# Solver iterations (the solvers stop earlier once converged)
+max_iterations = 200
+convergence = 1e-9
+
+methods = ("mean-variance", "min-variance", "risk-parity")
+
+
+def price_matrix(
+    store: PriceStore, symbols: Sequence[str], start: date, end: date
+) -> np.ndarray:
+    """Prices of ``symbols`` (columns) over the days between ``start`` and
+    ``end`` (rows), NaN where unknown
+
+    Only the days on which at least one symbol has a price are kept, each
+    column is read out of the memory-mapped range of its symbol.
+    """
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    days = int((end - start).astype(int)) + 1
+    matrix = np.full((days, len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        history_days, history = store.history(symbol, start, end)
+        if len(history):
+            offset = int((history_days[0] - start).astype(int))
+            matrix[offset : offset + len(history), column] = history
+    return matrix[~np.isnan(matrix).all(axis=1)]
+
+
+def forward_fill(prices: np.ndarray) -> np.ndarray:
+    """Carry the last known price of every column over the gaps (NaN stays
+    before the first price)"""
+    # Index of the last known row per cell
+    known = ~np.isnan(prices)
+    last_known = np.where(known, np.arange(len(prices))[:, None], 0)
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    return prices[last_known, np.arange(prices.shape[1])]
+
+
+def daily_returns(prices: np.ndarray) -> np.ndarray:
+    """Log returns between consecutive rows, the gaps being carried forward
+
+    Returns are 0 before the first price of a symbol.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(forward_fill(prices)), axis=0)
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def shrunk_covariance(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Ledoit-Wolf covariance of the returns (rows: observations)
+
+    The sample covariance is shrunk towards a scaled identity, the shrinkage
+    intensity being estimated out of the data. Returns the covariance and the
+    shrinkage used (0 to 1).
+    """
+    observations, assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / observations
+    scale = np.trace(sample) / assets
+    distance = ((sample - scale * np.eye(assets)) ** 2).sum() / assets
+    if distance == 0:
+        return sample, 0.0
+    fourth = ((centered**2).sum(axis=1) ** 2).sum()
+    spread = (fourth - observations * (sample**2).sum()) / observations**2 / assets
+    shrinkage = min(max(spread, 0.0), distance) / distance
+    covariance = (1 - shrinkage) * sample
+    covariance[np.diag_indices(assets)] += shrinkage * scale
+    return covariance, float(shrinkage)
+
+
+def estimate(
+    store: PriceStore,
+    symbols: Sequence[str],
+    start: date,
+    end: date,
+    cache_folder: Optional[Path] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Annualized mean returns and shrunk covariance of the symbols
+
+    With a ``cache_folder``, the estimation is stored per (symbol set,
+    window) and reused as long as the price files are unchanged.
+    """
+    cache_file = None
+    if cache_folder is not None:
+        stats = [
+            (file.stat().st_size, file.stat().st_mtime_ns) if file.exists() else None
+            for file in (store._file(symbol.upper()) for symbol in symbols)
+        ]
+        key = repr((tuple(symbols), str(start), str(end), stats))
+        digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        cache_file = Path(cache_folder) / f"{digest}.npz"
+        if cache_file.is_file():
+            with np.load(cache_file) as cached:
+                return cached["mean"], cached["covariance"]
+    returns = daily_returns(price_matrix(store, symbols, start, end))
+    mean = returns.mean(axis=0) * periods_per_year
+    covariance = shrunk_covariance(returns)[0] * periods_per_year
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "wb") as cache:
+            np.savez(cache, mean=mean, covariance=covariance)
+    return mean, covariance
+
+
+def quadratic_program(quadratic: np.ndarray, linear: np.ndarray) -> np.ndarray:
+    """Long-only weights (non negative, summing up to 1) minimizing
+    ``w'Qw/2 + c'w``
+
+    Primal-dual interior point method: each iteration solves one dense
+    linear system, a few tens of them are needed whatever the size.
+    """
+    assets = len(linear)
+    weights = np.full(assets, 1.0 / assets)
+    slack = np.ones(assets)
+    multiplier = 0.0
+    ones = np.ones(assets)
+    centering = 0.1
+    for _ in range(max_iterations):
+        gap = weights @ slack / assets
+        dual_residual = quadratic @ weights + linear - multiplier - slack
+        primal_residual = weights.sum() - 1.0
+        if (
+            gap < convergence
+            and np.abs(dual_residual).max() < convergence
+            and abs(primal_residual) < convergence
+        ):
+            break
+        # Newton step towards the central path, the slack step being
+        # eliminated
+        complementarity = weights * slack - centering * gap
+        hessian = quadratic.copy()
+        hessian[np.diag_indices(assets)] += slack / weights
+        right = -dual_residual - complementarity / weights
+        solved = np.linalg.solve(hessian, np.column_stack((right, ones)))
+        step_multiplier = (-primal_residual - solved[:, 0].sum()) / solved[:, 1].sum()
+        step_weights = solved[:, 0] + step_multiplier * solved[:, 1]
+        step_slack = -(complementarity + slack * step_weights) / weights
+        # Stay inside of the positive orthant
+        length = 1.0
+        for values, step in ((weights, step_weights), (slack, step_slack)):
+            decreasing = step < 0
+            if decreasing.any():
+                length = min(
+                    length, 0.99 * (-values[decreasing] / step[decreasing]).min()
+                )
+        weights = weights + length * step_weights
+        slack = slack + length * step_slack
+        multiplier += length * step_multiplier
+        # Aim closer to the optimum after long (successful) steps
+        centering = min(max((1 - length) ** 3, 1e-4), 0.5)
+    weights = np.maximum(weights, 0.0)
+    return weights / weights.sum()
+
+
+def mean_variance(
+    mean: np.ndarray, covariance: np.ndarray, risk_aversion: float = 1.0
+) -> np.ndarray:
+    """Long-only weights maximizing ``mean'w - risk_aversion/2 w'Σw``"""
+    return quadratic_program(risk_aversion * covariance, -mean)
+
+
+def min_variance(covariance: np.ndarray) -> np.ndarray:
+    """Long-only weights of minimum variance"""
+    return quadratic_program(covariance, np.zeros(len(covariance)))
+
+
+def risk_parity(covariance: np.ndarray) -> np.ndarray:
+    """Weights whose contributions to the risk (w_i (Σw)_i) are all equal
+
+    Newton method on the convex formulation ``y'Σy/2 - sum(log(y))/n``
+    whose minimum, normalized, has equal risk contributions.
+    """
+    assets = len(covariance)
+    budget = 1.0 / assets
+
+    def objective(values):
+        return values @ covariance @ values / 2 - budget * np.log(values).sum()
+
+    values = 1.0 / np.sqrt(np.diag(covariance))
+    values *= np.sqrt(1.0 / (values @ covariance @ values))
+    for _ in range(max_iterations):
+        gradient = covariance @ values - budget / values
+        hessian = covariance.copy()
+        hessian[np.diag_indices(assets)] += budget / values**2
+        step = -np.linalg.solve(hessian, gradient)
+        if -(gradient @ step) < convergence:
+            break
+        # Backtracking: stay positive and decrease
+        length = 1.0
+        current = objective(values)
+        while (values + length * step <= 0).any() or objective(
+            values + length * step
+        ) > current + 0.25 * length * (gradient @ step):
+            length /= 2
+        values = values + length * step
+    return values / values.sum()
+
+
+def optimal_weights(
+    method: str,
+    mean: np.ndarray,
+    covariance: np.ndarray,
+    risk_aversion: float = 1.0,
+) -> np.ndarray:
+    """Weights (summing up to 1) of one of the ``methods``"""
+    if method == "mean-variance":
+        return mean_variance(mean, covariance, risk_aversion)
+    if method == "min-variance":
+        return min_variance(covariance)
+    if method == "risk-parity":
+        return risk_parity(covariance)
+    raise ValueError(f"unknown optimization method: {method}")
@@ -0,0 +1,486 @@
+"""
+Investment portfolio
+**************************
+
+:module: optimize_cli
+
+:synopsis: CLI section analysing the portfolio plan out of the price history
+
+.. currentmodule:: optimize_cli
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+import yaml
+
+from .backtest import parameter_grid, strategies, sweep
+from .holdings_cli import Ledger, project_folder
+from .optimization import (
+    daily_returns,
+    estimate,
+    forward_fill,
+    methods,
+    optimal_weights,
+    price_matrix,
+)
+from .plan_analytics import flatten_plan, plan_weights, subtree_sums
+from .plan_tree import PlanNode
+from .portfolio_plan_cli import Portfolio, YamlDumper, project_path_option
+from .prices_cli import PriceStore
+from .simulation import (
+    SimulationModel,
+    models,
+    outcome_percentiles,
+    percentiles,
+    period_returns,
+    simulate,
+)
+from .types_and_vars import portfolio_plan_name
+
+# Estimations kept per (symbol set, window), out of the project archives
+covariance_cache_folder = Path(".investporto") / "covariance"
+
+
+def leaf_symbols(plan: PlanNode, paths: List[str], ledger: Ledger) -> List[str]:
+    """Symbol priced for each leaf path of the plan
+
+    The ``symbol`` attribute of the leaf if any, else the first symbol the
+    ledger registered for that leaf, else the name of the leaf.
+    """
+    registered = {}
+    for entry in ledger.symbols:
+        registered.setdefault(entry["path"], entry["symbol"])
+    symbols = []
+    for path in paths:
+        node = plan
+        for name in path.split("/") if path else ():
+            node = node.child(name)
+        symbol = (node.extra or {}).get("symbol") or registered.get(path) or node.name
+        symbols.append(str(symbol).upper())
+    return symbols
+
+
+def priced_leaves(project: Path, plan: PlanNode) -> Tuple[list, list, list]:
+    """Paths and symbols of the leaves of the plan, and the positions of the
+    ones having a price history (the entry of an empty plan is no leaf)"""
+    flat_plan = flatten_plan(plan)
+    paths = [
+        path for path, leaf in zip(flat_plan.path, flat_plan.is_leaf) if leaf and path
+    ]
+    symbols = leaf_symbols(plan, paths, Ledger(project))
+    known = set(PriceStore(project).symbols)
+    priced = [position for position, symbol in enumerate(symbols) if symbol in known]
+    return paths, symbols, priced
+
+
+def load_plan(project: Path) -> PlanNode:
+    """Plan of the project (exits on access errors)"""
+    try:
+        with Portfolio(project / portfolio_plan_name, read_only=True) as ppn:
+            return ppn._plan
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+def propose_plan(plan: PlanNode, leaf_weights: pd.Series) -> PlanNode:
+    """Copy of the plan whose percentages give the leaves ``leaf_weights``
+
+    ``leaf_weights`` (by leaf path, any scale) only has to cover
+    the optimized leaves, the other ones keep their weight. The optimized
+    leaves share the weight they had together.
+    """
+    proposal = PlanNode.from_dict(plan.to_dict())
+    flat_plan = flatten_plan(proposal)
+    weight = plan_weights(flat_plan)
+    position = pd.Index(flat_plan.path).get_indexer(leaf_weights.index)
+    proposed = leaf_weights.to_numpy(dtype=np.float64)
+    weight[position] = proposed / proposed.sum() * weight[position].sum()
+    # Weight of every node out of its leaves, then relative to its parent
+    leaves = np.where(flat_plan.is_leaf, weight, 0.0)
+    weight = subtree_sums(flat_plan, leaves)
+    parent_weight = weight[np.maximum(flat_plan.parent, 0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentage = np.where(parent_weight > 0, weight / parent_weight * 100, 0.0)
+    for node, node_percentage, is_root in zip(
+        proposal.iter_preorder(), percentage, flat_plan.parent < 0
+    ):
+        if not is_root:
+            node.percentage = float(node_percentage)
+    return proposal
+
+
+def parameter_values(text: str) -> Tuple[str, list]:
+    """Name and values of a ``name=1,2,3`` or ``name=start:stop:count``
+    strategy parameter"""
+    name, separator, values = text.partition("=")
+    if not separator or not name or not values:
+        raise click.BadParameter(f"expected name=values, got {text}")
+    try:
+        if ":" in values:
+            start, stop, count = values.split(":")
+            return name, list(np.linspace(float(start), float(stop), int(count)))
+        return name, [float(value) for value in values.split(",")]
+    except ValueError:
+        raise click.BadParameter(f"invalid values for {name}: {values}")
+
+
+#  Optimize the plan
+@click.group()
+def optimize_plan():
+    """"""
+    pass
+
+
+@optimize_plan.command("optimize")
+@project_path_option
+@click.option(
+    "-m",
+    "--method",
+    type=click.Choice(methods),
+    default="min-variance",
+    help="Optimization method (default: min-variance)",
+)
+@click.option(
+    "--window",
+    type=click.IntRange(min=2),
+    default=3 * 365,
+    help="Days of price history used (default: 3 years)",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=False,
+    help="Last day of the window (default: today)",
+)
+@click.option(
+    "--risk-aversion",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    help="Risk aversion of the mean-variance method (default: 1)",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    required=False,
+    help="Proposed plan (default: porto_plan.optimized.yaml in the project)",
+)
+def optimize(
+    projet_path: str,
+    method: str,
+    window: int,
+    end,
+    risk_aversion: float,
+    output: Optional[str],
+):
+    """Propose the percentages of the plan leaves out of the price history
+
+    The leaves having a price history share the weight they have together in
+    the plan according to the chosen method, the proposal is written as a
+    copy of the plan.
+    """
+    project = project_folder(projet_path)
+    plan = load_plan(project)
+    paths, symbols, priced = priced_leaves(project, plan)
+    if len(priced) < 2:
+        click.echo("At least two leaves need a price history to optimize")
+        exit(os.EX_DATAERR)
+    last_day = end.date() if end else date.today()
+    mean, covariance = estimate(
+        PriceStore(project),
+        [symbols[position] for position in priced],
+        last_day - timedelta(days=window - 1),
+        last_day,
+        project / covariance_cache_folder,
+    )
+    weights = optimal_weights(method, mean, covariance, risk_aversion)
+    proposal = propose_plan(
+        plan, pd.Series(weights, index=[paths[position] for position in priced])
+    )
+    output = Path(output) if output else project / "porto_plan.optimized.yaml"
+    with open(output, "w") as proposal_file:
+        yaml.dump(
+            proposal.to_dict(),
+            proposal_file,
+            Dumper=YamlDumper,
+            default_flow_style=False,
+        )
+    click.echo(
+        pd.DataFrame(
+            {
+                "path": [paths[position] for position in priced],
+                "symbol": [symbols[position] for position in priced],
+                "share": weights,
+            }
+        ).to_string(index=False)
+    )
+    click.echo(f"Proposed plan written to {output}")
+
+
+@optimize_plan.command("simulate")
+@project_path_option
+@click.option(
+    "--paths",
+    type=click.IntRange(min=1),
+    default=10000,
+    help="Number of simulated paths (default: 10000)",
+)
+@click.option(
+    "--years", type=click.IntRange(min=1), default=10, help="Horizon (default: 10)"
+)
+@click.option(
+    "--periods-per-year",
+    type=click.IntRange(min=1, max=252),
+    default=12,
+    help="Steps of the paths per year (default: 12)",
+)
+@click.option(
+    "--model",
+    type=click.Choice(models),
+    default="bootstrap",
+    help="Draw the historical periods again or from a normal law",
+)
+@click.option(
+    "--window",
+    type=click.IntRange(min=2),
+    default=10 * 365,
+    help="Days of price history used (default: 10 years)",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=False,
+    help="Last day of the window (default: today)",
+)
+@click.option(
+    "--depth",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Depth of the reported nodes (default: 1, the asset classes)",
+)
+@click.option("--rebalance", is_flag=True, help="Rebalance to the plan every period")
+@click.option("--seed", type=click.INT, required=False, help="Seed of the draws")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Number of processes simulating (default: all cores)",
+)
+@click.option(
+    "--memory",
+    type=click.IntRange(min=1),
+    default=256,
+    help="MiB of returns a chunk of paths may use (default: 256)",
+)
+def simulate_plan(
+    projet_path: str,
+    paths: int,
+    years: int,
+    periods_per_year: int,
+    model: str,
+    window: int,
+    end,
+    depth: int,
+    rebalance: bool,
+    seed: Optional[int],
+    jobs: Optional[int],
+    memory: int,
+):
+    """Project the budget forward and show the percentiles per asset class
+
+    The leaves without price history are simulated as cash (no return).
+    Without rebalancing, every leaf is bought once and held.
+    """
+    project = project_folder(projet_path)
+    plan = load_plan(project)
+    if not plan.budget:
+        click.echo("Allocate a budget to the portfolio first")
+        exit(os.EX_DATAERR)
+    leaf_paths, symbols, priced = priced_leaves(project, plan)
+    if not priced:
+        click.echo("At least one leaf needs a price history to simulate")
+        exit(os.EX_DATAERR)
+    last_day = end.date() if end else date.today()
+    daily = daily_returns(
+        price_matrix(
+            PriceStore(project),
+            [symbols[position] for position in priced],
+            last_day - timedelta(days=window - 1),
+            last_day,
+        )
+    )
+    try:
+        priced_history = period_returns(daily, periods_per_year)
+    except ValueError as error:
+        click.echo(f"Cannot simulate: {error}")
+        exit(os.EX_DATAERR)
+    history = np.zeros((len(priced_history), len(leaf_paths)))
+    history[:, priced] = priced_history
+    # Leaves reported under their ancestor at the given depth
+    flat_plan = flatten_plan(plan)
+    weights = plan_weights(flat_plan)[flat_plan.is_leaf]
+    groups = ["/".join(path.split("/")[:depth]) for path in leaf_paths]
+    group_of = {group: number for number, group in enumerate(dict.fromkeys(groups))}
+    membership = np.zeros((len(leaf_paths), len(group_of)))
+    membership[np.arange(len(groups)), [group_of[group] for group in groups]] = 1
+    outcomes = simulate(
+        SimulationModel(
+            history,
+            weights,
+            membership,
+            float(plan.budget),
+            years * periods_per_year,
+            model,
+            rebalance,
+        ),
+        paths,
+        seed,
+        jobs,
+        memory * 2**20,
+    )
+    table = pd.DataFrame(
+        outcome_percentiles(outcomes).T,
+        index=list(group_of) + ["total"],
+        columns=[f"p{point}" for point in percentiles],
+    )
+    click.echo(table.to_string(float_format=lambda value: f"{value:.2f}"))
+
+
+@optimize_plan.command("backtest")
+@project_path_option
+@click.option(
+    "-s",
+    "--strategy",
+    type=click.Choice(list(strategies)),
+    default="threshold",
+    help="Selling/rebalancing strategy replayed (default: threshold)",
+)
+@click.option(
+    "-P",
+    "--parameter",
+    "parameters",
+    multiple=True,
+    help="Strategy parameter values: name=1,2,3 or name=start:stop:count",
+)
+@click.option(
+    "--window",
+    type=click.IntRange(min=2),
+    default=20 * 365,
+    help="Days of price history replayed (default: 20 years)",
+)
+@click.option(
+    "--end",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=False,
+    help="Last day of the window (default: today)",
+)
+@click.option(
+    "--cost",
+    type=click.FloatRange(min=0),
+    default=0.1,
+    help="Cost of a trade in percent of the traded amount (default: 0.1)",
+)
+@click.option(
+    "--top",
+    type=click.IntRange(min=1),
+    default=10,
+    help="Number of parameter sets shown, best final value first (default: 10)",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Number of processes backtesting (default: all cores)",
+)
+def backtest(
+    projet_path: str,
+    strategy: str,
+    parameters: Tuple[str, ...],
+    window: int,
+    end,
+    cost: float,
+    top: int,
+    jobs: Optional[int],
+):
+    """Replay the price history against a strategy for every parameter set
+
+    The plan is bought the first day every leaf having a price history is
+    priced, the other leaves are held as cash. Every combination of the
+    given parameter values is replayed.
+    """
+    grid = dict(parameter_values(text) for text in parameters)
+    kinds = strategies[strategy].parameters
+    unknown = set(grid) - set(kinds)
+    if unknown:
+        raise click.BadParameter(
+            f"{strategy} has no parameter {', '.join(sorted(unknown))}",
+            param_hint="--parameter",
+        )
+    for name, values in grid.items():
+        if kinds[name] is int:
+            grid[name] = list(dict.fromkeys(int(round(value)) for value in values))
+    combinations = parameter_grid(grid)
+    for parameters in combinations:
+        try:
+            strategies[strategy](**parameters)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint="--parameter")
+    project = project_folder(projet_path)
+    plan = load_plan(project)
+    paths, symbols, priced = priced_leaves(project, plan)
+    if not priced:
+        click.echo("At least one leaf needs a price history to backtest")
+        exit(os.EX_DATAERR)
+    last_day = end.date() if end else date.today()
+    prices = forward_fill(
+        price_matrix(
+            PriceStore(project),
+            [symbols[position] for position in priced],
+            last_day - timedelta(days=window - 1),
+            last_day,
+        )
+    )
+    # Replay from the first day every priced leaf has a price
+    prices = prices[~np.isnan(prices).any(axis=1)]
+    if len(prices) < 2:
+        click.echo("Not enough common price history to backtest")
+        exit(os.EX_DATAERR)
+    flat_plan = flatten_plan(plan)
+    target = plan_weights(flat_plan)[flat_plan.is_leaf][priced]
+    results = sweep(
+        prices,
+        target,
+        strategy,
+        combinations,
+        float(plan.budget or 1),
+        cost / 100,
+        jobs,
+    )
+    table = pd.concat(
+        [
+            pd.DataFrame(combinations, index=range(len(combinations))),
+            pd.DataFrame(results),
+        ],
+        axis=1,
+    )
+    click.echo(
+        table.sort_values("final_value", ascending=False)
+        .head(top)
+        .to_string(index=False, float_format=lambda value: f"{value:.4f}")
+    )
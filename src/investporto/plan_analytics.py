@@ -0,0 +1,179 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_analytics
+
+:synopsis: Vectorized computations over the whole portfolio plan
+
+.. currentmodule:: plan_analytics
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from .plan_tree import PlanNode
+
+
+@dataclass
+class FlatPlan:
+    """Plan tree flattened in pre-order into parallel arrays
+
+    ``parent[i]`` is the position of the parent of node ``i`` (-1 for the
+    entry), parents always come before their children. ``path`` uses the
+    "stocks/large_caps" notation of the Portfolio index ("" for the entry).
+    """
+
+    path: List[str]
+    name: List[str]
+    parent: np.ndarray
+    depth: np.ndarray
+    percentage: np.ndarray
+    is_leaf: np.ndarray
+    budget: float
+
+    def __len__(self) -> int:
+        return len(self.path)
+
+
+def flatten_plan(root: PlanNode) -> FlatPlan:
+    """Flatten the plan in one pre-order traversal"""
+    paths, names, parents, depths, percentages, leaves = [], [], [], [], [], []
+    # (node, its path, position of its parent, its depth)
+    stack = [(root, "", -1, 0)]
+    while stack:
+        node, path, parent, depth = stack.pop()
+        position = len(paths)
+        paths.append(path)
+        names.append(node.name)
+        parents.append(parent)
+        depths.append(depth)
+        percentages.append(node.percentage if node.percentage is not None else 100.0)
+        children = node.children
+        leaves.append(not children)
+        prefix = f"{path}/" if path else ""
+        for child in reversed(children):
+            stack.append((child, f"{prefix}{child.name}", position, depth + 1))
+    return FlatPlan(
+        path=paths,
+        name=names,
+        parent=np.array(parents, dtype=np.int64),
+        depth=np.array(depths, dtype=np.int64),
+        percentage=np.array(percentages, dtype=np.float64),
+        is_leaf=np.array(leaves, dtype=bool),
+        budget=float(root.budget or 0.0),
+    )
+
+
+def plan_weights(flat_plan: FlatPlan) -> np.ndarray:
+    """Share of the whole budget of each node
+
+    The weight of a node is the product of the percentages along its path.
+    It is computed level by level: one vectorized multiplication per depth
+    level instead of one python operation per node.
+    """
+    weight = np.ones(len(flat_plan), dtype=np.float64)
+    fraction = flat_plan.percentage / 100.0
+    for level in range(1, int(flat_plan.depth.max(initial=0)) + 1):
+        at_level = np.flatnonzero(flat_plan.depth == level)
+        weight[at_level] = weight[flat_plan.parent[at_level]] * fraction[at_level]
+    return weight
+
+
+def compute_targets(root: PlanNode) -> pd.DataFrame:
+    """Absolute target amount of every node of the plan
+
+    Returns a DataFrame (pre-order, one row per node) with the columns
+    ``path``, ``name``, ``depth``, ``percentage``, ``weight`` (share of the
+    budget, 0 to 1), ``target_amount`` and ``is_leaf``.
+    """
+    flat_plan = flatten_plan(root)
+    weight = plan_weights(flat_plan)
+    return pd.DataFrame(
+        {
+            "path": flat_plan.path,
+            "name": flat_plan.name,
+            "depth": flat_plan.depth,
+            "percentage": flat_plan.percentage,
+            "weight": weight,
+            "target_amount": weight * flat_plan.budget,
+            "is_leaf": flat_plan.is_leaf,
+        }
+    )
+
+
+def subtree_sums(flat_plan: FlatPlan, values: np.ndarray) -> np.ndarray:
+    """Sum ``values`` (one per node) over the subtree of every node
+
+    The sums go up the tree level by level, deepest first: one vectorized
+    group-by on the parent positions per depth level.
+    """
+    sums = np.array(values, dtype=np.float64)
+    for level in range(int(flat_plan.depth.max(initial=0)), 0, -1):
+        at_level = np.flatnonzero(flat_plan.depth == level)
+        sums += np.bincount(
+            flat_plan.parent[at_level], weights=sums[at_level], minlength=len(sums)
+        )
+    return sums
+
+
+def compute_drift(
+    root: PlanNode, holdings: pd.DataFrame, against_budget: bool = False
+) -> pd.DataFrame:
+    """Drift between the plan and the actual holdings, for every node
+
+    ``holdings`` has a ``path`` (node of the plan, "stocks/large_caps"
+    notation) and a ``value`` column, any number of rows per path. The values
+    are joined to the plan in one operation and summed up over every subtree.
+    Values of paths unknown to the plan only count in the entry total.
+
+    The targets are a share of the current total value, or of the plan budget
+    with ``against_budget``. Returns a DataFrame (pre-order, one row per node)
+    with the columns ``path``, ``name``, ``depth``, ``is_leaf``,
+    ``target_weight``, ``actual_weight``, ``weight_drift``, ``target_amount``,
+    ``actual_amount``, ``drift_amount`` and ``relative_drift`` (drift amount
+    over target amount, NaN without target).
+    """
+    flat_plan = flatten_plan(root)
+    target_weight = plan_weights(flat_plan)
+    position = pd.Index(flat_plan.path).get_indexer(holdings["path"].fillna(""))
+    value = holdings["value"].to_numpy(dtype=np.float64)
+    known = position >= 0
+    actual_amount = np.bincount(
+        position[known], weights=value[known], minlength=len(flat_plan)
+    )
+    actual_amount[0] += value[~known].sum()
+    actual_amount = subtree_sums(flat_plan, actual_amount)
+    total = flat_plan.budget if against_budget else actual_amount[0]
+    target_amount = target_weight * total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        actual_weight = actual_amount / total if total else np.zeros(len(flat_plan))
+        relative_drift = np.where(
+            target_amount != 0,
+            (actual_amount - target_amount) / target_amount,
+            np.nan,
+        )
+    return pd.DataFrame(
+        {
+            "path": flat_plan.path,
+            "name": flat_plan.name,
+            "depth": flat_plan.depth,
+            "is_leaf": flat_plan.is_leaf,
+            "target_weight": target_weight,
+            "actual_weight": actual_weight,
+            "weight_drift": actual_weight - target_weight,
+            "target_amount": target_amount,
+            "actual_amount": actual_amount,
+            "drift_amount": actual_amount - target_amount,
+            "relative_drift": relative_drift,
+        }
+    )
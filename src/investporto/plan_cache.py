@@ -0,0 +1,91 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_cache
+
+:synopsis: Binary sidecar cache of the loaded portfolio plan
+
+.. currentmodule:: plan_cache
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+# Environment variable enabling the cache for the cli commands
+plan_cache_env = "INVESTPORTO_PLAN_CACHE"
+
+# Bumped whenever the type of the cached tree changes
+cache_format = 2
+
+# Identify the yaml content a snapshot was made of: (mtime, size, hash)
+CacheKey = Tuple[int, int, str]
+
+
+def cache_enabled() -> bool:
+    """Return if the user asked for the plan cache (INVESTPORTO_PLAN_CACHE=1)"""
+    return os.environ.get(plan_cache_env, "").lower() in ("1", "true", "yes", "on")
+
+
+def cache_key(path_to_yaml: Path, content: bytes) -> CacheKey:
+    """Compute the key of the yaml file whose content was already read"""
+    stat = os.stat(path_to_yaml)
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return (stat.st_mtime_ns, stat.st_size, digest)
+
+
+class PlanCache:
+    """Snapshot of the plan tree stored next to the yaml file
+
+    The snapshot is a pickle of the tree, tagged with the key of the yaml
+    content it was built from. A warm load therefore skips both the yaml
+    parsing and the tree import. As any pickle, the sidecar file has to be
+    trusted: it lives in the (private) project folder and is never shared.
+    """
+
+    def __init__(self, path_to_yaml: Path):
+        path_to_yaml = Path(path_to_yaml)
+        self._path = path_to_yaml.with_name(f".{path_to_yaml.name}.cache")
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def load(self, key: CacheKey) -> Optional[Any]:
+        """Return the cached tree if it was built from the given yaml key"""
+        try:
+            with open(self._path, "rb") as cache_file:
+                cached_format, cached_key, tree = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            # No cache or a broken one: behave like a cold start
+            return None
+        if cached_format != cache_format or cached_key != key:
+            return None
+        return tree
+
+    def store(self, key: CacheKey, tree: Any):
+        """Store the tree snapshot (write errors only cost the next warm load)"""
+        temporary_path = self._path.with_name(f"{self._path.name}.tmp")
+        try:
+            with open(temporary_path, "wb") as cache_file:
+                pickle.dump(
+                    (cache_format, key, tree),
+                    cache_file,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(temporary_path, self._path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            temporary_path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Remove the snapshot"""
+        self._path.unlink(missing_ok=True)
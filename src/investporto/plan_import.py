@@ -0,0 +1,123 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_import
+
+:synopsis: Portfolio plan built out of a flat table of paths
+
+.. currentmodule:: plan_import
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .plan_tree import PlanNode
+
+# Accepted deviation of the children percentages sum from 100%
+sum_tolerance = 1e-6
+
+# Optional columns stored on the entry of the plan
+entry_columns = ("budget", "currency")
+
+# Optional columns stored on the node of their row
+node_columns = ("symbol",)
+
+
+def normalize_paths(paths: pd.Series) -> pd.Series:
+    """Paths written the way the CLI writes them: lowercase, ``_`` instead of
+    spaces, no leading or trailing ``/``"""
+    return (
+        paths.astype(str)
+        .str.strip()
+        .str.strip("/")
+        .str.replace(r"\s*/\s*", "/", regex=True)
+        .str.replace(r"\s+", "_", regex=True)
+        .str.lower()
+    )
+
+
+def plan_errors(table: pd.DataFrame) -> List[str]:
+    """Everything wrong with a table of normalized ``path``/``percentage``
+    rows, all the sibling sums being checked in one group-by"""
+    errors = []
+    path = table["path"]
+    percentage = table["percentage"]
+    for duplicate in path[path.duplicated()].unique():
+        errors.append(f"{duplicate} is defined more than once")
+    for empty in path[path == ""].index:
+        errors.append(f"row {empty + 1} has no path")
+    bad = ~((percentage > 0) & (percentage <= 100))
+    for row_path, row_percentage in zip(path[bad], percentage[bad]):
+        errors.append(f"{row_path}: percentage {row_percentage} is not allowed")
+    parent = path.str.rpartition("/")[0]
+    orphan = (parent != "") & ~parent.isin(path)
+    for missing in parent[orphan].unique():
+        errors.append(f"{missing} is missing (parent of other rows)")
+    totals = percentage.groupby(parent, sort=True).sum()
+    for parent_path, total in totals[(totals - 100).abs() > sum_tolerance].items():
+        errors.append(f"{parent_path or 'entry'}: children sum up to {total}%")
+    return errors
+
+
+def plan_from_table(table: pd.DataFrame, root: Optional[PlanNode] = None) -> PlanNode:
+    """Build a plan out of one row per node (``path``, ``percentage``)
+
+    Optional ``budget`` and ``currency`` columns set those of the entry (first
+    value found), an optional ``symbol`` column the symbol of the node. The
+    rows can come in any order. Raises ValueError listing every problem found
+    at once, the plan is only built out of a valid table. The budget and
+    currency of ``root`` are kept when the table has none.
+    """
+    missing = {"path", "percentage"} - set(table.columns)
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(sorted(missing))}")
+    table = table.reset_index(drop=True).assign(
+        path=normalize_paths(table["path"].fillna("")),
+        percentage=pd.to_numeric(table["percentage"], errors="coerce").astype(float),
+    )
+    errors = plan_errors(table)
+    if errors:
+        raise ValueError("; ".join(errors))
+    entry = PlanNode(root.name if root is not None else "entry")
+    entry.budget = root.budget if root is not None else 0.0
+    entry.extra = dict(root.extra) if root is not None and root.extra else None
+    for column in entry_columns:
+        if column in table.columns:
+            values = table[column].dropna()
+            if len(values):
+                value = values.iloc[0]
+                if column == "budget":
+                    entry.budget = float(value)
+                else:
+                    entry.extra = dict(
+                        entry.extra or {}, **{column: str(value).upper()}
+                    )
+    # Parents first: sort by depth, keeping the order of the table otherwise
+    depth = table["path"].str.count("/").to_numpy()
+    order = np.argsort(depth, kind="stable")
+    paths = table["path"].to_numpy()[order]
+    percentages = table["percentage"].to_numpy(dtype=np.float64)[order]
+    names = [column for column in node_columns if column in table.columns]
+    extras = [table[column].to_numpy()[order] for column in names]
+    nodes = {"": entry}
+    for position, (path, percentage) in enumerate(zip(paths, percentages)):
+        parent_path, _, name = path.rpartition("/")
+        extra = {
+            column: str(values[position])
+            for column, values in zip(names, extras)
+            if not pd.isna(values[position])
+        }
+        node = PlanNode(name, percentage=float(percentage), **extra)
+        # Fresh nodes cannot create a loop, attach them directly
+        nodes[parent_path]._attach(node)
+        nodes[path] = node
+    return entry
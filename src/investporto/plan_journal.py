@@ -0,0 +1,175 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_journal
+
+:synopsis: Write-ahead journal of the edits of the portfolio plan
+
+.. currentmodule:: plan_journal
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Environment variable making the cli commands journal their edits
+plan_journal_env = "INVESTPORTO_PLAN_JOURNAL"
+
+# Journaled edits beyond which the journal is folded into the yaml file
+journal_max_records = 1000
+
+# Portfolio edits small enough to be journaled (the other ones are saved
+# as a whole plan)
+journaled_operations = ("add_node", "remove_node", "move_node", "allocate_budget")
+
+# (method name, positional arguments, keyword arguments)
+Operation = Tuple[str, tuple, dict]
+
+
+def journal_enabled() -> bool:
+    """Return if the user asked for the journal (INVESTPORTO_PLAN_JOURNAL=1)"""
+    return os.environ.get(plan_journal_env, "").lower() in ("1", "true", "yes", "on")
+
+
+def snapshot_digest(content: bytes) -> str:
+    """Identify the yaml content a journal applies to"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class PlanJournal:
+    """Edits of the plan appended next to the yaml file (the snapshot)
+
+    The journal is a json lines file: a header naming the snapshot it applies
+    to, then one record per edit (operation, arguments, time). Appending an
+    edit costs one small write whatever the size of the plan, loading replays
+    the records on top of the snapshot.
+
+    Saving a new snapshot resets the journal. If that is interrupted, the
+    header no longer matches the snapshot and the journal, already part of
+    it, is ignored. A record cut by a crash is ignored as well (and dropped by
+    the next append).
+    """
+
+    def __init__(self, path_to_yaml: Path):
+        path_to_yaml = Path(path_to_yaml)
+        self._path = path_to_yaml.with_name(f".{path_to_yaml.name}.journal")
+        # Snapshot the journal applies to, valid part of the file
+        self._digest: Optional[str] = None
+        self._size = 0
+        self.records = 0
+        # Records of a journal not matching the snapshot
+        self.ignored = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def active(self) -> bool:
+        """Return if edits can be appended (the journal matches the plan)"""
+        return self._digest is not None
+
+    def load(self, content: bytes) -> List[Operation]:
+        """Return the edits to replay on top of the yaml ``content``"""
+        self._digest = None
+        self._size = 0
+        self.records = 0
+        self.ignored = 0
+        try:
+            with open(self._path, "rb") as journal_file:
+                lines = journal_file.read().split(b"\n")
+        except FileNotFoundError:
+            return []
+        digest = snapshot_digest(content)
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = {}
+        if header.get("snapshot") != digest:
+            self.ignored = sum(1 for line in lines[1:] if line)
+            return []
+        self._digest = digest
+        self._size = len(lines[0]) + 1
+        operations = []
+        # The last line is either empty or cut by a crash
+        for line in lines[1:-1]:
+            try:
+                record = json.loads(line)
+                operation = (
+                    str(record["op"]),
+                    tuple(record.get("args", ())),
+                    dict(record.get("kwargs", {})),
+                )
+            except (ValueError, TypeError, KeyError):
+                break
+            operations.append(operation)
+            self._size += len(line) + 1
+        self.records = len(operations)
+        return operations
+
+    def append(self, operations: List[Operation]):
+        """Append (and flush to the disk) edits of the loaded snapshot"""
+        if self._digest is None:
+            raise RuntimeError(f"{self._path} does not match the plan")
+        now = round(time.time(), 3)
+        content = b"".join(
+            json.dumps(
+                {"op": name, "args": list(args), "kwargs": kwargs, "time": now},
+                separators=(",", ":"),
+            ).encode()
+            + b"\n"
+            for name, args, kwargs in operations
+        )
+        with open(self._path, "r+b") as journal_file:
+            # Drop what a crash may have left after the last record
+            journal_file.truncate(self._size)
+            journal_file.seek(self._size)
+            journal_file.write(content)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self._size += len(content)
+        self.records += len(operations)
+
+    def reset(self, content: bytes):
+        """Start an empty journal for the yaml ``content`` (atomically)"""
+        digest = snapshot_digest(content)
+        header = json.dumps({"snapshot": digest}).encode() + b"\n"
+        temporary_path = self._path.with_name(f"{self._path.name}.tmp")
+        with open(temporary_path, "wb") as journal_file:
+            journal_file.write(header)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temporary_path, self._path)
+        self._digest = digest
+        self._size = len(header)
+        self.records = 0
+        self.ignored = 0
+
+    def reject(self, replayed: int):
+        """Ignore the records after the ``replayed`` first ones (the next one
+        cannot be applied): nothing is appended anymore, the next save drops
+        the journal"""
+        self.ignored = self.records - replayed
+        self.records = replayed
+        self._digest = None
+
+    def discard(self):
+        """Remove the journal (its edits are part of the snapshot)"""
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        self._digest = None
+        self._size = 0
+        self.records = 0
+        self.ignored = 0
@@ -0,0 +1,102 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_lock
+
+:synopsis: Advisory lock of the portfolio plan shared by concurrent commands
+
+.. currentmodule:: plan_lock
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Environment variable switching the writers to optimistic concurrency
+optimistic_env = "INVESTPORTO_OPTIMISTIC"
+
+
+def optimistic_enabled() -> bool:
+    """Return if the user asked for optimistic concurrency
+    (INVESTPORTO_OPTIMISTIC=1)"""
+    return os.environ.get(optimistic_env, "").lower() in ("1", "true", "yes", "on")
+
+
+class PlanLock:
+    """``flock`` of a sidecar file next to the yaml file
+
+    The yaml file itself cannot be locked: every save replaces it by a new
+    file. Readers take a shared lock (they run in parallel), writers an
+    exclusive one. The lock is advisory: it only protects from the other
+    investporto commands. Without ``fcntl`` (Windows), nothing is locked.
+    """
+
+    def __init__(self, path_to_yaml: Path):
+        path_to_yaml = Path(path_to_yaml)
+        self._path = path_to_yaml.with_name(f".{path_to_yaml.name}.lock")
+        self._file: Optional[int] = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def locked(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        """Take the lock (waits for it unless ``blocking`` is False)
+
+        Returns False if the lock is held by someone else and ``blocking`` is
+        False.
+        """
+        if fcntl is None:
+            return True
+        if self._file is not None:
+            raise RuntimeError(f"{self._path} is already locked")
+        descriptor = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(descriptor, operation)
+        except BlockingIOError:
+            os.close(descriptor)
+            return False
+        except BaseException:
+            os.close(descriptor)
+            raise
+        self._file = descriptor
+        return True
+
+    def release(self):
+        """Give the lock back (nothing happens if it is not held)"""
+        if self._file is None:
+            return
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        finally:
+            os.close(self._file)
+            self._file = None
+
+    @contextmanager
+    def holding(self, shared: bool = False) -> Iterator["PlanLock"]:
+        """Hold the lock within a with block"""
+        self.acquire(shared)
+        try:
+            yield self
+        finally:
+            self.release()
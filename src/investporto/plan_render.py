@@ -0,0 +1,161 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_render
+
+:synopsis: Rendering of the portfolio plan tree
+
+.. currentmodule:: plan_render
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from typing import Iterator, Optional, Set, Tuple
+
+from rich.console import Console
+from rich.text import Text
+from rich.tree import Tree
+
+from .plan_tree import PlanNode
+
+# Styles of the allocation status
+ok_style = "color(2)"  # green
+error_style = "color(1)"  # red
+
+# Lines written at once on non terminal outputs
+_chunk_size = 1024
+
+
+def walk_plan(
+    root: PlanNode,
+    root_path: str = "",
+    max_depth: Optional[int] = None,
+    skip_leaves: bool = False,
+) -> Iterator[Tuple[str, PlanNode, str, int]]:
+    """Traverse the plan once, pre-order, yielding (prefix, node, path, depth)
+
+    ``prefix`` is the tree drawing of the line (as anytree's RenderTree draws
+    it), ``path`` the "stocks/large_caps" path of the node, ``depth`` its depth
+    below ``root``. Nodes deeper than ``max_depth`` are not visited, leaves are
+    not yielded with ``skip_leaves`` (the drawing of their siblings still takes
+    them into account).
+    """
+    # (node, its path, its depth, its prefix, prefix of its children)
+    stack = [(root, root_path, 0, "", "")]
+    while stack:
+        node, path, depth, prefix, children_prefix = stack.pop()
+        if skip_leaves and node.is_leaf:
+            continue
+        yield prefix, node, path, depth
+        if max_depth is not None and depth >= max_depth:
+            continue
+        children = node.children
+        path_prefix = f"{path}/" if path else ""
+        for position in range(len(children) - 1, -1, -1):
+            child = children[position]
+            is_last = position == len(children) - 1
+            stack.append(
+                (
+                    child,
+                    f"{path_prefix}{child.name}",
+                    depth + 1,
+                    children_prefix + ("└── " if is_last else "├── "),
+                    children_prefix + ("    " if is_last else "│   "),
+                )
+            )
+
+
+class PlanRenderer:
+    """Render the plan with one shared console
+
+    On a terminal the whole tree is built once as a ``rich.tree.Tree`` and
+    printed in one go, with the allocation status as colors. Other outputs
+    (pipes, files) get plain text lines written in chunks, without any rich
+    overhead.
+    """
+
+    def __init__(self, console: Optional[Console] = None):
+        self._console = console or Console()
+
+    def visualize(
+        self,
+        root: PlanNode,
+        invalid: Set[str],
+        root_path: str = "",
+        max_depth: Optional[int] = None,
+    ):
+        """Show the percentage of each node (colored by allocation status)"""
+
+        def label(node: PlanNode) -> str:
+            if node.percentage is not None:
+                return f"( {node.name} , {node.percentage} )"
+            return node.name
+
+        self._render(root, invalid, root_path, max_depth, label, check=False)
+
+    def check(
+        self,
+        root: PlanNode,
+        invalid: Set[str],
+        root_path: str = "",
+        max_depth: Optional[int] = None,
+    ):
+        """Show the allocation status of each node having children"""
+
+        def label(node: PlanNode) -> str:
+            return node.name
+
+        self._render(root, invalid, root_path, max_depth, label, check=True)
+
+    def _render(self, root, invalid, root_path, max_depth, label, check):
+        # The check only concerns the nodes having children
+        lines = walk_plan(root, root_path, max_depth, skip_leaves=check)
+        if self._console.is_terminal:
+            self._render_tree(lines, invalid, label, with_status=check)
+        else:
+            self._render_plain(lines, invalid, label, with_status=check)
+
+    @staticmethod
+    def _status(path: str, invalid: Set[str]) -> str:
+        return " -> allocation error!" if path in invalid else " -> ok!"
+
+    def _render_tree(self, lines, invalid, label, with_status):
+        tree = None
+        # Last rich branch opened at each depth
+        branches = []
+        for _, node, path, depth in lines:
+            style = None
+            if not node.is_leaf:
+                style = error_style if path in invalid else ok_style
+            text = label(node)
+            if with_status:
+                text += self._status(path, invalid)
+            text = Text(text, style=style or "")
+            if tree is None:
+                tree = branch = Tree(text)
+            else:
+                branch = branches[depth - 1].add(text)
+            del branches[depth:]
+            branches.append(branch)
+        if tree is not None:
+            self._console.print(tree)
+
+    def _render_plain(self, lines, invalid, label, with_status):
+        file = self._console.file
+        chunk = []
+        for prefix, node, path, _ in lines:
+            line = f"{prefix}{label(node)}"
+            if with_status:
+                line += self._status(path, invalid)
+            chunk.append(line)
+            if len(chunk) >= _chunk_size:
+                file.write("\n".join(chunk) + "\n")
+                chunk = []
+        if chunk:
+            file.write("\n".join(chunk) + "\n")
+        file.flush()
@@ -0,0 +1,218 @@
+"""
+Investment portfolio
+**************************
+
+:module: plan_tree
+
+:synopsis: Compact tree storing the portfolio plan
+
+.. currentmodule:: plan_tree
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from typing import Dict, Iterator, Optional, Tuple
+
+# Attributes with a dedicated slot, all the other ones end up in extra
+_known_attributes = ("name", "percentage", "budget", "children")
+
+
+class PlanNode:
+    """Node of the portfolio plan
+
+    Replaces the generic ``anytree.Node`` (one ``__dict__`` per node) by a
+    ``__slots__`` class: the usual attributes have a slot, the rare other ones
+    (anything else found in the yaml file) go to ``extra``. The children are
+    kept in a dict by name, so finding, adding and removing a child is O(1).
+    The leaves, most of the nodes, do not allocate any dict at all.
+
+    The API is the subset of anytree the tool relies on (``name``, ``parent``,
+    ``children``, ``path``, ``descendants``, ``is_leaf``, ``RenderTree``
+    support) and :meth:`from_dict` / :meth:`to_dict` read and write the same
+    dict layout as ``anytree.importer.DictImporter`` /
+    ``anytree.exporter.DictExporter``.
+    """
+
+    __slots__ = ("_name", "percentage", "budget", "extra", "_parent", "_children")
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["PlanNode"] = None,
+        percentage: Optional[float] = None,
+        budget: Optional[float] = None,
+        **extra,
+    ):
+        self._name = name
+        self.percentage = percentage
+        self.budget = budget
+        self.extra = extra or None
+        self._parent = None
+        self._children = None
+        self.parent = parent
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, name: str):
+        parent = self._parent
+        if parent is not None:
+            parent._detach(self)
+        self._name = name
+        if parent is not None:
+            parent._attach(self)
+
+    @property
+    def parent(self) -> Optional["PlanNode"]:
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent: Optional["PlanNode"]):
+        if parent is self._parent:
+            return
+        if parent is not None:
+            # Forbid loops
+            ancestor = parent
+            while ancestor is not None:
+                if ancestor is self:
+                    raise ValueError(f"{self.name} cannot be its own ancestor")
+                ancestor = ancestor._parent
+        if self._parent is not None:
+            self._parent._detach(self)
+        if parent is not None:
+            parent._attach(self)
+
+    def _attach(self, child: "PlanNode"):
+        if self._children is None:
+            self._children = {}
+        if child._name in self._children:
+            raise ValueError(f"{self.name} has already a child named {child.name}")
+        self._children[child._name] = child
+        child._parent = self
+
+    def _detach(self, child: "PlanNode"):
+        del self._children[child._name]
+        if not self._children:
+            self._children = None
+        child._parent = None
+
+    @property
+    def children(self) -> Tuple["PlanNode", ...]:
+        if self._children is None:
+            return ()
+        return tuple(self._children.values())
+
+    def child(self, name: str) -> Optional["PlanNode"]:
+        """Return the child of the given name (None if there is none)"""
+        if self._children is None:
+            return None
+        return self._children.get(name)
+
+    @property
+    def is_leaf(self) -> bool:
+        return self._children is None
+
+    @property
+    def is_root(self) -> bool:
+        return self._parent is None
+
+    @property
+    def path(self) -> Tuple["PlanNode", ...]:
+        """Nodes from the root to this node"""
+        path = []
+        node = self
+        while node is not None:
+            path.append(node)
+            node = node._parent
+        return tuple(reversed(path))
+
+    @property
+    def depth(self) -> int:
+        depth = 0
+        node = self._parent
+        while node is not None:
+            depth += 1
+            node = node._parent
+        return depth
+
+    def iter_preorder(self) -> Iterator["PlanNode"]:
+        """Iterate over this node and all its descendants (pre-order)"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node._children is not None:
+                stack.extend(reversed(node._children.values()))
+
+    @property
+    def descendants(self) -> Tuple["PlanNode", ...]:
+        iterator = self.iter_preorder()
+        next(iterator)
+        return tuple(iterator)
+
+    def attributes(self) -> Dict[str, object]:
+        """Attributes of the node, as exported to the yaml file"""
+        attributes = {"name": self._name}
+        if self.percentage is not None:
+            attributes["percentage"] = self.percentage
+        if self.budget is not None:
+            attributes["budget"] = self.budget
+        if self.extra:
+            attributes.update(self.extra)
+        return attributes
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlanNode":
+        """Build a tree out of nested dicts (DictImporter layout)"""
+        root = cls._from_attributes(data, None)
+        stack = [(root, data.get("children"))]
+        while stack:
+            parent, children = stack.pop()
+            for child_data in children or ():
+                child = cls._from_attributes(child_data, parent)
+                stack.append((child, child_data.get("children")))
+        return root
+
+    @classmethod
+    def _from_attributes(cls, data: dict, parent: Optional["PlanNode"]) -> "PlanNode":
+        extra = {
+            key: value for key, value in data.items() if key not in _known_attributes
+        }
+        node = cls(
+            data["name"],
+            percentage=data.get("percentage"),
+            budget=data.get("budget"),
+            **extra,
+        )
+        # A freshly built node cannot create a loop, attach it directly
+        if parent is not None:
+            parent._attach(node)
+        return node
+
+    def to_dict(self) -> dict:
+        """Convert the tree into nested dicts (DictExporter layout)"""
+        root = self.attributes()
+        stack = [(self, root)]
+        while stack:
+            node, data = stack.pop()
+            if node._children is None:
+                continue
+            data["children"] = []
+            for child in node._children.values():
+                child_data = child.attributes()
+                data["children"].append(child_data)
+                stack.append((child, child_data))
+        return root
+
+    def __repr__(self) -> str:
+        path = "/" + "/".join(node.name for node in self.path)
+        attributes = self.attributes()
+        del attributes["name"]
+        arguments = "".join(f", {key}={value!r}" for key, value in attributes.items())
+        return f"{self.__class__.__name__}({path!r}{arguments})"
@@ -16,19 +16,38 @@ Investment portfolio
 """
 
 import click
+import contextlib
+import functools
+import inspect
+import io
 import os
+import tempfile
 
-from .types_and_vars import portfolio_plan_name
-from typing import Optional
+from .types_and_vars import portfolio_plan_name, validate_on_write_env
+from .plan_cache import PlanCache, cache_enabled, cache_key
+from .plan_journal import (
+    PlanJournal,
+    journal_enabled,
+    journal_max_records,
+    journaled_operations,
+)
+from .plan_lock import PlanLock, optimistic_enabled
+from .plan_tree import PlanNode
+from .plan_render import PlanRenderer
+from typing import Iterable, Optional, Tuple
+from decimal import Decimal
 from pathlib import Path
 import yaml
-from anytree.importer import DictImporter
-from anytree.exporter import DictExporter
-from anytree import Node, RenderTree
-from anytree.resolver import Resolver, ChildResolverError
 
 from rich.console import Console
 
+# Accepted deviation of the children percentages sum from 100%
+allocation_tolerance = Decimal("1e-6")
+
+# Use the libyaml bindings when available, they are by far faster
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 #  Create the portfolio plan
 @click.group()
 def portfolio_plan():
@@ -50,6 +69,24 @@ def project_path_option(function):
     return function
 
 
+def render_options(function):
+    """Define the common options limiting the rendering of the plan"""
+    function = click.option(
+        "--max-depth",
+        type=click.IntRange(min=0),
+        required=False,
+        help="Do not render nodes deeper than this",
+    )(function)
+    function = click.option(
+        "--subtree",
+        type=click.STRING,
+        required=False,
+        default="",
+        help="Only render the subtree of this path (e.g. stocks/large_caps)",
+    )(function)
+    return function
+
+
 def percentage_option(function):
     """Define the common percentage option"""
     function = click.option(
@@ -62,15 +99,118 @@ def percentage_option(function):
     return function
 
 
+def _normalize_path(path: str) -> str:
+    """Paths are lowercase (to minimize typos), without leading or trailing /"""
+    return path.lower().strip("/")
+
+
+def _recorded(method):
+    """Record the calls of a plan edit, to replay them on a concurrent save
+    (only the outermost edit is recorded, not the ones it calls, and only once
+    it succeeded: a rejected edit is not replayed)"""
+
+    @functools.wraps(method)
+    def record(self, *args, **kwargs):
+        if self._editing:
+            return method(self, *args, **kwargs)
+        self._editing = True
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            self._editing = False
+        self._operations.append((method.__name__, args, kwargs))
+        return result
+
+    return record
+
+
+def _to_decimal(node: PlanNode) -> Decimal:
+    """Exact value of the node percentage (33.3 + 33.3 + 33.4 == 100)"""
+    return Decimal(repr(float(node.percentage or 0.0)))
+
+
+class PlanValidationError(TypeError):
+    """The plan was not saved: it has allocation errors (validate on write)"""
+
+
 class Portfolio:
     """Manage the portfolio plan you define"""
 
-    def __init__(self, path_to_yaml: Path):
-        """open the yaml file and store the config"""
+    def __init__(
+        self,
+        path_to_yaml: Path,
+        use_cache: Optional[bool] = None,
+        validate_on_write: Optional[bool] = None,
+        read_only: bool = False,
+        optimistic: Optional[bool] = None,
+        use_journal: Optional[bool] = None,
+    ):
+        """open the yaml file and store the config
+
+        ``use_cache`` enables the binary sidecar cache of the plan (see
+        :class:`investporto.plan_cache.PlanCache`). By default it follows the
+        ``INVESTPORTO_PLAN_CACHE`` environment variable.
+
+        ``validate_on_write`` refuses to save a plan with allocation errors
+        (:class:`PlanValidationError`). By default it follows the
+        ``INVESTPORTO_VALIDATE_ON_WRITE`` environment variable.
+
+        Concurrent commands are kept apart with a lock of the plan (see
+        :class:`investporto.plan_lock.PlanLock`): a ``read_only`` portfolio
+        holds a shared lock (readers run in parallel) and never saves, the
+        other ones hold an exclusive lock while open. With ``optimistic``
+        (default: the ``INVESTPORTO_OPTIMISTIC`` environment variable) the
+        exclusive lock is only held to save: if the plan was saved by someone
+        else in between, the edits are replayed on top of that newer plan. The
+        optimistic saves count the versions of the plan (``version`` of the
+        entry).
+
+        ``use_journal`` (default: the ``INVESTPORTO_PLAN_JOURNAL`` environment
+        variable) appends the small edits to a journal next to the yaml file
+        instead of rewriting it (see
+        :class:`investporto.plan_journal.PlanJournal`), the journal being
+        folded into the yaml file once it holds ``journal_max_records`` edits.
+        An existing journal is always replayed on load.
+        """
         self._path_to_yaml = path_to_yaml
         self._plan = {}
         self.tree = None
-        pass
+        # True as soon as the in-memory plan differs from the yaml file
+        self._dirty = False
+        # path ("stocks/large_caps") -> node, kept in sync by add/remove
+        self._index = {}
+        # path of the parents ("" for the entry) -> sum of children percentages
+        self._children_totals = {}
+        # paths of the parents whose children do not sum up to 100%
+        self._invalid = set()
+        if validate_on_write is None:
+            validate_on_write = os.environ.get(validate_on_write_env, "").lower() in (
+                "1",
+                "true",
+                "yes",
+                "on",
+            )
+        self._validate_on_write = validate_on_write
+        if use_cache is None:
+            use_cache = cache_enabled()
+        self._cache = PlanCache(path_to_yaml) if use_cache else None
+        self._read_only = read_only
+        if optimistic is None:
+            optimistic = optimistic_enabled()
+        self._optimistic = optimistic
+        self._lock = PlanLock(path_to_yaml)
+        if use_journal is None:
+            use_journal = journal_enabled()
+        self._use_journal = use_journal
+        self._journal = PlanJournal(path_to_yaml)
+        # Version of the loaded plan, bumped by every optimistic save
+        self._version = 0
+        # (mtime, size, inode) of the yaml file and of the journal the plan was
+        # loaded from
+        self._loaded_state = None
+        # Edits since the load, replayed on a concurrent save
+        self._operations = []
+        self._editing = False
 
     def open(self):
         self.__enter__()
@@ -79,41 +219,427 @@ class Portfolio:
         self.__exit__(None, None, None)
 
     def __enter__(self):
-        with open(self._path_to_yaml, "r") as portfolio_plan_file:
-            # Load the yaml into a dict
-            dict_plan = yaml.load(portfolio_plan_file, Loader=yaml.SafeLoader)
-            if dict_plan:
-                # Transform the dict into a tree
-                importer = DictImporter()
-                self._plan = importer.import_(dict_plan)
-                # if yaml file is empty, instead of None, provide an empty dict
-                # for consistency
-            else:
-                self._plan = Node("entry", budget=0.0)
+        self._lock.acquire(shared=self._read_only or self._optimistic)
+        try:
+            self._load()
+        except BaseException:
+            self._lock.release()
+            raise
+        if self._optimistic and not self._read_only:
+            # Only locked again to save
+            self._lock.release()
         # If the open was successful, return us
         return self
 
+    def _load(self):
+        """Read the plan out of the yaml file (or of the cache), then replay
+        the journal on top of it"""
+        self._operations = []
+        self._loaded_state = self._stored_state()
+        with open(self._path_to_yaml, "rb") as portfolio_plan_file:
+            content = portfolio_plan_file.read()
+        # Warm start: reuse the snapshot of this exact yaml content
+        key = None
+        cached_plan = None
+        if self._cache and content:
+            key = cache_key(self._path_to_yaml, content)
+            cached_plan = self._cache.load(key)
+        if cached_plan is not None:
+            self._plan = cached_plan
+            self._dirty = False
+            self._build_index()
+            self._version = self._plan_version()
+            self._replay_journal(content)
+            return
+        # Load the yaml into a dict
+        dict_plan = yaml.load(content, Loader=YamlLoader)
+        if dict_plan:
+            # Transform the dict into a tree
+            self._plan = PlanNode.from_dict(dict_plan)
+            self._dirty = False
+            if key:
+                self._cache.store(key, self._plan)
+            # if yaml file is empty, instead of None, provide an empty dict
+            # for consistency
+        else:
+            self._plan = PlanNode("entry", budget=0.0)
+            # The default plan is not yet part of the file
+            self._dirty = True
+        self._build_index()
+        self._version = self._plan_version()
+        self._replay_journal(content)
+
+    def _replay_journal(self, content: bytes):
+        """Apply the journaled edits of the yaml ``content``"""
+        operations = self._journal.load(content)
+        if self._journal.ignored:
+            click.echo(
+                f"{self._journal.path.name} does not match {self._path_to_yaml},"
+                f" its {self._journal.ignored} edits are ignored"
+            )
+        if not operations:
+            return
+        # The journaled edits are already stored
+        dirty = self._dirty
+        rejected = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            for number, (name, args, kwargs) in enumerate(operations, start=1):
+                try:
+                    if name not in journaled_operations:
+                        raise TypeError(f"unknown operation {name}")
+                    getattr(self, name)(*args, **kwargs)
+                except (TypeError, ValueError) as error:
+                    rejected = (number, error)
+                    break
+        self._operations = []
+        self._dirty = dirty
+        if rejected:
+            number, error = rejected
+            self._journal.reject(number - 1)
+            click.echo(
+                f"{self._journal.path.name}: edit {number} cannot be replayed"
+                f" ({str(error).strip()}), it and the later ones are ignored"
+            )
+
     def __exit__(self, exc_type, exc, exc_tb):
-        # If the received values are different to None, an error occurred!
-        if exc_type != exc != exc_tb != None:
-            click.echo(f"Error occurred: {exc_type}, {exc}, {exc_tb}")
-        # No, error found, we try to save the configuration
-        with open(self._path_to_yaml, "w") as portfolio_plan_file:
-            # Convert tree to dict
-            exporter = DictExporter()
-            yaml.dump(
-                exporter.export(self._plan),
-                portfolio_plan_file,
-                default_flow_style=False,
+        try:
+            # If the received values are different to None, an error occurred!
+            if exc_type is not None:
+                click.echo(f"Error occurred: {exc_type}, {exc}, {exc_tb}")
+                # Do not save a plan that was potentially half modified
+                return
+            # No, error found, we save the configuration if it changed
+            if self._dirty and not self._read_only:
+                self.commit()
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _file_stat(file) -> Optional[tuple]:
+        """What tells if a file was replaced or appended to (None if missing)"""
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _stored_state(self) -> tuple:
+        return (
+            self._file_stat(self._path_to_yaml),
+            self._file_stat(self._journal.path),
+        )
+
+    def _plan_version(self) -> int:
+        return int((self._plan.extra or {}).get("version", 0))
+
+    def commit(self):
+        """Save the modifications, replaying them on top of the plan saved by
+        someone else in the meantime in optimistic mode
+
+        The replayed edits raise as they would have on that newer plan (e.g.
+        TypeError for a parent removed in between), nothing is saved then.
+        """
+        if not self._optimistic:
+            self._write()
+            return
+        with self._lock.holding():
+            if self._replaced():
+                # Someone else saved: edit their plan instead
+                operations = self._operations
+                self._load()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self._replay(operations)
+            self._write()
+
+    def _replaced(self) -> bool:
+        """Return if the plan was saved since it was loaded"""
+        return self._stored_state() != self._loaded_state
+
+    def _write(self):
+        """Append the edits to the journal when they all can be, save the
+        whole plan otherwise (folding the journal into it)"""
+        if (
+            not self._use_journal
+            or not self._journal.active
+            or not self._operations
+            or any(name not in journaled_operations for name, _, _ in self._operations)
+            or self._journal.records + len(self._operations) > journal_max_records
+        ):
+            self.save()
+            return
+        self._check_allocations()
+        try:
+            self._journal.append(self._operations)
+        except TypeError:
+            # Arguments json cannot store
+            self.save()
+            return
+        self._dirty = False
+        self._operations = []
+        self._loaded_state = self._stored_state()
+
+    def _check_allocations(self):
+        if self._validate_on_write and self._invalid:
+            raise PlanValidationError(
+                "allocation errors in: "
+                + ", ".join(path or self._plan.name for path in sorted(self._invalid))
             )
 
-    def allocate_budget(self, budget: float):
+    def _replay(self, operations):
+        for name, args, kwargs in operations:
+            getattr(self, name)(*args, **kwargs)
+
+    def compact(self) -> int:
+        """Fold the journal into the yaml file, return the number of folded
+        edits"""
+        folded = self._journal.records
+        if folded or self._journal.ignored:
+            self.save()
+        return folded
+
+    def save(self):
+        """Write the plan to the yaml file (atomically)
+
+        The plan is written into a temporary file of the same folder which then
+        replaces the yaml file, so an interrupted save never leaves a truncated
+        plan behind. The journal is reset afterwards: the yaml file holds its
+        edits.
+        """
+        self._check_allocations()
+        path_to_yaml = Path(self._path_to_yaml)
+        if self._optimistic:
+            self._version += 1
+            self._plan.extra = dict(self._plan.extra or {}, version=self._version)
+        # Convert tree to dict
+        content = yaml.dump(
+            self._plan.to_dict(),
+            Dumper=YamlDumper,
+            default_flow_style=False,
+        ).encode()
+        with tempfile.NamedTemporaryFile(
+            "wb",
+            dir=path_to_yaml.parent,
+            prefix=f".{path_to_yaml.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as portfolio_plan_file:
+            try:
+                portfolio_plan_file.write(content)
+                portfolio_plan_file.flush()
+                os.fsync(portfolio_plan_file.fileno())
+            except BaseException:
+                os.unlink(portfolio_plan_file.name)
+                raise
+        # Keep the permissions of the plan we replace
+        if path_to_yaml.exists():
+            os.chmod(portfolio_plan_file.name, path_to_yaml.stat().st_mode & 0o7777)
+        os.replace(portfolio_plan_file.name, path_to_yaml)
+        if self._use_journal:
+            self._journal.reset(content)
+        else:
+            self._journal.discard()
+        self._dirty = False
+        self._operations = []
+        self._loaded_state = self._stored_state()
+        # The next load is a warm one
+        if self._cache:
+            self._cache.store(cache_key(path_to_yaml, content), self._plan)
+
+    def _build_index(self):
+        """Index all the nodes of the plan by their path and sum up the
+        percentages of the children of each node"""
+        self._index = {}
+        self._children_totals = {}
+        self._invalid = set()
+        stack = [("", self._plan)]
+        while stack:
+            path, node = stack.pop()
+            for child in node.children:
+                child_path = f"{path}/{child.name}" if path else child.name
+                self._index[child_path] = child
+                self._update_total(path, _to_decimal(child))
+                stack.append((child_path, child))
+
+    def _unindex(self, path: str, node: PlanNode):
+        """Drop a node and its whole subtree from the index"""
+        stack = [(path, node)]
+        while stack:
+            path, node = stack.pop()
+            del self._index[path]
+            self._children_totals.pop(path, None)
+            self._invalid.discard(path)
+            stack.extend((f"{path}/{child.name}", child) for child in node.children)
+
+    def _rename_subtree(self, path: str, new_path: str, node: PlanNode):
+        """Move the index entries of a node and its subtree to a new path (the
+        sums of the children percentages are kept as they are)"""
+        stack = [(path, new_path, node)]
+        while stack:
+            path, new_path, node = stack.pop()
+            self._index[new_path] = self._index.pop(path)
+            if path in self._children_totals:
+                self._children_totals[new_path] = self._children_totals.pop(path)
+            if path in self._invalid:
+                self._invalid.discard(path)
+                self._invalid.add(new_path)
+            stack.extend(
+                (f"{path}/{child.name}", f"{new_path}/{child.name}", child)
+                for child in node.children
+            )
+
+    def _detach(self, path: str, node: PlanNode):
+        """Take a node out of its parent"""
+        parent, parent_path = node.parent, path.rpartition("/")[0]
+        node.parent = None
+        if parent.is_leaf:
+            # Nodes without children are not verified
+            del self._children_totals[parent_path]
+            self._invalid.discard(parent_path)
+        else:
+            self._update_total(parent_path, -_to_decimal(node))
+
+    def _update_total(self, parent_path: str, delta: Decimal):
+        """Update the children percentages sum of a node and its validity"""
+        total = self._children_totals.get(parent_path, Decimal(0)) + delta
+        self._children_totals[parent_path] = total
+        if abs(total - 100) <= allocation_tolerance:
+            self._invalid.discard(parent_path)
+        else:
+            self._invalid.add(parent_path)
+
+    def invalid_allocations(self) -> list:
+        """Return the (path, children percentages sum) of the nodes whose
+        children do not sum up to 100%
+
+        The sums are maintained on each modification, so this only costs the
+        number of invalid nodes, the entry node has the path "".
+        """
+        return [
+            (path, float(self._children_totals[path])) for path in sorted(self._invalid)
+        ]
+
+    @_recorded
+    def allocate_budget(self, budget: float, currency: Optional[str] = None):
         if isinstance(budget, (int, float)):
+            if self._plan.budget != budget:
+                self._dirty = True
             self._plan.budget = budget
+            if currency is not None and currency.upper() != self.currency:
+                self._plan.extra = dict(self._plan.extra or {})
+                self._plan.extra["currency"] = currency.upper()
+                self._dirty = True
             Console().print("Budget allocated", style="color(2)")  # green
         else:
             Console().print("Type not allowed!", style="color(1)")  # red
 
+    @_recorded
+    def replace_plan(self, plan: PlanNode):
+        """Replace the whole plan (e.g. by an imported one)"""
+        self._plan = plan
+        self._build_index()
+        self._dirty = True
+
+    @property
+    def currency(self) -> Optional[str]:
+        """Currency of the budget, base currency of the valuations"""
+        return (self._plan.extra or {}).get("currency")
+
+    def get_node(self, path: str) -> Optional[PlanNode]:
+        """Return the node of a path of any depth (e.g.
+        "stocks/large_caps/tech/aapl", "" for the entry), None if there is
+        none"""
+        path = _normalize_path(path)
+        if not path:
+            return self._plan
+        return self._index.get(path)
+
+    @_recorded
+    def add_node(self, path: str, percentage: Optional[float] = None) -> PlanNode:
+        """Add the node of a path of any depth, or update its percentage
+
+        The parent has to exist already. Without percentage, the node has to
+        exist and is returned unchanged.
+        """
+        path = _normalize_path(path)
+        if not path:
+            raise TypeError(" the entry of the plan cannot be added")
+        parent_path, _, name = path.rpartition("/")
+        asset = self._index.get(path)
+        if not asset and not percentage:
+            raise TypeError(f" strange pair provided = ({name}, {percentage})")
+        if not percentage and asset:
+            # Case where percentage was not given
+            return asset
+        elif not (0.0 < percentage <= 100.0):
+            # Not allowed case
+            raise TypeError(f" percentage = {percentage} is not allowed")
+        if not asset:
+            parent = self.get_node(parent_path)
+            if parent is None:
+                raise TypeError(f" {parent_path} has to be added before {name}")
+            asset = PlanNode(name, parent, percentage=percentage)
+            self._index[path] = asset
+            self._update_total(parent_path, _to_decimal(asset))
+            self._dirty = True
+            print(f"{name} was allocated")
+        elif asset.percentage != percentage:
+            print(f"{name} percentage updated from {asset.percentage} to {percentage}")
+            delta = -_to_decimal(asset)
+            asset.percentage = percentage
+            self._update_total(parent_path, delta + _to_decimal(asset))
+            self._dirty = True
+        return asset
+
+    @_recorded
+    def remove_node(self, path: str):
+        """Remove the node of a path of any depth and its whole subtree"""
+        path = _normalize_path(path)
+        name = path.rpartition("/")[2]
+        asset = self._index.get(path) if path else None
+        if asset is None:
+            print(f"{name} was not found!")
+            return
+        self._unindex(path, asset)
+        self._detach(path, asset)
+        self._dirty = True
+        print(f"{name} was successfully deleted")
+
+    @_recorded
+    def move_node(self, path: str, new_parent: str, percentage: Optional[float] = None):
+        """Move the node of a path and its whole subtree below another node
+        ("" for the entry), keeping its percentage unless a new one is given
+
+        The subtree is re-attached as is, only the paths of its index
+        entries change.
+        """
+        path = _normalize_path(path)
+        new_parent = _normalize_path(new_parent)
+        name = path.rpartition("/")[2]
+        asset = self._index.get(path) if path else None
+        parent = self.get_node(new_parent)
+        if asset is None or parent is None:
+            print(f"{name if asset is None else new_parent} was not found!")
+            return
+        if new_parent == path or new_parent.startswith(f"{path}/"):
+            raise TypeError(f" {name} cannot be moved below itself")
+        if percentage is not None and not (0.0 < percentage <= 100.0):
+            raise TypeError(f" percentage = {percentage} is not allowed")
+        if asset.parent is parent:
+            if percentage is not None:
+                self.add_node(path, percentage)
+            return
+        if parent.child(name) is not None:
+            raise TypeError(f" {new_parent or self._plan.name} has already a {name}")
+        new_path = f"{new_parent}/{name}" if new_parent else name
+        self._detach(path, asset)
+        self._rename_subtree(path, new_path, asset)
+        asset.parent = parent
+        if percentage is not None:
+            asset.percentage = percentage
+        self._update_total(new_parent, _to_decimal(asset))
+        self._dirty = True
+        print(f"{name} was moved to {new_parent or self._plan.name}")
+
     def add(
         self,
         asset_class_name: str,
@@ -121,105 +647,135 @@ class Portfolio:
         asset_class_allocation_name: str = "",
         allocation_percentage: Optional[float] = None,
     ):
+        """Two levels flavour of :meth:`add_node` (asset class and subclass)"""
         # Set the assets to lowercase (to minimize typos)
         asset_class_name = asset_class_name.lower()
         asset_class_allocation_name = asset_class_allocation_name.lower()
-
-        def allocate(name: str, parent: Node, percentage: float):
-            asset = None
-            for node in parent.children:
-                if node.name == name:
-                    asset = node
-            if not asset and not percentage:
-                raise TypeError(f" strange pair provided = ({name}, {percentage})")
-            if not percentage and asset:
-                # Case where percentage was not given
-                return asset
-            elif not (0.0 < percentage <= 100.0):
-                # Not allowed case
-                raise TypeError(f" percentage = {percentage} is not allowed")
-            if not asset:
-                asset = Node(name, parent, percentage=percentage)
-                print(f"{name} was allocated")
-            elif asset.percentage != percentage:
-                print(
-                    f"{name} percentage updated from {asset.percentage} to {percentage}"
-                )
-                asset.percentage = percentage
-            return asset
-
         # Allocate assets
         asset_class = None
         if asset_class_name:
-            asset_class = allocate(asset_class_name, self._plan, percentage)
+            asset_class = self.add_node(asset_class_name, percentage)
         if asset_class_allocation_name and asset_class:
-            _ = allocate(
-                asset_class_allocation_name, asset_class, allocation_percentage
+            self.add_node(
+                f"{asset_class_name}/{asset_class_allocation_name}",
+                allocation_percentage,
             )
 
     def remove(self, asset_class_name: str, asset_class_allocation_name: str = ""):
+        """Two levels flavour of :meth:`remove_node`"""
         # Set the assets to lowercase (to minimize typos)
         asset_class_name = asset_class_name.lower()
         asset_class_allocation_name = asset_class_allocation_name.lower()
-        # Create resolver
-        resolver = Resolver("name")
+        if not asset_class_name:
+            return
         # Case 1: only asset class was given
-        if asset_class_name and not asset_class_allocation_name:
-            try:
-                asset: Node = resolver.get(self._plan, asset_class_name)
-                asset.parent = None
-                print(f"{asset_class_name} was successfully deleted")
-            except ChildResolverError:
-                print(f"{asset_class_name} was not found!")
         # Case 2: allocation was also provided
-        elif asset_class_name and asset_class_allocation_name:
+        if asset_class_allocation_name:
+            self.remove_node(f"{asset_class_name}/{asset_class_allocation_name}")
+        else:
+            self.remove_node(asset_class_name)
+
+    def _subtree(self, subtree: str) -> Tuple[Optional[PlanNode], str]:
+        """Return the node of the given path (the entry for "") and its path"""
+        path = _normalize_path(subtree)
+        node = self.get_node(path)
+        if node is None:
+            print(f"{path} was not found!")
+        return node, path
+
+    def check_allocation(self, max_depth: Optional[int] = None, subtree: str = ""):
+        # The validity of each node is maintained by add/remove, only render
+        root, path = self._subtree(subtree)
+        if root is not None:
+            PlanRenderer().check(root, self._invalid, path, max_depth)
+
+    def visualize_allocation(self, max_depth: Optional[int] = None, subtree: str = ""):
+        root, path = self._subtree(subtree)
+        if root is not None:
+            PlanRenderer().visualize(root, self._invalid, path, max_depth)
+
+    def compute_targets(self):
+        """Return the target amount of every node as a pandas DataFrame
+
+        See :func:`investporto.plan_analytics.compute_targets` for the columns.
+        """
+        # pandas/numpy are only loaded by the commands needing them
+        from .plan_analytics import compute_targets
+
+        return compute_targets(self._plan)
+
+    def compute_drift(self, holdings, against_budget: bool = False):
+        """Return the drift between the plan and ``holdings`` as a DataFrame
+
+        See :func:`investporto.plan_analytics.compute_drift` for the columns.
+        """
+        from .plan_analytics import compute_drift
+
+        return compute_drift(self._plan, holdings, against_budget)
+
+    def apply_batch(self, operations: Iterable[dict]) -> int:
+        """Apply a list of edit operations on the loaded plan
+
+        Each operation is a dict with an ``op`` key naming the method to call
+        (``add``, ``remove``, ``add_node``, ``remove_node``, ``move_node`` or
+        ``allocate_budget``) and the keyword arguments
+        of that method, e.g. ``{"op": "add", "asset_class_name": "bonds",
+        "percentage": 15}``. All the operations are validated before the first
+        one is applied, so a malformed batch leaves the plan untouched.
+        Returns the number of applied operations.
+        """
+        calls = []
+        for number, operation in enumerate(operations, start=1):
+            if not isinstance(operation, dict):
+                raise TypeError(f"operation {number} is not a mapping: {operation}")
+            arguments = dict(operation)
+            name = arguments.pop("op", None)
+            if name not in self._batch_operations:
+                raise TypeError(f"operation {number}: unknown op '{name}'")
+            method = getattr(self, name)
             try:
-                asset: Node = resolver.get(
-                    self._plan, asset_class_name + "/" + asset_class_allocation_name
-                )
-                asset.parent = None
-                print(f"{asset_class_allocation_name} was successfully deleted")
-            except ChildResolverError:
-                print(f"{asset_class_allocation_name} was not found!")
-
-    def check_allocation(self):
-        # We will check that each children contain the right percentage
-        def pre_order_verification(node: Node):
-            # Return in case of no children
-            if not node.children:
-                return
-            # calculate percentage of the children
-            total = 0.0
-            for child in node.children:
-                total += child.percentage
-            if total == 100.0:
-                node.allocation_check = ("-> ok!", "color(2)")
-            else:
-                node.allocation_check = ("-> allocation error!", "color(1)")
-            # Proceed with the kids
-            for child in node.children:
-                pre_order_verification(child)
-
-        # Apply pre-order-verification
-        pre_order_verification(self._plan)
-        # Render
-        for pre, _, node in RenderTree(self._plan):
-            if hasattr(node, "allocation_check"):
-                Console().print(
-                    f"{pre}{node.name} {node.allocation_check[0]}",
-                    style=node.allocation_check[1],
-                )
-                # Need to clean my modification so that it does not affect the tree on save
-                del node.allocation_check
-            else:
-                continue
+                bound = inspect.signature(method).bind(**arguments)
+            except TypeError as error:
+                raise TypeError(f"operation {number} ({name}): {error}") from error
+            if name == "allocate_budget":
+                # allocate_budget only warns about them
+                budget = bound.arguments["budget"]
+                currency = bound.arguments.get("currency")
+                if isinstance(budget, bool) or not isinstance(budget, (int, float)):
+                    raise TypeError(
+                        f"operation {number} ({name}): budget {budget!r}"
+                        " is not a number"
+                    )
+                if currency is not None and not isinstance(currency, str):
+                    raise TypeError(
+                        f"operation {number} ({name}): currency {currency!r}"
+                        " is not a string"
+                    )
+            # The methods compare them to the allowed range
+            for argument in ("percentage", "allocation_percentage"):
+                value = bound.arguments.get(argument)
+                if value is not None and (
+                    isinstance(value, bool) or not isinstance(value, (int, float))
+                ):
+                    raise TypeError(
+                        f"operation {number} ({name}): {argument} {value!r}"
+                        " is not a number"
+                    )
+            calls.append((method, arguments))
+        # Everything looks fine, apply on the in-memory tree
+        for method, arguments in calls:
+            method(**arguments)
+        return len(calls)
 
-    def visualize_allocation(self):
-        for pre, _, node in RenderTree(self._plan):
-            if hasattr(node, "percentage"):
-                print(f"{pre}( {node.name} , {node.percentage} )")
-            else:
-                print(f"{pre}{node.name}")
+    # Methods reachable through apply_batch
+    _batch_operations = (
+        "add",
+        "remove",
+        "add_node",
+        "remove_node",
+        "move_node",
+        "allocate_budget",
+    )
 
     def __str__(self) -> str:
         return f"{self._plan}"
@@ -238,6 +794,9 @@ def create_class_of_investment(name: str, percentage: float, projet_path: str):
     try:
         with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
             ppn.add(asset_class_name=name, percentage=percentage)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
@@ -271,6 +830,9 @@ def create_subclass_of_investment(
                 asset_class_allocation_name=name,
                 allocation_percentage=percentage,
             )
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
@@ -286,6 +848,9 @@ def remove_class_of_investment(name: str, projet_path: str):
     try:
         with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
             ppn.remove(asset_class_name=name)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
@@ -309,6 +874,88 @@ def remove_subclass_of_investment(name: str, projet_path: str, asset_class: str)
         with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
 
             ppn.remove(asset_class_name=asset_class, asset_class_allocation_name=name)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("add-node")
+@click.argument("path", type=click.STRING, required=True)
+@percentage_option
+@project_path_option
+def add_plan_node(path: str, percentage: float, projet_path: str):
+    """Add a node at any depth of the plan (e.g. stocks/large_caps/tech)
+
+    The parent of the node has to exist, an existing node gets the new
+    percentage.
+    """
+    path = "/".join("_".join(name.split()) for name in path.split("/"))
+    try:
+        with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
+            ppn.add_node(path, percentage)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except TypeError as error:
+        click.echo(f"Not added:{error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("remove-node")
+@click.argument("path", type=click.STRING, required=True)
+@project_path_option
+def remove_plan_node(path: str, projet_path: str):
+    """Remove a node at any depth of the plan, with its whole subtree"""
+    try:
+        with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
+            ppn.remove_node(path)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("move-node")
+@click.argument("path", type=click.STRING, required=True)
+@click.option(
+    "--to",
+    "new_parent",
+    type=click.STRING,
+    required=True,
+    help='New parent of the node ("" for the entry)',
+)
+@click.option(
+    "-p",
+    "--percentage",
+    type=click.FLOAT,
+    required=False,
+    help="New percentage of the node (default: unchanged)",
+)
+@project_path_option
+def move_plan_node(
+    path: str, new_parent: str, percentage: Optional[float], projet_path: str
+):
+    """Move a node of the plan, with its whole subtree, below another node"""
+    try:
+        with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
+            ppn.move_node(path, new_parent, percentage)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except TypeError as error:
+        click.echo(f"Not moved:{error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
@@ -318,41 +965,217 @@ def remove_subclass_of_investment(name: str, projet_path: str, asset_class: str)
 @portfolio_plan.command("allocate-budget")
 @click.argument("budget", type=click.FLOAT, required=True, default=0)
 @project_path_option
-def assign_budget(budget: float, projet_path: str):
+@click.option(
+    "--currency",
+    type=click.STRING,
+    required=False,
+    help="Currency of the budget, base of the valuations (e.g. EUR)",
+)
+def assign_budget(budget: float, projet_path: str, currency: Optional[str]):
     """Assign a budget to the portfolio"""
     # Load the configuration stored in the yaml file
     try:
         with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
-            ppn.allocate_budget(budget)
+            ppn.allocate_budget(budget, currency)
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("compact-plan")
+@project_path_option
+def compact_plan(projet_path: str):
+    """Fold the journal of edits into the yaml file of the plan"""
+    try:
+        with Portfolio(
+            Path(projet_path / portfolio_plan_name).resolve(), optimistic=False
+        ) as ppn:
+            folded = ppn.compact()
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
         exit(os.EX_OSERR)
+    click.echo(f"{folded} journaled edits folded into the plan")
 
 
 @portfolio_plan.command("verify-allocation")
 @project_path_option
-def verify_allocation(projet_path: str):
+@render_options
+@click.option(
+    "--errors-only",
+    is_flag=True,
+    help="Only list the allocation errors (exit code is set if there are some)",
+)
+def verify_allocation(
+    projet_path: str, max_depth: Optional[int], subtree: str, errors_only: bool
+):
     """Verify if the allocation reach really the 100% per class
     and the same per subclass"""
     try:
-        with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
-            ppn.check_allocation()
-            click.echo(ppn)
+        with Portfolio(
+            Path(projet_path / portfolio_plan_name).resolve(), read_only=True
+        ) as ppn:
+            if errors_only:
+                invalid_allocations = ppn.invalid_allocations()
+                for path, total in invalid_allocations:
+                    click.echo(
+                        f"{path or ppn._plan.name} -> allocation error! ({total}%)"
+                    )
+            else:
+                invalid_allocations = []
+                ppn.check_allocation(max_depth, subtree)
+                click.echo(ppn)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
         exit(os.EX_OSERR)
+    if invalid_allocations:
+        exit(os.EX_DATAERR)
 
 
 @portfolio_plan.command("visualize-allocation")
 @project_path_option
-def visualize_allocation(projet_path: str):
+@render_options
+def visualize_allocation(projet_path: str, max_depth: Optional[int], subtree: str):
     """Visualize the project allocation"""
     # Load the configuration stored in the yaml file
+    try:
+        with Portfolio(
+            Path(projet_path / portfolio_plan_name).resolve(), read_only=True
+        ) as ppn:
+            ppn.visualize_allocation(max_depth, subtree)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("target-amounts")
+@project_path_option
+@click.option("--leaves-only", is_flag=True, help="Only show the leaves of the plan")
+def target_amounts(projet_path: str, leaves_only: bool):
+    """Compute the amount to invest in each node out of the budget"""
+    try:
+        with Portfolio(
+            Path(projet_path / portfolio_plan_name).resolve(), read_only=True
+        ) as ppn:
+            targets = ppn.compute_targets()
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+    if leaves_only:
+        targets = targets[targets["is_leaf"]]
+    targets = targets.assign(path=targets["path"].replace("", ppn._plan.name))
+    click.echo(
+        targets[["path", "percentage", "weight", "target_amount"]].to_string(
+            index=False
+        )
+    )
+
+
+@portfolio_plan.command("import-plan")
+@click.argument("table", type=click.Path(exists=True, dir_okay=False))
+@project_path_option
+def import_plan(table: str, projet_path: str):
+    """Replace the plan by the one of a csv or parquet table
+
+    \b
+    One row per node, parents included, e.g.:
+        path,percentage,budget
+        stocks,70,4000
+        stocks/large_caps,50,
+        stocks/small_caps,50,
+        bonds,30,
+    The optional budget and currency columns set the ones of the plan, the
+    optional symbol column the symbol of the node. The table is rejected if
+    any sibling percentages do not sum up to 100%.
+    """
+    # pandas is only loaded by the commands needing it
+    import pandas as pd
+
+    from .plan_import import plan_from_table
+
+    if table.lower().endswith(".parquet"):
+        try:
+            rows = pd.read_parquet(table)
+        except ImportError:
+            raise click.UsageError(
+                "Parquet import requires pyarrow (pip install pyarrow)"
+            )
+    else:
+        rows = pd.read_csv(table, dtype={"path": str, "symbol": str})
     try:
         with Portfolio(Path(projet_path / portfolio_plan_name).resolve()) as ppn:
-            ppn.visualize_allocation()
+            ppn.replace_plan(plan_from_table(rows, ppn._plan))
+        click.echo(f"{len(rows)} nodes imported")
+    except PlanValidationError as error:
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except ValueError as error:
+        click.echo(f"Import rejected: {error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
+
+
+@portfolio_plan.command("apply")
+@click.argument("operations", type=click.File("r"), required=False, default="-")
+@project_path_option
+@click.option(
+    "--validate",
+    is_flag=True,
+    help="Reject the batch if it leaves allocation errors behind",
+)
+def apply_operations(operations, projet_path: str, validate: bool):
+    """Apply a batch of edit operations (yaml list, file or stdin) at once
+
+    \b
+    Example of an operations file:
+        - op: allocate_budget
+          budget: 4000
+        - op: add
+          asset_class_name: stocks
+          percentage: 70
+          asset_class_allocation_name: large_caps
+          allocation_percentage: 50
+        - op: add_node
+          path: stocks/large_caps/tech
+          percentage: 100
+        - op: move_node
+          path: stocks/large_caps/tech
+          new_parent: stocks
+          percentage: 30
+        - op: remove
+          asset_class_name: bonds
+    """
+    try:
+        batch = yaml.load(operations, Loader=YamlLoader) or []
+    except yaml.YAMLError as error:
+        click.echo(f"The operations are not valid yaml: {error}")
+        exit(os.EX_DATAERR)
+    if not isinstance(batch, list):
+        click.echo("The operations have to be provided as a yaml list!")
+        exit(os.EX_DATAERR)
+    try:
+        with Portfolio(
+            Path(projet_path / portfolio_plan_name).resolve(),
+            validate_on_write=validate or None,
+        ) as ppn:
+            applied = ppn.apply_batch(batch)
+        click.echo(f"{applied} operations applied")
+    except TypeError as error:
+        click.echo(f"Batch rejected: {error}")
+        exit(os.EX_DATAERR)
     except OSError:
         # Exception to be better defined later on
         click.echo("Oups, something went really wrong with the config access!")
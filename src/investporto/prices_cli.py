@@ -0,0 +1,255 @@
+"""
+Investment portfolio
+**************************
+
+:module: prices_cli
+
+:synopsis: CLI section for the local price history
+
+.. currentmodule:: prices_cli
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import click
+import numpy as np
+import pandas as pd
+
+from .portfolio_plan_cli import project_path_option
+from .types_and_vars import PathType, fx_folder_name, prices_folder_name
+
+price_dtype = np.dtype(np.float64)
+
+# Days looked back for the last known price of a symbol
+lookback_days = 31
+
+
+def _day(day) -> np.datetime64:
+    return np.datetime64(day, "D")
+
+
+class PriceStore:
+    """Per project store of the daily price history of the symbols
+
+    Each symbol has one raw ``float64`` file (``prices/<SYMBOL>.f64``) holding
+    one price per calendar day from its first day on (NaN for the days without
+    price), ``prices/index.json`` keeps the first day of each symbol. So:
+
+    - the price of a day is at a known offset, reading a date range
+      memory-maps only that range (zero copy),
+    - new days are appended at the end of the file and corrections are
+      written in place: an update never rewrites the history (only days
+      before the first one of a symbol do).
+
+    The FX rates use the same layout in their own ``folder``, the symbols
+    being currency pairs ("EURUSD": price of one EUR in USD).
+    """
+
+    def __init__(self, project: PathType, folder: PathType = prices_folder_name):
+        self._folder = Path(project) / folder
+        self._index_file = self._folder / "index.json"
+        self._start: Dict[str, np.datetime64] = {}
+        if self._index_file.is_file():
+            with open(self._index_file, "r") as index_file:
+                self._start = {
+                    symbol: _day(start)
+                    for symbol, start in json.load(index_file)["start"].items()
+                }
+
+    @property
+    def symbols(self) -> Tuple[str, ...]:
+        return tuple(sorted(self._start))
+
+    def _file(self, symbol: str) -> Path:
+        return self._folder / f"{symbol}.f64"
+
+    def _length(self, symbol: str) -> int:
+        return self._file(symbol).stat().st_size // price_dtype.itemsize
+
+    def _save_index(self):
+        self._folder.mkdir(parents=True, exist_ok=True)
+        temporary_path = self._index_file.with_suffix(".tmp")
+        with open(temporary_path, "w") as index_file:
+            json.dump(
+                {"start": {symbol: str(day) for symbol, day in self._start.items()}},
+                index_file,
+                indent=1,
+            )
+        os.replace(temporary_path, self._index_file)
+
+    def update(
+        self, symbol: str, days: np.ndarray, prices: np.ndarray, save_index=True
+    ):
+        """Store the prices of a symbol for the given days
+
+        Days after the last stored one are appended, the other ones are
+        overwritten in place.
+        """
+        symbol = symbol.upper()
+        days = np.asarray(days, dtype="datetime64[D]")
+        prices = np.asarray(prices, dtype=price_dtype)
+        if not len(days):
+            return
+        self._folder.mkdir(parents=True, exist_ok=True)
+        first = days.min()
+        start = self._start.get(symbol)
+        if start is None or first < start:
+            # New symbol, or history before the first day: (re)write the file
+            old = np.array(self.history(symbol)[1]) if start is not None else []
+            length = len(old) + int((start - first).astype(int)) if len(old) else 0
+            history = np.full(length, np.nan)
+            if len(old):
+                history[length - len(old) :] = old
+            with open(self._file(symbol), "wb") as price_file:
+                price_file.write(history.tobytes())
+            self._start[symbol] = start = first
+            if save_index:
+                self._save_index()
+        offsets = (days - start).astype(np.int64)
+        length = self._length(symbol)
+        new = offsets >= length
+        if new.any():
+            # Append the new days (NaN for the gap)
+            appended = np.full(int(offsets.max()) + 1 - length, np.nan)
+            appended[offsets[new] - length] = prices[new]
+            with open(self._file(symbol), "ab") as price_file:
+                price_file.write(appended.tobytes())
+        if not new.all():
+            history = np.memmap(self._file(symbol), dtype=price_dtype, mode="r+")
+            history[offsets[~new]] = prices[~new]
+            history.flush()
+            del history
+
+    def update_many(self, prices: pd.DataFrame):
+        """Store the prices of a date, symbol, price table (any symbols)"""
+        symbols = prices["symbol"].astype(str).str.upper()
+        days = pd.to_datetime(prices["date"]).to_numpy(dtype="datetime64[D]")
+        values = prices["price"].to_numpy(dtype=price_dtype)
+        for symbol, rows in symbols.groupby(symbols).indices.items():
+            self.update(symbol, days[rows], values[rows], save_index=False)
+        if len(prices):
+            self._save_index()
+
+    def history(
+        self, symbol: str, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Days and prices (memory-mapped, read only) of a symbol between
+        ``start`` and ``end`` included"""
+        symbol = symbol.upper()
+        first = self._start.get(symbol)
+        if first is None:
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+        length = self._length(symbol)
+        begin = 0 if start is None else max(int((_day(start) - first).astype(int)), 0)
+        stop = length if end is None else int((_day(end) - first).astype(int)) + 1
+        stop = min(stop, length)
+        if begin >= stop:
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+        prices = np.memmap(
+            self._file(symbol),
+            dtype=price_dtype,
+            mode="r",
+            offset=begin * price_dtype.itemsize,
+            shape=stop - begin,
+        )
+        return first + np.arange(begin, stop), prices
+
+    def latest(self, symbols: Iterable[str], day: Optional[date] = None) -> pd.Series:
+        """Last known price of each symbol at ``day`` (default: last stored)
+
+        Only the last ``lookback_days`` days before ``day`` are read, symbols
+        without price in that window are NaN.
+        """
+        symbols = list(symbols)
+        latest = np.full(len(symbols), np.nan)
+        for position, symbol in enumerate(symbols):
+            first = self._start.get(symbol.upper())
+            if first is None:
+                continue
+            length = self._length(symbol.upper())
+            stop = length if day is None else int((_day(day) - first).astype(int)) + 1
+            begin = max(stop - lookback_days, 0)
+            stop = min(stop, length)
+            if begin >= stop:
+                continue
+            # A few values: a plain read is cheaper than a memory map
+            prices = np.fromfile(
+                self._file(symbol.upper()),
+                dtype=price_dtype,
+                count=stop - begin,
+                offset=begin * price_dtype.itemsize,
+            )
+            known = np.flatnonzero(~np.isnan(prices))
+            if len(known):
+                latest[position] = prices[known[-1]]
+        return pd.Series(latest, index=symbols, dtype=np.float64)
+
+
+#  Manage the price history
+@click.group()
+def prices():
+    """"""
+    pass
+
+
+@prices.command("import-prices")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@project_path_option
+def import_prices(csv_file: str, projet_path: str):
+    """Import daily prices from a csv (date,symbol,price)"""
+    table = pd.read_csv(csv_file)
+    missing = {"date", "symbol", "price"} - set(table.columns)
+    if missing:
+        click.echo(f"Missing columns: {', '.join(sorted(missing))}")
+        exit(os.EX_DATAERR)
+    PriceStore(Path(projet_path or ".")).update_many(table)
+    click.echo(f"{len(table)} prices imported")
+
+
+@prices.command("import-fx-rates")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@project_path_option
+def import_fx_rates(csv_file: str, projet_path: str):
+    """Import daily FX rates from a csv (date,pair,rate e.g. EURUSD or EUR/USD)"""
+    table = pd.read_csv(csv_file)
+    missing = {"date", "pair", "rate"} - set(table.columns)
+    if missing:
+        click.echo(f"Missing columns: {', '.join(sorted(missing))}")
+        exit(os.EX_DATAERR)
+    rates = pd.DataFrame(
+        {
+            "date": table["date"],
+            "symbol": table["pair"].astype(str).str.replace("/", "", regex=False),
+            "price": table["rate"],
+        }
+    )
+    PriceStore(Path(projet_path or "."), fx_folder_name).update_many(rates)
+    click.echo(f"{len(table)} rates imported")
+
+
+@prices.command("price-history")
+@click.argument("symbol", type=click.STRING, required=True)
+@project_path_option
+@click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), required=False)
+@click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), required=False)
+def price_history(symbol: str, projet_path: str, start, end):
+    """Show the stored prices of a symbol"""
+    days, history = PriceStore(Path(projet_path or ".")).history(
+        symbol, start and start.date(), end and end.date()
+    )
+    known = ~np.isnan(history)
+    click.echo(
+        pd.DataFrame({"date": days[known], "price": history[known]}).to_string(
+            index=False
+        )
+    )
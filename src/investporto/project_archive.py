@@ -0,0 +1,534 @@
+"""
+Investment portfolio
+**************************
+
+:module: project_archive
+
+:synopsis: Parallel creation and extraction of the encrypted project archives
+
+.. currentmodule:: project_archive
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pyzipper
+
+from .types_and_vars import PathType
+
+# Files smaller than this are stored: deflating them does not pay off
+small_file_size = 1024
+
+# Extensions of files that are already compressed, they are stored as well
+compressed_extensions = {
+    ".7z",
+    ".bz2",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".npz",
+    ".parquet",
+    ".png",
+    ".xz",
+    ".xlsx",
+    ".zip",
+    ".zst",
+}
+
+# Amount of data compressed by one task of the process pool
+batch_size = 64 * 2**20
+
+# Below this amount of data the archive is done in process (no pool overhead)
+parallel_threshold = 16 * 2**20
+
+# Bytes copied at once when assembling the archive
+_copy_buffer_size = 2**20
+
+# Rewrite the archive once it is more than this many times its live content
+compaction_ratio = 2.0
+
+# Folder of an opened project keeping the archive it was opened from
+archive_folder = ".investporto"
+
+# (path of the file, name within the archive, size)
+Member = Tuple[str, str, int]
+
+# Content of a project: path -> {"hash": ..., "size": ...}
+Manifest = Dict[str, Dict[str, object]]
+
+
+def compression_of(path: PathType, size: int) -> int:
+    """Return the zip compression to use for a file"""
+    if size < small_file_size or Path(path).suffix.lower() in compressed_extensions:
+        return pyzipper.ZIP_STORED
+    return pyzipper.ZIP_DEFLATED
+
+
+def list_members(project: Path) -> List[Member]:
+    """List the files of the project, as they will be stored in the archive"""
+    members = []
+    for root, folders, files in os.walk(project):
+        if Path(root) == project and archive_folder in folders:
+            # Bookkeeping of the opened project, not part of it
+            folders.remove(archive_folder)
+        for file_name in files:
+            path = Path(root) / file_name
+            members.append(
+                (
+                    str(path),
+                    (Path(root).relative_to(project) / file_name).as_posix(),
+                    path.stat().st_size,
+                )
+            )
+    return members
+
+
+def _batches(members: List[Member], size: int) -> List[List[Member]]:
+    """Split the members in batches of about ``size`` bytes"""
+    batches, batch, batch_bytes = [], [], 0
+    for member in members:
+        batch.append(member)
+        batch_bytes += member[2]
+        if batch_bytes >= size:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _write_shard(members: List[Member], shard_path: str, password: bytes) -> str:
+    """Compress and encrypt the members into a standalone zip (pool task)"""
+    with pyzipper.AESZipFile(
+        shard_path,
+        "w",
+        compression=pyzipper.ZIP_DEFLATED,
+        encryption=pyzipper.WZ_AES,
+    ) as shard:
+        shard.setpassword(password)
+        for path, arcname, size in members:
+            shard.write(path, arcname=arcname, compress_type=compression_of(path, size))
+    return shard_path
+
+
+def _copy_members(
+    archive: pyzipper.AESZipFile, source_path: str, names: Optional[set] = None
+):
+    """Copy members (all or the given names) of another zip as is: they are
+    neither decompressed nor decrypted"""
+    with open(source_path, "rb") as source_file, pyzipper.AESZipFile(
+        source_file
+    ) as source:
+        infos = sorted(source.infolist(), key=lambda info: info.header_offset)
+        ends = [info.header_offset for info in infos[1:]] + [source.start_dir]
+        for info, end in zip(infos, ends):
+            if names is not None and info.filename not in names:
+                continue
+            source_file.seek(info.header_offset)
+            info.header_offset = archive.fp.tell()
+            remaining = end - source_file.tell()
+            while remaining:
+                chunk = source_file.read(min(remaining, _copy_buffer_size))
+                archive.fp.write(chunk)
+                remaining -= len(chunk)
+            archive.filelist.append(info)
+            archive.NameToInfo[info.filename] = info
+    # The central directory starts after the last copied member
+    archive.start_dir = archive.fp.tell()
+    archive._didModify = True
+
+
+def _add_members(
+    archive: pyzipper.AESZipFile,
+    members: List[Member],
+    password: bytes,
+    jobs: Optional[int] = None,
+):
+    """Compress and encrypt files into an archive opened for writing
+
+    The files are compressed and encrypted in batches by a process pool, each
+    batch into a temporary zip, whose members are then copied as is into the
+    archive. Small amounts of data are handled in process.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    total_size = sum(member[2] for member in members)
+    if jobs == 1 or total_size < parallel_threshold:
+        archive.setpassword(password)
+        for path, arcname, size in members:
+            archive.write(
+                path, arcname=arcname, compress_type=compression_of(path, size)
+            )
+        return
+    # Spread the work on all the workers, in batches of a bounded size
+    batches = _batches(members, min(batch_size, total_size // jobs + 1))
+    with tempfile.TemporaryDirectory() as shard_directory:
+        shard_paths = [
+            os.path.join(shard_directory, f"{number}.zip")
+            for number in range(len(batches))
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map keeps the order: the archive is deterministic
+            for shard_path in executor.map(
+                _write_shard, batches, shard_paths, [password] * len(batches)
+            ):
+                _copy_members(archive, shard_path)
+                os.unlink(shard_path)
+
+
+def write_archive(
+    project: PathType,
+    archive_path: PathType,
+    password: str,
+    jobs: Optional[int] = None,
+):
+    """Create the encrypted (WZ_AES) zip archive of a project, one member per
+    file (see :func:`_add_members`)
+
+    Small and already compressed files are only encrypted. The archive is
+    written under a temporary name and renamed once complete.
+    """
+    archive_path = Path(archive_path)
+    temporary_archive = archive_path.with_name(f"{archive_path.name}.tmp")
+    try:
+        with pyzipper.AESZipFile(
+            temporary_archive,
+            "w",
+            compression=pyzipper.ZIP_DEFLATED,
+            encryption=pyzipper.WZ_AES,
+        ) as archive:
+            _add_members(archive, list_members(Path(project)), password.encode(), jobs)
+    except BaseException:
+        temporary_archive.unlink(missing_ok=True)
+        raise
+    os.replace(temporary_archive, archive_path)
+
+
+def _target_path(destination: str, target: str) -> str:
+    """Return where a member is extracted, ValueError if the member name would
+    put it outside of ``destination`` (absolute name, ".." parts)"""
+    root = os.path.realpath(destination)
+    target_path = os.path.realpath(os.path.join(root, target))
+    if os.path.isabs(target) or os.path.commonpath([root, target_path]) != root:
+        raise ValueError(f"{target} would be extracted outside of {destination}")
+    return target_path
+
+
+def _extract_members(
+    archive_path: str,
+    members: List[Tuple[str, str]],
+    destination: str,
+    password: bytes,
+):
+    """Extract (name within the archive, target path) members (pool task)"""
+    with pyzipper.AESZipFile(archive_path, "r") as archive:
+        archive.setpassword(password)
+        for name, target in members:
+            target_path = _target_path(destination, target)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            # Stream the member by chunks to the destination
+            with archive.open(name) as source, open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target, _copy_buffer_size)
+
+
+def _extract(
+    archive_path: str,
+    members: List[Tuple[str, str, int]],
+    destination: str,
+    password: bytes,
+    jobs: Optional[int] = None,
+):
+    """Extract (name within the archive, target path, size) members
+
+    Big extractions are done by a process pool, each worker decrypting and
+    inflating its own share of the members.
+    """
+    # Nothing is extracted if a member name is not safe
+    for _, target, _ in members:
+        _target_path(destination, target)
+    jobs = jobs or os.cpu_count() or 1
+    total_size = sum(member[2] for member in members)
+    if jobs == 1 or total_size < parallel_threshold:
+        _extract_members(
+            archive_path,
+            [(name, target) for name, target, _ in members],
+            destination,
+            password,
+        )
+        return
+    # Deal the members (largest first) to the workers to balance them
+    shares: List[List[Tuple[str, str]]] = [[] for _ in range(jobs)]
+    share_sizes = [0] * jobs
+    for name, target, size in sorted(members, key=lambda member: -member[2]):
+        smallest = share_sizes.index(min(share_sizes))
+        shares[smallest].append((name, target))
+        share_sizes[smallest] += size
+    shares = [share for share in shares if share]
+    with ProcessPoolExecutor(max_workers=len(shares)) as executor:
+        futures = [
+            executor.submit(
+                _extract_members, archive_path, share, destination, password
+            )
+            for share in shares
+        ]
+        for future in futures:
+            future.result()
+
+
+def extract_archive(
+    archive_path: PathType,
+    destination: PathType,
+    password: str,
+    jobs: Optional[int] = None,
+    members: Optional[Iterable[str]] = None,
+):
+    """Extract (all or the given) members of an archive written by
+    :func:`write_archive`"""
+    encoded_password = password.encode()
+    with pyzipper.AESZipFile(archive_path, "r") as archive:
+        archive.setpassword(encoded_password)
+        infos = archive.infolist()
+        if members is not None:
+            wanted = set(members)
+            infos = [info for info in infos if info.filename in wanted]
+        # Fail early (wrong password) before any worker is started
+        if infos:
+            archive.open(infos[0]).close()
+    _extract(
+        str(archive_path),
+        [(info.filename, info.filename, info.file_size) for info in infos],
+        str(destination),
+        encoded_password,
+        jobs,
+    )
+
+
+# Incremental project archives
+#
+# The archive of a project is content addressed: each distinct file content is
+# stored once as "objects/<sha256>" and "manifests/<generation>.json" maps the
+# paths of the project to their content. Opening a project keeps the archive
+# in the project (.investporto/archive.zip) with the state of the extracted
+# files. Closing it again only hashes the files that changed since (size,
+# mtime), appends the new contents and a new manifest to the kept archive, and
+# puts it back in place: unchanged files are neither re-read nor re-encrypted.
+
+
+def file_hash(path: PathType) -> str:
+    """sha256 of a file content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_copy_buffer_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _object_name(content_hash: str) -> str:
+    return f"objects/{content_hash}"
+
+
+def _manifest_name(generation: int) -> str:
+    return f"manifests/{generation}.json"
+
+
+def _latest_generation(archive: pyzipper.AESZipFile) -> int:
+    """Generation of the last manifest of the archive (0 for plain archives)"""
+    generations = [
+        int(name[len("manifests/") : -len(".json")])
+        for name in archive.namelist()
+        if name.startswith("manifests/") and name.endswith(".json")
+    ]
+    return max(generations, default=0)
+
+
+def _read_manifest(archive: pyzipper.AESZipFile, generation: int) -> Manifest:
+    return json.loads(archive.read(_manifest_name(generation)))["files"]
+
+
+def _state_path(project: Path) -> Path:
+    return project / archive_folder / "state.json"
+
+
+def _kept_archive(project: Path) -> Path:
+    return project / archive_folder / "archive.zip"
+
+
+def _load_state(project: Path) -> dict:
+    try:
+        with open(_state_path(project), "r") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {"files": {}, "pending": {}}
+
+
+def _store_state(project: Path, state: dict):
+    _state_path(project).parent.mkdir(exist_ok=True)
+    with open(_state_path(project), "w") as state_file:
+        json.dump(state, state_file)
+
+
+def _scan_project(project: Path, state: dict) -> Tuple[Manifest, List[Member]]:
+    """Compute the manifest of the project, hashing only the files whose size
+    or mtime changed since they were extracted"""
+    manifest: Manifest = {}
+    members = []
+    for path, arcname, size in list_members(project):
+        known = state["files"].get(arcname)
+        mtime_ns = os.stat(path).st_mtime_ns
+        if known and known["size"] == size and known["mtime_ns"] == mtime_ns:
+            content_hash = known["hash"]
+        else:
+            content_hash = file_hash(path)
+        manifest[arcname] = {"hash": content_hash, "size": size}
+        members.append((path, _object_name(content_hash), size))
+    # Files still in the archive since they were never extracted
+    for arcname, entry in state["pending"].items():
+        manifest.setdefault(arcname, entry)
+    return manifest, members
+
+
+def archive_project(
+    project: PathType, password: str, jobs: Optional[int] = None
+) -> Path:
+    """Close a project into its encrypted incremental archive ``<project>.zip``
+
+    Returns the path of the archive. The project folder is left untouched.
+    """
+    project = Path(project)
+    archive_path = project.with_name(f"{project.name}.zip")
+    encoded_password = password.encode()
+    manifest, members = _scan_project(project, _load_state(project))
+    kept_archive = _kept_archive(project)
+    mode = "a" if kept_archive.is_file() else "w"
+    target = (
+        kept_archive
+        if mode == "a"
+        else archive_path.with_name(f"{archive_path.name}.tmp")
+    )
+    try:
+        with pyzipper.AESZipFile(
+            target,
+            mode,
+            compression=pyzipper.ZIP_DEFLATED,
+            encryption=pyzipper.WZ_AES,
+        ) as archive:
+            archive.setpassword(encoded_password)
+            generation = _latest_generation(archive) + 1
+            if mode == "a":
+                # Contents can only be appended with the password of the archive
+                _read_manifest(archive, generation - 1)
+            stored = set(archive.namelist())
+            # Each new content once
+            new_members = {}
+            for path, name, size in members:
+                if name not in stored and name not in new_members:
+                    new_members[name] = (path, name, size)
+            _add_members(archive, list(new_members.values()), encoded_password, jobs)
+            archive.setpassword(encoded_password)
+            archive.writestr(
+                _manifest_name(generation),
+                json.dumps({"generation": generation, "files": manifest}),
+            )
+    except BaseException:
+        if mode == "w":
+            target.unlink(missing_ok=True)
+        raise
+    os.replace(target, archive_path)
+    _compact(archive_path, manifest, generation)
+    return archive_path
+
+
+def _compact(archive_path: Path, manifest: Manifest, generation: int):
+    """Drop the contents and manifests no longer used once they take too much
+    room. The live members are copied as is (no decryption)."""
+    live = {_object_name(entry["hash"]) for entry in manifest.values()}
+    live.add(_manifest_name(generation))
+    with pyzipper.AESZipFile(archive_path, "r") as archive:
+        live_size = sum(
+            info.compress_size for info in archive.infolist() if info.filename in live
+        )
+        total_size = sum(info.compress_size for info in archive.infolist())
+    if total_size <= compaction_ratio * live_size:
+        return
+    temporary_archive = archive_path.with_name(f"{archive_path.name}.tmp")
+    with pyzipper.AESZipFile(temporary_archive, "w") as archive:
+        _copy_members(archive, str(archive_path), live)
+    os.replace(temporary_archive, archive_path)
+
+
+def restore_project(
+    archive_path: PathType,
+    password: str,
+    jobs: Optional[int] = None,
+    only: Optional[List[str]] = None,
+) -> Path:
+    """Open a project out of its archive, next to it
+
+    ``only`` restricts the extraction to the paths matching one of the given
+    glob patterns, the other files can be fetched later with
+    :func:`fetch_files`. The archive is moved into the project, so that the
+    next close is incremental. Plain archives (one member per file) are fully
+    extracted. Returns the path of the project.
+    """
+    archive_path = Path(archive_path)
+    project = archive_path.parent / archive_path.stem
+    encoded_password = password.encode()
+    with pyzipper.AESZipFile(archive_path, "r") as archive:
+        archive.setpassword(encoded_password)
+        generation = _latest_generation(archive)
+        if generation:
+            manifest = _read_manifest(archive, generation)
+    if not generation:
+        extract_archive(archive_path, project, password, jobs)
+        archive_path.unlink()
+        return project
+    kept_archive = _kept_archive(project)
+    kept_archive.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(archive_path, kept_archive)
+    _store_state(project, {"files": {}, "pending": manifest})
+    fetch_files(project, password, only or ["*"], jobs)
+    return project
+
+
+def fetch_files(
+    project: PathType, password: str, patterns: List[str], jobs: Optional[int] = None
+) -> List[str]:
+    """Extract the not yet extracted files of an opened project matching one
+    of the glob patterns. Returns their paths."""
+    project = Path(project)
+    state = _load_state(project)
+    wanted = {
+        arcname: entry
+        for arcname, entry in state["pending"].items()
+        if any(fnmatch.fnmatch(arcname, pattern) for pattern in patterns)
+    }
+    _extract(
+        str(_kept_archive(project)),
+        [
+            (_object_name(entry["hash"]), arcname, entry["size"])
+            for arcname, entry in wanted.items()
+        ],
+        str(project),
+        password.encode(),
+        jobs,
+    )
+    for arcname, entry in wanted.items():
+        del state["pending"][arcname]
+        state["files"][arcname] = {
+            **entry,
+            "mtime_ns": os.stat(project / arcname).st_mtime_ns,
+        }
+    _store_state(project, state)
+    return sorted(wanted)
@@ -17,11 +17,11 @@ Investment portfolio
 
 import os
 import click
-import pyzipper
 from pathlib import Path
 from shutil import rmtree
 
 from .types_and_vars import PathType, portfolio_plan_name
+from .project_archive import archive_project, fetch_files, restore_project
 
 
 # Create command
@@ -31,6 +31,18 @@ def project_meta():
     pass
 
 
+def jobs_option(function):
+    """Define the common option setting the number of worker processes"""
+    function = click.option(
+        "-j",
+        "--jobs",
+        type=click.IntRange(min=1),
+        required=False,
+        help="Number of processes compressing/extracting (default: all cores)",
+    )(function)
+    return function
+
+
 @project_meta.command("create")
 @click.argument(
     "projectname",
@@ -79,24 +91,12 @@ def delete_project(projectname: PathType, yes: bool):
     required=True,
 )
 @click.password_option()
-def close_project(projectname: PathType, password: str):
+@jobs_option
+def close_project(projectname: PathType, password: str, jobs: int):
     """Create an encrypt zip file out of the project and delete the worked one"""
     projectname = Path(projectname).resolve()
-    contents = os.walk(projectname)
-    # Zip the project
-    with pyzipper.AESZipFile(
-        f"{projectname}.zip",
-        "w",
-        compression=pyzipper.ZIP_DEFLATED,
-        encryption=pyzipper.WZ_AES,
-    ) as zip_file:
-        zip_file.setpassword(password.encode())
-        for root, _, files in contents:
-            for file_name in files:
-                zip_file.write(
-                    (Path(root) / file_name),
-                    arcname=(Path(root).relative_to(projectname) / file_name),
-                )
+    # Zip the project (only the changes if it was opened from an archive)
+    archive_project(projectname, password, jobs)
     # Delete the unziped project
     rmtree(projectname.resolve())
 
@@ -108,16 +108,32 @@ def close_project(projectname: PathType, password: str):
     required=True,
 )
 @click.password_option()
-def open_project(projectname: PathType, password: str):
+@jobs_option
+@click.option(
+    "--only",
+    type=click.STRING,
+    multiple=True,
+    help="Only extract the files matching this glob pattern (repeatable)",
+)
+def open_project(projectname: PathType, password: str, jobs: int, only: tuple):
     """Extract from the zip all the project back to the basic project structur"""
     projectname = Path(projectname).resolve()
-    with pyzipper.AESZipFile(
-        projectname,
-        "r",
-        compression=pyzipper.ZIP_DEFLATED,
-        encryption=pyzipper.WZ_AES,
-    ) as zip_file:
-        zip_file.setpassword(password.encode())
-        zip_file.extractall(path=(projectname.parent / projectname.stem))
-    # Delete the unziped project
-    Path(projectname).unlink()
+    # The zip is moved into the project for the next (incremental) close
+    restore_project(projectname, password, jobs, list(only) or None)
+
+
+@project_meta.command("fetch")
+@click.argument(
+    "projectname",
+    type=click.Path(dir_okay=True, file_okay=False, writable=True, resolve_path=True),
+    required=True,
+)
+@click.argument("patterns", type=click.STRING, nargs=-1, required=True)
+@click.password_option()
+@jobs_option
+def fetch_project_files(
+    projectname: PathType, patterns: tuple, password: str, jobs: int
+):
+    """Extract files left in the archive by a partial open (glob patterns)"""
+    for fetched in fetch_files(Path(projectname), password, list(patterns), jobs):
+        click.echo(f"{fetched} was extracted")
@@ -0,0 +1,131 @@
+"""
+Investment portfolio
+**************************
+
+:module: rebalance
+
+:synopsis: Orders bringing the holdings back to the portfolio plan
+
+.. currentmodule:: rebalance
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def greedy_fill(needs: np.ndarray, available: float) -> np.ndarray:
+    """Spread ``available`` over ``needs``, the largest need first
+
+    Fully serving the largest needs keeps the number of orders minimal. The
+    fill is computed for all the needs at once out of their cumulative sum.
+    """
+    order = np.argsort(-needs, kind="stable")
+    sorted_needs = needs[order]
+    served_before = np.cumsum(sorted_needs) - sorted_needs
+    filled = np.empty_like(needs)
+    filled[order] = np.clip(available - served_before, 0.0, sorted_needs)
+    return filled
+
+
+def rebalance_orders(
+    targets: pd.DataFrame,
+    positions: pd.DataFrame,
+    cash: float = 0.0,
+    tolerance: float = 0.01,
+    buy_only: bool = False,
+) -> Tuple[pd.DataFrame, float]:
+    """Buy and sell orders bringing the positions back to the plan
+
+    ``targets`` is the output of
+    :func:`investporto.plan_analytics.compute_targets` (only its leaves are
+    used), ``positions`` the one of
+    :meth:`investporto.holdings_cli.Ledger.positions`. The amounts are shares
+    of the current value plus the new ``cash``:
+
+    - only the leaves whose weight is off by more than ``tolerance`` (0 to 1)
+      are traded, back to their target,
+    - with ``buy_only`` nothing is sold and the cash goes to the underweight
+      leaves whatever the tolerance,
+    - the buys never spend more than the cash plus the sales, the largest
+      needs being served first,
+    - the trade of a leaf is split over its symbols in proportion of their
+      value (evenly when none is held yet) and rounded down to whole lots.
+
+    Symbols without price or outside of the leaves of the plan are not traded.
+    Held positions without a value (e.g. no exchange rate into the plan
+    currency) are left out of the total and their leaf is not traded: its
+    actual weight is unknown.
+    Returns the orders (columns ``symbol``, ``path``, ``side``, ``quantity``,
+    ``price``, ``amount``) and the cash left.
+    """
+    leaves = targets[targets["is_leaf"]]
+    leaf_count = len(leaves)
+    weight = leaves["weight"].to_numpy(dtype=np.float64)
+    leaf = pd.Index(leaves["path"]).get_indexer(positions["path"].fillna(""))
+    value = positions["value"].to_numpy(dtype=np.float64)
+    valued = np.isfinite(value)
+    unknown = ~valued & (positions["quantity"].to_numpy(dtype=np.float64) != 0)
+    value = np.where(valued, value, 0.0)
+    price = positions["last_price"].to_numpy(dtype=np.float64)
+    in_plan = leaf >= 0
+    tradable = in_plan & valued & np.isfinite(price) & (price > 0)
+
+    total = value.sum() + cash
+    actual = np.bincount(leaf[in_plan], weights=value[in_plan], minlength=leaf_count)
+    gap = weight * total - actual
+    # Leaves without any priced symbol cannot be traded
+    gap[np.bincount(leaf[tradable], minlength=leaf_count) == 0] = 0.0
+    # Nor the ones holding a position of unknown value
+    gap[np.bincount(leaf[in_plan & unknown], minlength=leaf_count) > 0] = 0.0
+    if buy_only:
+        sells = np.zeros(leaf_count)
+    else:
+        if total > 0:
+            gap[np.abs(actual / total - weight) <= tolerance] = 0.0
+        sells = np.clip(-gap, 0.0, None)
+    needs = np.clip(gap, 0.0, None)
+
+    # Share of the trade of its leaf each tradable symbol takes
+    symbol_leaf = leaf[tradable]
+    symbol_value = value[tradable]
+    symbol_price = price[tradable]
+    lot_size = positions["lot_size"].to_numpy(dtype=np.float64)[tradable]
+    leaf_value = np.bincount(symbol_leaf, weights=symbol_value, minlength=leaf_count)
+    symbols_per_leaf = np.bincount(symbol_leaf, minlength=leaf_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(
+            leaf_value[symbol_leaf] > 0,
+            symbol_value / leaf_value[symbol_leaf],
+            1.0 / symbols_per_leaf[symbol_leaf],
+        )
+    lot_value = symbol_price * lot_size
+
+    sold = np.floor(sells[symbol_leaf] * share / lot_value) * lot_size
+    available = cash + (sold * symbol_price).sum()
+    bought = (
+        np.floor(greedy_fill(needs, available)[symbol_leaf] * share / lot_value)
+        * lot_size
+    )
+    left = available - (bought * symbol_price).sum()
+
+    quantity = bought - sold
+    traded = quantity != 0
+    orders = pd.DataFrame(
+        {
+            "symbol": positions["symbol"].to_numpy()[tradable][traded],
+            "path": positions["path"].to_numpy()[tradable][traded],
+            "side": np.where(quantity[traded] > 0, "buy", "sell"),
+            "quantity": np.abs(quantity[traded]),
+            "price": symbol_price[traded],
+            "amount": np.abs(quantity[traded]) * symbol_price[traded],
+        }
+    )
+    return orders, float(left)
@@ -0,0 +1,222 @@
+"""
+Investment portfolio
+**************************
+
+:module: shell_cli
+
+:synopsis: Interactive shell keeping the portfolio plan loaded in memory
+
+.. currentmodule:: shell_cli
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import os
+import shlex
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+import click
+from prompt_toolkit import PromptSession
+from prompt_toolkit.completion import WordCompleter
+
+from .portfolio_plan_cli import Portfolio, project_path_option
+from .types_and_vars import portfolio_plan_name
+
+
+class PortfolioShell:
+    """Keep one Portfolio open and run shell commands against it
+
+    Modifications are flushed to the yaml file once no other modification
+    happened for ``flush_delay`` seconds (debounce) and when the shell is
+    closed. Commands and flushes are serialized with a lock since the flush
+    runs in a timer thread.
+
+    The portfolio is optimistic: the plan is only locked to load and to
+    flush, the other commands are not blocked while the shell is open.
+    """
+
+    def __init__(self, path_to_yaml: Path, flush_delay: float = 2.0):
+        self._portfolio = Portfolio(path_to_yaml, optimistic=True)
+        self._flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def portfolio(self) -> Portfolio:
+        return self._portfolio
+
+    def __enter__(self):
+        self._portfolio.open()
+        return self
+
+    def __exit__(self, exc_type, exc, exc_tb):
+        self._cancel_flush()
+        with self._lock:
+            self._portfolio.close()
+
+    def execute(self, line: str):
+        """Run one shell command line (e.g. ``add stocks -p 70``)"""
+        arguments = shlex.split(line)
+        if not arguments:
+            return
+        if arguments == ["help"]:
+            arguments = ["--help"]
+        with self._lock:
+            try:
+                shell_commands.main(
+                    arguments, prog_name="", standalone_mode=False, obj=self
+                )
+            except click.exceptions.Exit:
+                pass
+            except click.ClickException as error:
+                error.show()
+            except TypeError as error:
+                # Raised by the Portfolio on wrong allocations
+                click.echo(f"Error: {error}")
+            if self._portfolio._dirty:
+                self._schedule_flush()
+
+    def flush(self):
+        """Write the pending modifications to the yaml file"""
+        with self._lock:
+            if self._portfolio._dirty:
+                try:
+                    self._portfolio.commit()
+                except TypeError as error:
+                    # Edits no longer applying to a plan saved meanwhile
+                    click.echo(f"Error: {error}")
+
+    def _schedule_flush(self):
+        self._cancel_flush()
+        if self._flush_delay <= 0:
+            self.flush()
+            return
+        self._timer = threading.Timer(self._flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def completion_words(self) -> list:
+        """Commands and asset names proposed by the prompt"""
+        words = list(shell_commands.commands) + ["exit", "quit"]
+        for node in self._portfolio._plan.descendants:
+            words.append(node.name)
+        return sorted(set(words))
+
+
+def read_lines(shell: PortfolioShell) -> Iterator[str]:
+    """Yield the command lines: prompt with completion on a terminal, plain
+    lines when the commands are piped in"""
+    stdin = click.get_text_stream("stdin")
+    if not stdin.isatty():
+        yield from stdin
+        return
+    session = PromptSession()
+    click.echo("Type 'help' for the commands, 'exit' to leave.")
+    while True:
+        try:
+            yield session.prompt(
+                "investporto> ", completer=WordCompleter(shell.completion_words())
+            )
+        except KeyboardInterrupt:
+            continue
+        except EOFError:
+            return
+
+
+# Commands available within the shell, they receive the PortfolioShell as obj
+@click.group()
+def shell_commands():
+    """"""
+    pass
+
+
+@shell_commands.command("add")
+@click.argument("asset_class", type=click.STRING)
+@click.argument("asset_subclass", type=click.STRING, required=False, default="")
+@click.option("-p", "--percentage", type=click.FLOAT, required=False)
+@click.pass_obj
+def shell_add(shell: PortfolioShell, asset_class, asset_subclass, percentage):
+    """Add or update an asset class or subclass"""
+    if asset_subclass:
+        shell.portfolio.add(asset_class, None, asset_subclass, percentage)
+    else:
+        shell.portfolio.add(asset_class, percentage)
+
+
+@shell_commands.command("remove")
+@click.argument("asset_class", type=click.STRING)
+@click.argument("asset_subclass", type=click.STRING, required=False, default="")
+@click.pass_obj
+def shell_remove(shell: PortfolioShell, asset_class, asset_subclass):
+    """Remove an asset class or subclass"""
+    shell.portfolio.remove(asset_class, asset_subclass)
+
+
+@shell_commands.command("budget")
+@click.argument("budget", type=click.FLOAT)
+@click.pass_obj
+def shell_budget(shell: PortfolioShell, budget):
+    """Assign a budget to the portfolio"""
+    shell.portfolio.allocate_budget(budget)
+
+
+@shell_commands.command("check")
+@click.pass_obj
+def shell_check(shell: PortfolioShell):
+    """Verify the allocation"""
+    shell.portfolio.check_allocation()
+
+
+@shell_commands.command("show")
+@click.pass_obj
+def shell_show(shell: PortfolioShell):
+    """Visualize the allocation"""
+    shell.portfolio.visualize_allocation()
+
+
+@shell_commands.command("save")
+@click.pass_obj
+def shell_save(shell: PortfolioShell):
+    """Write the pending modifications now"""
+    shell.flush()
+
+
+@click.command("shell")
+@project_path_option
+@click.option(
+    "--flush-delay",
+    type=click.FLOAT,
+    default=2.0,
+    show_default=True,
+    help="Seconds without modification before the plan is written",
+)
+def portfolio_shell(projet_path: str, flush_delay: float):
+    """Interactive shell working on the portfolio plan kept in memory"""
+    try:
+        with PortfolioShell(
+            Path(projet_path / portfolio_plan_name).resolve(), flush_delay
+        ) as shell:
+            for line in read_lines(shell):
+                if line.strip() in ("exit", "quit"):
+                    break
+                shell.execute(line)
+    except TypeError as error:
+        # Plan rejected by validate on write, or edits no longer applying to
+        # a plan saved meanwhile
+        click.echo(f"Not saved: {error}")
+        exit(os.EX_DATAERR)
+    except OSError:
+        # Exception to be better defined later on
+        click.echo("Oups, something went really wrong with the config access!")
+        exit(os.EX_OSERR)
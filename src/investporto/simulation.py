@@ -0,0 +1,157 @@
+"""
+Investment portfolio
+**************************
+
+:module: simulation
+
+:synopsis: Monte-Carlo projection of the portfolio plan
+
+.. currentmodule:: simulation
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Memory one chunk of paths may use (paths x horizon x assets returns)
+memory_budget = 256 * 2**20
+
+percentiles = (5, 25, 50, 75, 95)
+
+models = ("bootstrap", "parametric")
+
+
+@dataclass
+class SimulationModel:
+    """What every chunk of paths is drawn out of
+
+    ``history`` holds the historical period log returns (rows: periods,
+    columns: assets). The bootstrap draws whole rows of it (keeping the
+    correlations between the assets), the parametric model draws from a
+    multivariate normal of the same mean and covariance.
+    ``membership`` (assets x groups) sums the assets up into the reported
+    groups (e.g. the asset classes).
+    """
+
+    history: np.ndarray
+    weights: np.ndarray
+    membership: np.ndarray
+    budget: float
+    horizon: int
+    model: str = "bootstrap"
+    rebalance: bool = False
+
+    def __post_init__(self):
+        self.mean = self.history.mean(axis=0)
+        covariance = np.atleast_2d(np.cov(self.history, rowvar=False))
+        # Tiny ridge: assets moving together make the covariance singular
+        ridge = 1e-12 * max(np.trace(covariance), 1e-12) * np.eye(len(covariance))
+        self.cholesky = np.linalg.cholesky(covariance + ridge)
+
+    def draw(self, paths: int, generator: np.random.Generator) -> np.ndarray:
+        """Log returns of ``paths`` paths (paths x horizon x assets)"""
+        if self.model == "bootstrap":
+            rows = generator.integers(0, len(self.history), (paths, self.horizon))
+            return self.history[rows]
+        normal = generator.standard_normal((paths, self.horizon, len(self.mean)))
+        return normal @ self.cholesky.T + self.mean
+
+    def outcomes(self, paths: int, generator: np.random.Generator) -> np.ndarray:
+        """Final value of each group (paths x groups) and in total (last
+        column)"""
+        if not self.rebalance and self.model == "parametric":
+            # The sum of the normal period returns is itself normal: no need
+            # to draw every period
+            normal = generator.standard_normal((paths, len(self.mean)))
+            total = np.sqrt(self.horizon) * normal @ self.cholesky.T
+            values = (
+                self.budget * self.weights * np.exp(total + self.horizon * self.mean)
+            )
+            return np.column_stack((values @ self.membership, values.sum(axis=1)))
+        returns = self.draw(paths, generator)
+        if self.rebalance:
+            # Back to the weights at the end of every period
+            growth = np.exp(returns) @ self.weights
+            total = self.budget * np.exp(np.log(growth).sum(axis=1))
+            shares = self.weights @ self.membership
+            return np.column_stack((total[:, None] * shares, total))
+        # Buy and hold: every asset grows on its own
+        values = self.budget * self.weights * np.exp(returns.sum(axis=1))
+        return np.column_stack((values @ self.membership, values.sum(axis=1)))
+
+
+def period_returns(daily_returns: np.ndarray, periods_per_year: int) -> np.ndarray:
+    """Sum daily log returns up into non overlapping periods (252 trading
+    days a year)"""
+    days = max(int(round(252 / periods_per_year)), 1)
+    periods = len(daily_returns) // days
+    if not periods:
+        raise ValueError("not enough price history for one period")
+    kept = daily_returns[len(daily_returns) - periods * days :]
+    return kept.reshape(periods, days, -1).sum(axis=1)
+
+
+def chunk_sizes(paths: int, horizon: int, assets: int, budget: int) -> list:
+    """Split ``paths`` in chunks whose returns fit in ``budget`` bytes"""
+    # The draw and its exponential coexist
+    per_path = max(horizon * assets * 8 * 2, 1)
+    size = max(min(budget // per_path, paths), 1)
+    return [min(size, paths - start) for start in range(0, paths, size)]
+
+
+# Model of the worker processes, sent once per process and not per chunk
+_model: Optional[SimulationModel] = None
+
+
+def _init_worker(model: SimulationModel):
+    global _model
+    _model = model
+
+
+def _simulate_chunk(paths: int, seed: np.random.SeedSequence) -> np.ndarray:
+    return _model.outcomes(paths, np.random.default_rng(seed))
+
+
+def simulate(
+    model: SimulationModel,
+    paths: int,
+    seed: Optional[int] = None,
+    jobs: Optional[int] = None,
+    budget: int = memory_budget,
+) -> np.ndarray:
+    """Final values (paths x groups, total as last column) of ``paths``
+    Monte-Carlo paths
+
+    The paths are drawn in chunks fitting in ``budget`` bytes, the chunks are
+    spread over ``jobs`` processes (default: all cores). Every chunk has its
+    own random stream spawned from ``seed``: the outcome does not depend on
+    the number of processes.
+    """
+    sizes = chunk_sizes(paths, model.horizon, len(model.weights), budget)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = min(jobs or os.cpu_count() or 1, len(sizes))
+    if jobs == 1:
+        _init_worker(model)
+        results = list(map(_simulate_chunk, sizes, seeds))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(model,)
+        ) as executor:
+            results = list(executor.map(_simulate_chunk, sizes, seeds))
+    return np.concatenate(results)
+
+
+def outcome_percentiles(
+    outcomes: np.ndarray, points: Sequence[float] = percentiles
+) -> np.ndarray:
+    """Percentiles (rows) of each group (columns) of the outcomes"""
+    return np.percentile(outcomes, points, axis=0)
@@ -10,3 +10,15 @@ PathType = typing.Union[str, pathlib.Path]
 
 # Vars
 portfolio_plan_name = pathlib.Path("porto_plan.yaml")
+
+# Environment variable refusing to save plans with allocation errors
+validate_on_write_env = "INVESTPORTO_VALIDATE_ON_WRITE"
+
+# Folder of the project holding the transactions
+holdings_folder_name = pathlib.Path("holdings")
+
+# Folder of the project holding the price history
+prices_folder_name = pathlib.Path("prices")
+
+# Folder of the project holding the FX rates history
+fx_folder_name = pathlib.Path("fx")
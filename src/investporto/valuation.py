@@ -0,0 +1,89 @@
+"""
+Investment portfolio
+**************************
+
+:module: valuation
+
+:synopsis: Valuation of the holdings in the base currency of the plan
+
+.. currentmodule:: valuation
+
+
+:Copyright: Copyright (c) 2010-2021 sebastianpfischer
+
+    MIT License
+
+"""
+
+from datetime import date
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .prices_cli import PriceStore
+from .types_and_vars import PathType, fx_folder_name
+
+# (currency pair, date) rates kept in memory
+rate_cache_size = 4096
+
+# Columns of the positions expressed in the currency of the symbol
+_amount_columns = ("invested", "last_price", "value")
+
+
+class FxRates:
+    """Exchange rates out of the project FX table
+
+    The rates are stored by currency pair in a :class:`PriceStore`
+    (``fx/EURUSD.f64``: price of one EUR in USD). A rate is looked up once
+    per (pair, date) and kept in a LRU cache, the conversions then cost one
+    array multiply per currency.
+    """
+
+    def __init__(self, project: PathType, cache_size: int = rate_cache_size):
+        self._store = PriceStore(project, fx_folder_name)
+        self.rate = lru_cache(maxsize=cache_size)(self._rate)
+
+    def _rate(self, currency: str, to: str, day: Optional[date] = None) -> float:
+        """Price of one ``currency`` in ``to`` (NaN if unknown)
+
+        Uses the direct pair, else the inverse one.
+        """
+        if currency == to:
+            return 1.0
+        direct = self._store.latest([currency + to], day).iloc[0]
+        if not np.isnan(direct):
+            return float(direct)
+        return float(1.0 / self._store.latest([to + currency], day).iloc[0])
+
+    def convert(
+        self,
+        amounts: np.ndarray,
+        currencies: Sequence[Optional[str]],
+        to: str,
+        day: Optional[date] = None,
+    ) -> np.ndarray:
+        """Convert ``amounts`` (one currency each, None for ``to``) into ``to``"""
+        codes, uniques = pd.factorize(
+            pd.Series(currencies, dtype=object).fillna(to).str.upper()
+        )
+        rates = np.array([self.rate(currency, to, day) for currency in uniques])
+        return np.asarray(amounts, dtype=np.float64) * rates[codes]
+
+
+def to_base_currency(
+    positions: pd.DataFrame, base: str, rates: FxRates, day: Optional[date] = None
+) -> pd.DataFrame:
+    """Express the amounts of the positions in the ``base`` currency
+
+    ``positions`` is the output of
+    :meth:`investporto.holdings_cli.Ledger.positions`, the symbols without
+    currency are taken as already in ``base``.
+    """
+    base = base.upper()
+    converted = {
+        column: rates.convert(positions[column], positions["currency"], base, day)
+        for column in _amount_columns
+    }
+    return positions.assign(**converted, currency=base)
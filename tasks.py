@@ -24,6 +24,7 @@ ROOT_DIR = Path(__file__).parent
 TEST_DIR = ROOT_DIR / "tests"
 COVERAGE_DIR = TEST_DIR / "coverage_report.html"
 SOURCE_DIR = ROOT_DIR / "src"
+BENCHMARK_DIR = ROOT_DIR / "benchmarks"
 DOCS_DIR = ROOT_DIR / "docs"
 DOCS_BUILD_DIR = DOCS_DIR / "_build"
 DOCS_INDEX = DOCS_BUILD_DIR / "index.html"
@@ -54,6 +55,15 @@ def test(c):
     c.run("investporto")
 
 
+@task
+def benchmark(c):
+    """
+    Run the benchmarks
+    """
+    for script in sorted(BENCHMARK_DIR.glob("bench_*.py")):
+        c.run(f"python {script}")
+
+
 @task
 def docs(c):
     """
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from investporto.backtest import (
+    BuyAndHold,
+    PeriodicRebalance,
+    ThresholdRebalance,
+    TrendFilter,
+    parameter_grid,
+    rolling_mean,
+    run_backtest,
+    statistics,
+    sweep,
+)
+
+# One asset doubling, one flat, over 5 days
+prices = np.array([[1.0, 1.0], [1.25, 1.0], [1.5, 1.0], [1.75, 1.0], [2.0, 1.0]])
+target = np.array([0.5, 0.5])
+
+
+def test_rolling_mean():
+    means = rolling_mean(prices, 2)
+    assert np.isnan(means[0]).all()
+    np.testing.assert_allclose(means[1:, 0], [1.125, 1.375, 1.625, 1.875])
+    np.testing.assert_allclose(means[1:, 1], 1.0)
+
+
+def test_buy_and_hold():
+    values, trades = run_backtest(prices, target, BuyAndHold(), budget=100)
+    np.testing.assert_allclose(values, [100, 112.5, 125, 137.5, 150])
+    assert trades == 0
+
+
+def test_rebalance_strategies():
+    values, trades = run_backtest(prices, target, PeriodicRebalance(every=1), 100)
+    assert trades == 4
+    # Rebalanced every day: half of the value grows with the first asset
+    expected = 100 * np.cumprod([1, 1.125, 1.1, 1 + 0.5 / 6, 1 + 0.5 / 7])
+    np.testing.assert_allclose(values, expected)
+    _, trades = run_backtest(prices, target, ThresholdRebalance(band=0.1), 100)
+    # The weight of the first asset goes 0.56, 0.6 (> 0.1 off), then 0.55...
+    assert trades == 1
+    free, _ = run_backtest(prices, target, ThresholdRebalance(band=0.1), 100)
+    paid, _ = run_backtest(prices, target, ThresholdRebalance(band=0.1), 100, 0.01)
+    assert paid[-1] < free[-1]
+
+
+def test_trend_filter():
+    falling = np.column_stack((np.linspace(2, 1, 10), np.linspace(1, 2, 10)))
+    strategy = TrendFilter(window=2, every=1)
+    values, trades = run_backtest(falling, target, strategy, 100)
+    # The falling asset is sold the first day it is under its average
+    assert trades == 1
+    assert values[-1] > run_backtest(falling, target, BuyAndHold(), 100)[0][-1]
+
+
+def test_unknown_parameter():
+    with pytest.raises(TypeError):
+        ThresholdRebalance(window=3)
+
+
+def test_parameter_ranges():
+    for strategy, parameters in (
+        (PeriodicRebalance, {"every": 0}),
+        (ThresholdRebalance, {"band": -0.01}),
+        (ThresholdRebalance, {"band": float("nan")}),
+        (TrendFilter, {"window": 0}),
+        (TrendFilter, {"every": -5}),
+    ):
+        with pytest.raises(ValueError, match="is not allowed"):
+            strategy(**parameters)
+    assert TrendFilter(window=1, every=1).window == 1
+    with pytest.raises(ValueError):
+        sweep(prices, target, "periodic", [{"every": 5}, {"every": 0}])
+
+
+def test_sweep():
+    assert parameter_grid({}) == [{}]
+    combinations = parameter_grid({"every": [1, 2, 3]})
+    assert combinations == [{"every": 1}, {"every": 2}, {"every": 3}]
+    inline = sweep(prices, target, "periodic", combinations, budget=100, jobs=1)
+    parallel = sweep(prices, target, "periodic", combinations, budget=100, jobs=2)
+    assert inline == parallel
+    assert inline[0] == statistics(
+        *run_backtest(prices, target, PeriodicRebalance(every=1), 100)
+    )
+    with pytest.raises(ValueError):
+        sweep(prices, target, "unknown", combinations)
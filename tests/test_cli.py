@@ -0,0 +1,54 @@
+import re
+import subprocess
+import sys
+from click.testing import CliRunner
+from investporto.cli import lazy_commands, main
+
+# Modules only some commands need, never to be loaded at startup
+heavy_modules = ("pyzipper", "yaml", "rich", "pandas", "numpy")
+
+
+def test_lazy_commands_are_consistent():
+    """Every registered command exists and its help line is up to date"""
+    for name, (_, _, help_line) in lazy_commands.items():
+        command = main.get_command(None, name)
+        assert command is not None
+        assert command.name == name
+        assert " ".join(command.help.split()).startswith(help_line)
+
+
+def test_help_lists_all_commands():
+    runner = CliRunner()
+    result = runner.invoke(main, ["--help"])
+    assert result.exit_code == 0
+    for name in lazy_commands:
+        assert name in result.output
+
+
+def test_unknown_command():
+    runner = CliRunner()
+    result = runner.invoke(main, ["not-a-command"])
+    assert result.exit_code != 0
+    assert "No such command" in result.output
+
+
+def import_times(*arguments: str) -> dict:
+    """Run python with -X importtime and return {module: cumulative seconds}"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(.*)$", line)
+        if match:
+            times[match.group(2).strip()] = int(match.group(1)) / 1e6
+    return times
+
+
+def test_help_does_not_import_heavy_dependencies():
+    times = import_times("-m", "investporto", "--help")
+    for module in heavy_modules:
+        assert module not in times
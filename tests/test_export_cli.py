@@ -0,0 +1,97 @@
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+import yaml
+from click.testing import CliRunner
+from investporto.export_cli import export_data
+from investporto.holdings_cli import Ledger
+from investporto.types_and_vars import portfolio_plan_name
+
+plan = {
+    "name": "entry",
+    "budget": 1000.0,
+    "children": [
+        {
+            "name": "stocks",
+            "percentage": 80,
+            "children": [
+                {"name": "aapl", "percentage": 50},
+                {"name": "msft", "percentage": 50},
+            ],
+        },
+        {"name": "bonds", "percentage": 20},
+    ],
+}
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(yaml.dump(plan))
+    ledger = Ledger(tmp_path)
+    ledger.add_symbol("aapl", path="stocks/aapl")
+    ledger.add_symbol("aapl.de", path="stocks/aapl")
+    ledger.add_symbol("gold")
+    ledger.append("aapl", 2, 100.0, day=date(2022, 1, 3))
+    ledger.append("aapl.de", 1, 100.0, day=date(2022, 1, 3))
+    ledger.append("gold", 1, 50.0, day=date(2022, 1, 3))
+    return tmp_path
+
+
+def test_export_csv(project):
+    output = project / "portfolio.csv"
+    runner = CliRunner()
+    result = runner.invoke(export_data, ["export", str(output), "-pp", str(project)])
+    assert result.exit_code == 0, result.output
+    assert "7 rows exported" in result.output
+    frame = pd.read_csv(output, keep_default_na=False, na_values=[""])
+    # Plan order, the leaf holding two symbols is repeated
+    assert frame["name"].tolist()[:6] == [
+        "entry",
+        "stocks",
+        "aapl",
+        "aapl",
+        "msft",
+        "bonds",
+    ]
+    assert frame.loc[2:3, "symbol"].tolist() == ["AAPL", "AAPL.DE"]
+    assert frame.loc[2, "actual_amount"] == 300.0
+    assert frame.loc[0, "actual_amount"] == 350.0
+    # Symbols out of the plan come last
+    assert frame.loc[6, "symbol"] == "GOLD"
+    assert frame.loc[6, "position_value"] == 50.0
+
+
+def test_export_format(project, monkeypatch):
+    runner = CliRunner()
+    result = runner.invoke(
+        export_data, ["export", str(project / "portfolio.txt"), "-pp", str(project)]
+    )
+    assert result.exit_code != 0
+    assert "use --format" in result.output
+    # Missing optional dependencies are reported
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    result = runner.invoke(
+        export_data, ["export", str(project / "out.parquet"), "-pp", str(project)]
+    )
+    assert result.exit_code != 0
+    assert "requires pyarrow" in result.output
+
+
+def test_export_parquet(project):
+    pytest.importorskip("pyarrow")
+    output = project / "portfolio.parquet"
+    runner = CliRunner()
+    result = runner.invoke(export_data, ["export", str(output), "-pp", str(project)])
+    assert result.exit_code == 0, result.output
+    assert len(pd.read_parquet(output)) == 7
+
+
+def test_export_xlsx(project):
+    pytest.importorskip("xlsxwriter")
+    output = project / "portfolio.xlsx"
+    runner = CliRunner()
+    result = runner.invoke(export_data, ["export", str(output), "-pp", str(project)])
+    assert result.exit_code == 0, result.output
+    assert output.stat().st_size > 0
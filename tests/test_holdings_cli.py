@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from datetime import date
+from investporto import holdings_cli
+from investporto.holdings_cli import Ledger, holdings
+from investporto.prices_cli import prices
+from investporto.types_and_vars import holdings_folder_name, portfolio_plan_name
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(tmp_path)
+    ledger.add_symbol("aapl", path="Stocks/Large_Caps")
+    ledger.add_symbol("vti", path="etfs")
+    return ledger
+
+
+def test_append_and_positions(ledger, tmp_path):
+    ledger.append("aapl", 10, 100.0, fees=1.0, day=date(2022, 1, 3))
+    ledger.append("AAPL", -4, 120.0, day=date(2022, 2, 1))
+    ledger.append("vti", 2, 50.0, day=date(2022, 1, 5))
+    # A symbol traded before being registered
+    ledger.append("msft", 1, 300.0, day=date(2022, 1, 4))
+    # Reloaded from the disk
+    positions = Ledger(tmp_path).positions().set_index("symbol")
+    assert positions.loc["AAPL", "path"] == "stocks/large_caps"
+    assert positions.loc["AAPL", "quantity"] == 6
+    assert positions.loc["AAPL", "invested"] == 1000.0 + 1.0 - 480.0
+    assert positions.loc["AAPL", "last_price"] == 120.0
+    assert positions.loc["AAPL", "value"] == 720.0
+    assert positions.loc["VTI", "value"] == 100.0
+    assert positions.loc["MSFT", "path"] is None
+    by_plan = Ledger(tmp_path).positions_by_plan().set_index("path")
+    assert by_plan.loc["stocks/large_caps", "value"] == 720.0
+    assert by_plan.loc["", "value"] == 300.0
+    # Market prices take over the ones of the transactions
+    market = pd.Series({"AAPL": 150.0, "VTI": np.nan})
+    positions = Ledger(tmp_path).positions(market).set_index("symbol")
+    assert positions.loc["AAPL", "value"] == 900.0
+    assert positions.loc["VTI", "value"] == 100.0
+
+
+def test_compaction(ledger, monkeypatch, tmp_path):
+    monkeypatch.setattr(holdings_cli, "compaction_threshold", 3)
+    transactions = holdings_folder_name / "transactions"
+    for day in (5, 4, 3):
+        ledger.append("aapl", 1, float(day), day=date(2022, 1, day))
+    # The third append compacted the journal into a date sorted segment
+    assert [path.name for path in (tmp_path / transactions).iterdir()] == [
+        "segment-000001.npy"
+    ]
+    ledger.append("aapl", 1, 6.0, day=date(2022, 1, 6))
+    ledger.compact()
+    segments = list((tmp_path / transactions).glob("segment-*.npy"))
+    assert len(segments) == 1
+    history = np.load(segments[0])
+    assert list(history["price"]) == [3.0, 4.0, 5.0, 6.0]
+    assert ledger.positions().loc[0, "last_price"] == 6.0
+
+
+def test_interrupted_compaction(ledger, tmp_path):
+    folder = tmp_path / holdings_folder_name / "transactions"
+    ledger.append("aapl", 2, 10.0, day=date(2022, 1, 3))
+    ledger.compact()
+    ledger.append("aapl", 1, 11.0, day=date(2022, 1, 4))
+    previous = {path.name: path.read_bytes() for path in folder.iterdir()}
+    ledger.compact()
+    # A crash after the new segment was renamed, before the old files were
+    # removed: they are ignored
+    for name, content in previous.items():
+        (folder / name).write_bytes(content)
+    assert len(ledger.transactions()) == 2
+    assert ledger.positions().loc[0, "quantity"] == 3
+    # And removed by the next compaction
+    ledger.append("aapl", 1, 12.0, day=date(2022, 1, 5))
+    ledger.compact()
+    assert [path.name for path in folder.iterdir()] == ["segment-000003.npy"]
+    assert len(ledger.transactions()) == 3
+
+
+def test_extend(ledger):
+    transactions = pd.DataFrame(
+        {
+            "date": ["2022-01-03", "2022-01-04", "2022-01-05"],
+            "symbol": ["aapl", "VTI", "aapl"],
+            "quantity": [1.0, 2.0, 3.0],
+            "price": [10.0, 20.0, 30.0],
+        }
+    )
+    ledger.extend(transactions)
+    positions = ledger.positions().set_index("symbol")
+    assert positions.loc["AAPL", "quantity"] == 4.0
+    assert positions.loc["AAPL", "last_price"] == 30.0
+    assert positions.loc["VTI", "value"] == 40.0
+
+
+def test_commands(tmp_path):
+    runner = CliRunner()
+    project = str(tmp_path)
+    result = runner.invoke(
+        holdings, ["add-symbol", "aapl", "-pp", project, "-ap", "stocks"]
+    )
+    assert result.exit_code == 0
+    runner.invoke(
+        holdings,
+        [
+            "buy",
+            "aapl",
+            "-q",
+            "3",
+            "--price",
+            "10",
+            "--date",
+            "2022-01-03",
+            "-pp",
+            project,
+        ],
+    )
+    runner.invoke(
+        holdings, ["sell", "aapl", "-q", "1", "--price", "20", "-pp", project]
+    )
+    csv_file = tmp_path / "transactions.csv"
+    csv_file.write_text("date,symbol,quantity,price\n2022-01-04,vti,1,50\n")
+    result = runner.invoke(
+        holdings, ["import-transactions", str(csv_file), "-pp", project]
+    )
+    assert "1 transactions imported" in result.output
+    result = runner.invoke(holdings, ["positions", "--by-plan", "-pp", project])
+    assert result.exit_code == 0
+    assert "stocks" in result.output and "40.0" in result.output
+    result = runner.invoke(holdings, ["compact-ledger", "-pp", project])
+    assert result.exit_code == 0
+
+
+def test_drift_command(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(
+        "name: entry\nbudget: 100\nchildren:\n"
+        "- {name: stocks, percentage: 60}\n- {name: bonds, percentage: 40}\n"
+    )
+    ledger = Ledger(tmp_path)
+    ledger.add_symbol("aapl", path="stocks")
+    ledger.add_symbol("bnd", path="bonds")
+    ledger.append("aapl", 1, 80.0)
+    ledger.append("bnd", 1, 20.0)
+    runner = CliRunner()
+    result = runner.invoke(holdings, ["drift", "-pp", str(tmp_path)])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert [line.split()[0] for line in lines[1:]] == ["entry", "stocks", "bonds"]
+    result = runner.invoke(
+        holdings, ["drift", "-pp", str(tmp_path), "--threshold", "10"]
+    )
+    assert [line.split()[0] for line in result.output.splitlines()[1:]] == [
+        "stocks",
+        "bonds",
+    ]
+    # No node drifting that much: no table full of NaN
+    result = runner.invoke(
+        holdings, ["drift", "-pp", str(tmp_path), "--threshold", "50"]
+    )
+    assert result.exit_code == 0
+    assert result.output == "No drift beyond the threshold\n"
+
+
+def test_rebalance_command(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(
+        "name: entry\nchildren:\n"
+        "- {name: stocks, percentage: 60}\n- {name: bonds, percentage: 40}\n"
+    )
+    ledger = Ledger(tmp_path)
+    ledger.add_symbol("aapl", path="stocks")
+    ledger.add_symbol("bnd", path="bonds")
+    ledger.append("aapl", 8, 10.0)
+    ledger.append("bnd", 2, 10.0)
+    runner = CliRunner()
+    result = runner.invoke(holdings, ["rebalance", "-pp", str(tmp_path)])
+    assert result.exit_code == 0
+    assert "AAPL" in result.output and "sell" in result.output
+    result = runner.invoke(
+        holdings, ["rebalance", "-pp", str(tmp_path), "--buy-only", "--cash", "0"]
+    )
+    assert "Nothing to trade" in result.output
+
+
+def test_drift_in_plan_currency(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(
+        "name: entry\ncurrency: EUR\nchildren:\n"
+        "- {name: stocks, percentage: 50}\n- {name: bonds, percentage: 50}\n"
+    )
+    ledger = Ledger(tmp_path)
+    ledger.add_symbol("aapl", path="stocks", currency="usd")
+    ledger.add_symbol("bnd", path="bonds", currency="eur")
+    ledger.append("aapl", 1, 200.0)
+    ledger.append("bnd", 1, 100.0)
+    rates = tmp_path / "rates.csv"
+    rates.write_text(f"date,pair,rate\n{date.today()},EUR/USD,2.0\n")
+    runner = CliRunner()
+    runner.invoke(prices, ["import-fx-rates", str(rates), "-pp", str(tmp_path)])
+    result = runner.invoke(
+        holdings, ["drift", "-pp", str(tmp_path), "--threshold", "1"]
+    )
+    # 200 USD are worth 100 EUR: no drift at all
+    assert "No drift beyond the threshold" in result.output
+    result = runner.invoke(holdings, ["positions", "-pp", str(tmp_path)])
+    assert "200.0" in result.output
+    result = runner.invoke(
+        holdings, ["positions", "-pp", str(tmp_path), "--currency", "gbp"]
+    )
+    assert "No GBP rate for: AAPL, BND" in result.output
+    # Without a rate for the bonds, they are not traded
+    (tmp_path / portfolio_plan_name).write_text(
+        "name: entry\ncurrency: USD\nchildren:\n"
+        "- {name: stocks, percentage: 50}\n- {name: bonds, percentage: 50}\n"
+    )
+    ledger.add_symbol("gbp_bond", path="bonds", currency="gbp")
+    ledger.append("gbp_bond", 1, 100.0)
+    result = runner.invoke(holdings, ["rebalance", "-pp", str(tmp_path)])
+    assert result.exit_code == 0
+    assert "No USD rate for: GBP_BOND" in result.output
+    assert "nan" not in result.output.lower()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from datetime import date
+from investporto.optimization import (
+    daily_returns,
+    estimate,
+    mean_variance,
+    min_variance,
+    price_matrix,
+    risk_parity,
+    shrunk_covariance,
+)
+from investporto.prices_cli import PriceStore
+
+covariance = np.array([[0.04, 0.0], [0.0, 0.01]])
+
+
+def test_solvers():
+    assert min_variance(covariance) == pytest.approx([0.2, 0.8], abs=1e-6)
+    assert risk_parity(covariance) == pytest.approx([1 / 3, 2 / 3])
+    # A high return wins over a low variance when the risk aversion is low
+    assert mean_variance(np.array([0.1, 0.0]), covariance) == pytest.approx(
+        [1.0, 0.0], abs=1e-6
+    )
+    assert mean_variance(np.array([0.1, 0.0]), covariance, 100.0) == pytest.approx(
+        [0.22, 0.78], abs=1e-6
+    )
+
+
+def test_large_universe():
+    generator = np.random.default_rng(0)
+    assets, observations = 500, 750
+    factors = generator.normal(0, 0.01, (observations, 3))
+    returns = factors @ generator.normal(0, 0.3, (3, assets)) + generator.normal(
+        0, 0.01, (observations, assets)
+    )
+    estimated, shrinkage = shrunk_covariance(returns)
+    for weights in (min_variance(estimated), risk_parity(estimated)):
+        assert weights.sum() == pytest.approx(1.0)
+        assert weights.min() >= 0
+    assert 0 < shrinkage < 1
+    contributions = weights * (estimated @ weights)
+    assert contributions.std() / contributions.mean() < 1e-3
+
+
+def test_price_matrix_and_returns(tmp_path):
+    store = PriceStore(tmp_path)
+    days = np.array(["2022-01-03", "2022-01-04", "2022-01-06"], dtype="datetime64[D]")
+    store.update("A", days, [1.0, 2.0, 4.0])
+    store.update("B", days[1:], [10.0, 5.0])
+    prices = price_matrix(store, ["A", "B"], date(2022, 1, 1), date(2022, 1, 6))
+    # The days without any price are dropped
+    assert prices.shape == (3, 2)
+    returns = daily_returns(prices)
+    assert returns[:, 0] == pytest.approx(np.log([2.0, 2.0]))
+    assert returns[:, 1] == pytest.approx([0.0, np.log(0.5)])
+
+
+def test_estimate_cache(tmp_path):
+    store = PriceStore(tmp_path)
+    days = np.datetime64("2022-01-01") + np.arange(30)
+    generator = np.random.default_rng(1)
+    for symbol in ("A", "B"):
+        store.update(symbol, days, np.exp(generator.normal(0, 0.01, 30).cumsum()))
+    window = (date(2022, 1, 1), date(2022, 1, 30))
+    cache = tmp_path / "cache"
+    mean, covariance = estimate(store, ["A", "B"], *window, cache)
+    assert len(list(cache.iterdir())) == 1
+    cached_mean, cached_covariance = estimate(store, ["A", "B"], *window, cache)
+    assert cached_covariance == pytest.approx(covariance)
+    # New prices invalidate the cached estimation
+    store.update("A", [np.datetime64("2022-01-15")], [2.0])
+    estimate(store, ["A", "B"], *window, cache)
+    assert len(list(cache.iterdir())) == 2
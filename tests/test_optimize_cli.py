@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pytest
+import yaml
+from click.testing import CliRunner
+from investporto.holdings_cli import Ledger
+from investporto.optimize_cli import optimize_plan, propose_plan
+from investporto.plan_tree import PlanNode
+from investporto.prices_cli import PriceStore
+from investporto.types_and_vars import portfolio_plan_name
+import pandas as pd
+
+plan = {
+    "name": "entry",
+    "children": [
+        {
+            "name": "stocks",
+            "percentage": 80,
+            "children": [
+                {"name": "aapl", "percentage": 50},
+                {"name": "tech", "percentage": 50, "symbol": "msft"},
+            ],
+        },
+        {"name": "bonds", "percentage": 20},
+    ],
+}
+
+
+def test_propose_plan():
+    root = PlanNode.from_dict(plan)
+    proposal = propose_plan(root, pd.Series([1.0, 3.0], index=["stocks/aapl", "bonds"]))
+    percentages = {
+        node.name: node.percentage for node in proposal.iter_preorder() if node.parent
+    }
+    # aapl and bonds share their 60% of the budget: 15% and 45%
+    assert percentages["stocks"] == pytest.approx(55.0)
+    assert percentages["aapl"] == pytest.approx(15 / 55 * 100)
+    assert percentages["tech"] == pytest.approx(40 / 55 * 100)
+    assert percentages["bonds"] == pytest.approx(45.0)
+    # The plan itself is untouched
+    assert root.child("bonds").percentage == 20
+
+
+def test_optimize_command(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(yaml.dump(plan))
+    Ledger(tmp_path).add_symbol("bnd", path="bonds")
+    store = PriceStore(tmp_path)
+    days = np.datetime64("2022-01-01") + np.arange(200)
+    generator = np.random.default_rng(0)
+    for symbol, volatility in (("AAPL", 0.02), ("MSFT", 0.02), ("BND", 0.005)):
+        prices = np.exp(generator.normal(0, volatility, len(days)).cumsum())
+        store.update(symbol, days, prices)
+    runner = CliRunner()
+    result = runner.invoke(
+        optimize_plan,
+        ["optimize", "-pp", str(tmp_path), "--end", "2022-07-19", "-m", "risk-parity"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "BND" in result.output and "MSFT" in result.output
+    proposal = yaml.safe_load((tmp_path / "porto_plan.optimized.yaml").read_text())
+    bonds = proposal["children"][1]
+    # The least volatile leaf takes the largest part
+    assert bonds["percentage"] > 50
+    # The plan is untouched, the estimation cached
+    assert yaml.safe_load((tmp_path / portfolio_plan_name).read_text()) == plan
+    assert len(list((tmp_path / ".investporto" / "covariance").iterdir())) == 1
+
+
+def test_empty_plan(tmp_path):
+    empty_plan = {"name": "entry", "budget": 1000.0}
+    (tmp_path / portfolio_plan_name).write_text(yaml.dump(empty_plan))
+    runner = CliRunner()
+    for command, message in (
+        ("optimize", "At least two leaves need a price history to optimize"),
+        ("simulate", "At least one leaf needs a price history to simulate"),
+        ("backtest", "At least one leaf needs a price history to backtest"),
+    ):
+        result = runner.invoke(optimize_plan, [command, "-pp", str(tmp_path)])
+        assert result.exit_code == os.EX_DATAERR
+        assert message in result.output
+
+
+def test_simulate_command(tmp_path):
+    plan_with_budget = dict(plan, budget=1000.0)
+    (tmp_path / portfolio_plan_name).write_text(yaml.dump(plan_with_budget))
+    store = PriceStore(tmp_path)
+    days = np.datetime64("2020-01-01") + np.arange(400)
+    generator = np.random.default_rng(0)
+    for symbol in ("AAPL", "MSFT"):
+        prices = np.exp(generator.normal(0.001, 0.02, len(days)).cumsum())
+        store.update(symbol, days, prices)
+    runner = CliRunner()
+    arguments = ["simulate", "-pp", str(tmp_path), "--end", "2021-02-03"]
+    arguments += ["--paths", "200", "--years", "2", "--seed", "1", "-j", "1"]
+    result = runner.invoke(optimize_plan, arguments)
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0].split() == ["p5", "p25", "p50", "p75", "p95"]
+    assert [line.split()[0] for line in lines[1:]] == ["stocks", "bonds", "total"]
+    # Bonds have no price history: kept as cash
+    assert set(lines[2].split()[1:]) == {"200.00"}
+
+
+def test_backtest_command(tmp_path):
+    (tmp_path / portfolio_plan_name).write_text(yaml.dump(dict(plan, budget=1000.0)))
+    store = PriceStore(tmp_path)
+    days = np.datetime64("2020-01-01") + np.arange(300)
+    generator = np.random.default_rng(0)
+    for symbol in ("AAPL", "MSFT"):
+        prices = np.exp(generator.normal(0.001, 0.02, len(days)).cumsum())
+        store.update(symbol, days, prices)
+    runner = CliRunner()
+    arguments = ["backtest", "-pp", str(tmp_path), "--end", "2020-10-26", "-j", "1"]
+    arguments += ["-s", "threshold", "-P", "band=0.01:0.1:4", "--top", "2"]
+    result = runner.invoke(optimize_plan, arguments)
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert "band" in lines[0] and "final_value" in lines[0]
+    assert len(lines) == 3
+    result = runner.invoke(
+        optimize_plan, ["backtest", "-pp", str(tmp_path), "-P", "window=5"]
+    )
+    assert result.exit_code != 0
+    assert "threshold has no parameter window" in result.output
+    result = runner.invoke(
+        optimize_plan,
+        ["backtest", "-pp", str(tmp_path), "-s", "periodic", "-P", "every=0,5"],
+    )
+    assert result.exit_code == 2
+    assert "every = 0 is not allowed (at least 1)" in result.output
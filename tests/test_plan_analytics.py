@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from investporto.plan_analytics import compute_drift, compute_targets, flatten_plan
+from investporto.plan_tree import PlanNode
+
+plan = {
+    "name": "entry",
+    "budget": 1000.0,
+    "children": [
+        {
+            "name": "stocks",
+            "percentage": 60,
+            "children": [
+                {"name": "large_caps", "percentage": 50},
+                {"name": "small_caps", "percentage": 50},
+            ],
+        },
+        {"name": "bonds", "percentage": 40},
+    ],
+}
+
+
+def test_flatten_plan():
+    flat_plan = flatten_plan(PlanNode.from_dict(plan))
+    assert flat_plan.path == [
+        "",
+        "stocks",
+        "stocks/large_caps",
+        "stocks/small_caps",
+        "bonds",
+    ]
+    assert flat_plan.parent.tolist() == [-1, 0, 1, 1, 0]
+    assert flat_plan.depth.tolist() == [0, 1, 2, 2, 1]
+    assert flat_plan.is_leaf.tolist() == [False, False, True, True, True]
+
+
+def test_compute_targets():
+    targets = compute_targets(PlanNode.from_dict(plan)).set_index("path")
+    assert targets.loc["", "target_amount"] == 1000.0
+    assert targets.loc["stocks", "target_amount"] == pytest.approx(600.0)
+    assert targets.loc["stocks/small_caps", "target_amount"] == pytest.approx(300.0)
+    assert targets.loc["bonds", "weight"] == pytest.approx(0.4)
+    # The leaves share the whole budget
+    assert targets[targets["is_leaf"]]["target_amount"].sum() == pytest.approx(1000)
+
+
+def test_compute_targets_large_plan():
+    leaves = 100000
+    root = PlanNode("entry", budget=1e6)
+    for subclass_number in range(100):
+        subclass = PlanNode(f"subclass_{subclass_number}", root, percentage=1.0)
+        for leaf_number in range(leaves // 100):
+            PlanNode(f"asset_{leaf_number}", subclass, percentage=0.1)
+    targets = compute_targets(root)
+    assert targets["is_leaf"].sum() == leaves
+    assert targets["target_amount"].iloc[-1] == pytest.approx(10.0)
+
+
+def test_compute_drift():
+    holdings = pd.DataFrame(
+        {
+            "path": ["stocks/large_caps", "stocks/large_caps", "bonds", "gold", None],
+            "value": [400.0, 100.0, 300.0, 100.0, 100.0],
+        }
+    )
+    drift = compute_drift(PlanNode.from_dict(plan), holdings).set_index("path")
+    # Unknown paths only count in the total
+    assert drift.loc["", "actual_amount"] == 1000.0
+    assert drift.loc["stocks", "actual_amount"] == 500.0
+    assert drift.loc["stocks", "drift_amount"] == pytest.approx(-100.0)
+    assert drift.loc["stocks/large_caps", "weight_drift"] == pytest.approx(0.2)
+    assert drift.loc["stocks/small_caps", "relative_drift"] == pytest.approx(-1.0)
+    assert drift.loc["bonds", "relative_drift"] == pytest.approx(-0.25)
+    by_budget = compute_drift(PlanNode.from_dict(plan), holdings.iloc[:3], True)
+    assert by_budget["target_amount"].iloc[0] == 1000.0
+    assert by_budget["actual_weight"].iloc[0] == pytest.approx(0.8)
+
+
+def test_compute_drift_large_holdings():
+    root = PlanNode("entry", budget=1e6)
+    for subclass_number in range(100):
+        subclass = PlanNode(f"subclass_{subclass_number}", root, percentage=1.0)
+        for leaf_number in range(1000):
+            PlanNode(f"asset_{leaf_number}", subclass, percentage=0.1)
+    leaves = [
+        f"subclass_{subclass_number}/asset_{leaf_number}"
+        for subclass_number in range(100)
+        for leaf_number in range(1000)
+    ]
+    holdings = pd.DataFrame({"path": leaves, "value": np.full(len(leaves), 10.0)})
+    drift = compute_drift(root, holdings)
+    assert drift["actual_amount"].iloc[0] == pytest.approx(1e6)
+    assert np.allclose(drift["weight_drift"], 0.0)
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from investporto.plan_import import plan_from_table
+from investporto.plan_tree import PlanNode
+
+
+def test_plan_from_table():
+    table = pd.DataFrame(
+        {
+            "path": ["/bonds", "stocks/tech", "stocks", "stocks/other"],
+            "percentage": [20, 25, 80, 75],
+            "currency": [None, None, "eur", None],
+            "symbol": ["bnd", None, None, None],
+        }
+    )
+    root = PlanNode("mine", budget=500.0)
+    plan = plan_from_table(table, root)
+    assert plan.name == "mine" and plan.budget == 500.0
+    assert plan.extra == {"currency": "EUR"}
+    assert [node.name for node in plan.children] == ["bonds", "stocks"]
+    assert [node.name for node in plan.child("stocks").children] == ["tech", "other"]
+    assert plan.child("bonds").extra == {"symbol": "bnd"}
+    assert plan.child("stocks").child("tech").extra is None
+
+
+def test_plan_from_table_errors():
+    table = pd.DataFrame(
+        {
+            "path": ["stocks", "stocks", "bonds/gov", "etfs", "etfs/world"],
+            "percentage": [50, 50, 100, 120, 90],
+        }
+    )
+    with pytest.raises(ValueError) as error:
+        plan_from_table(table)
+    message = str(error.value)
+    assert "stocks is defined more than once" in message
+    assert "bonds is missing" in message
+    assert "etfs: percentage 120.0 is not allowed" in message
+    assert "etfs: children sum up to 90" in message
+    assert "entry: children sum up to 220" in message
+    with pytest.raises(ValueError, match="missing columns: percentage"):
+        plan_from_table(pd.DataFrame({"path": ["stocks"]}))
@@ -0,0 +1,201 @@
+import json
+
+import pytest
+import yaml
+from click.testing import CliRunner
+from investporto import portfolio_plan_cli
+from investporto.cli import main
+from investporto.plan_journal import PlanJournal
+from investporto.portfolio_plan_cli import Portfolio
+from investporto.shell_cli import PortfolioShell
+from investporto.types_and_vars import portfolio_plan_name
+
+plan = {
+    "name": "entry",
+    "budget": 0.0,
+    "children": [{"name": "stocks", "percentage": 70}],
+}
+
+
+@pytest.fixture
+def project_plan(tmp_path):
+    path = tmp_path / portfolio_plan_name
+    path.write_text(yaml.dump(plan))
+    return path
+
+
+def journal_lines(project_plan) -> list:
+    return PlanJournal(project_plan).path.read_text().splitlines()
+
+
+def loaded(project_plan) -> dict:
+    with Portfolio(project_plan, read_only=True) as p:
+        return p._plan.to_dict()
+
+
+def test_edits_are_appended_to_the_journal(project_plan):
+    # The first save creates the journal
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    snapshot = project_plan.read_text()
+    assert len(journal_lines(project_plan)) == 1
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("stocks/europe", 100)
+        p.move_node("stocks/europe", "bonds")
+        p.allocate_budget(1000, "eur")
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.remove_node("bonds/europe")
+    # The yaml file is untouched, the edits are replayed on load
+    assert project_plan.read_text() == snapshot
+    records = [json.loads(line) for line in journal_lines(project_plan)[1:]]
+    assert [record["op"] for record in records] == [
+        "add_node",
+        "move_node",
+        "allocate_budget",
+        "remove_node",
+    ]
+    replayed = loaded(project_plan)
+    assert replayed["budget"] == 1000
+    assert replayed["currency"] == "EUR"
+    assert [child["name"] for child in replayed["children"]] == ["stocks", "bonds"]
+    assert "children" not in replayed["children"][1]
+    # Without the journal enabled, the next save folds it
+    with Portfolio(project_plan) as p:
+        p.add_node("stocks/asia", 100)
+    assert not PlanJournal(project_plan).path.exists()
+    assert yaml.safe_load(project_plan.read_text())["budget"] == 1000
+
+
+def test_journal_is_folded(project_plan, monkeypatch):
+    monkeypatch.setattr(portfolio_plan_cli, "journal_max_records", 2)
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    for name in ("europe", "asia"):
+        with Portfolio(project_plan, use_journal=True) as p:
+            p.add_node(f"stocks/{name}", 50)
+    assert len(journal_lines(project_plan)) == 3
+    # Past the threshold, the plan is saved as a whole
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.allocate_budget(10)
+    assert len(journal_lines(project_plan)) == 1
+    assert yaml.safe_load(project_plan.read_text())["budget"] == 10
+    # So are the edits the journal does not know
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("cash", 10)
+        p.replace_plan(p._plan)
+    assert len(journal_lines(project_plan)) == 1
+    assert "cash" in project_plan.read_text()
+
+
+def test_cut_record_is_ignored(project_plan):
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("stocks/europe", 100)
+    journal = PlanJournal(project_plan).path
+    # A crash in the middle of an append
+    with open(journal, "a") as journal_file:
+        journal_file.write('{"op":"remove_node","args":["bon')
+    assert [child["name"] for child in loaded(project_plan)["children"]] == [
+        "stocks",
+        "bonds",
+    ]
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds/world", 100)
+    assert [json.loads(line)["op"] for line in journal_lines(project_plan)[1:]] == [
+        "add_node",
+        "add_node",
+    ]
+    assert loaded(project_plan)["children"][1]["children"][0]["name"] == "world"
+
+
+def test_rejected_edits_are_not_journaled(project_plan, monkeypatch, capsys):
+    monkeypatch.setenv("INVESTPORTO_PLAN_JOURNAL", "1")
+    with Portfolio(project_plan) as p:
+        p.add_node("bonds", 30)
+    with PortfolioShell(project_plan, flush_delay=60) as shell:
+        shell.execute("add crypto -p 300")
+        shell.execute("add cash -p 5")
+    assert [json.loads(line)["args"] for line in journal_lines(project_plan)[1:]] == [
+        ["cash", 5.0]
+    ]
+    assert [child["name"] for child in loaded(project_plan)["children"]] == [
+        "stocks",
+        "bonds",
+        "cash",
+    ]
+
+
+def test_bad_record_stops_the_replay(project_plan, capsys):
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("cash", 5)
+    with open(PlanJournal(project_plan).path, "a") as journal_file:
+        journal_file.write('{"op":"add_node","args":["crypto",300],"kwargs":{}}\n')
+        journal_file.write('{"op":"remove_node","args":["cash"],"kwargs":{}}\n')
+    capsys.readouterr()
+    # The plan still loads, with the edits before the bad one
+    assert [child["name"] for child in loaded(project_plan)["children"]] == [
+        "stocks",
+        "bonds",
+        "cash",
+    ]
+    assert "edit 2 cannot be replayed (percentage = 300 is not allowed)" in (
+        capsys.readouterr().out
+    )
+    # The next save folds the replayed edits and drops the journal
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.allocate_budget(100)
+    capsys.readouterr()
+    assert len(journal_lines(project_plan)) == 1
+    assert [child["name"] for child in loaded(project_plan)["children"]] == [
+        "stocks",
+        "bonds",
+        "cash",
+    ]
+    assert "cannot be replayed" not in capsys.readouterr().out
+
+
+def test_journal_of_another_plan_is_ignored(project_plan):
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds/world", 100)
+    # The yaml file edited by hand
+    project_plan.write_text(yaml.dump(plan))
+    runner = CliRunner()
+    result = runner.invoke(main, ["verify-allocation", "-pp", str(project_plan.parent)])
+    assert "its 1 edits are ignored" in result.output
+    assert "bonds" not in result.output
+
+
+def test_concurrent_journaled_edits(project_plan):
+    with Portfolio(project_plan, use_journal=True) as p:
+        p.add_node("bonds", 30)
+    first = Portfolio(project_plan, use_journal=True, optimistic=True)
+    second = Portfolio(project_plan, use_journal=True, optimistic=True)
+    with first, second:
+        first.add_node("stocks/europe", 100)
+        second.add_node("bonds/world", 100)
+        first.commit()
+    # The second writer replayed its edit on top of the journal of the first
+    children = loaded(project_plan)["children"]
+    assert children[0]["children"][0]["name"] == "europe"
+    assert children[1]["children"][0]["name"] == "world"
+    assert len(journal_lines(project_plan)) == 3
+
+
+def test_compact_plan(project_plan, monkeypatch):
+    monkeypatch.setenv("INVESTPORTO_PLAN_JOURNAL", "1")
+    runner = CliRunner()
+    project = str(project_plan.parent)
+    for arguments in (["add-node", "bonds", "-p", "30"], ["allocate-budget", "50"]):
+        result = runner.invoke(main, arguments + ["-pp", project])
+        assert result.exit_code == 0
+    assert yaml.safe_load(project_plan.read_text())["budget"] == 0
+    result = runner.invoke(main, ["compact-plan", "-pp", project])
+    assert result.exit_code == 0
+    assert "1 journaled edits folded" in result.output
+    assert yaml.safe_load(project_plan.read_text())["budget"] == 50
+    assert len(journal_lines(project_plan)) == 1
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+import yaml
+from investporto.plan_lock import PlanLock
+from investporto.portfolio_plan_cli import Portfolio
+from investporto.shell_cli import PortfolioShell
+from investporto.types_and_vars import portfolio_plan_name
+
+plan = {
+    "name": "entry",
+    "children": [{"name": "stocks", "percentage": 70}],
+}
+
+
+@pytest.fixture
+def project_plan(tmp_path):
+    path = tmp_path / portfolio_plan_name
+    path.write_text(yaml.dump(plan))
+    return path
+
+
+def children_of(project_plan) -> list:
+    with Portfolio(project_plan, read_only=True) as p:
+        return [node.name for node in p._plan.children]
+
+
+def test_shared_and_exclusive_locks(project_plan):
+    reader, other_reader, writer = (PlanLock(project_plan) for _ in range(3))
+    assert reader.acquire(shared=True)
+    assert other_reader.acquire(shared=True, blocking=False)
+    assert not writer.acquire(blocking=False)
+    reader.release()
+    other_reader.release()
+    assert writer.acquire(blocking=False)
+    assert not reader.acquire(shared=True, blocking=False)
+    writer.release()
+
+
+def test_readers_run_alongside_each_other(project_plan):
+    with Portfolio(project_plan, read_only=True) as first:
+        # A second reader does not wait for the first one
+        with Portfolio(project_plan, read_only=True) as second:
+            assert first._plan.children[0].name == second._plan.children[0].name
+        # A writer does
+        assert not PlanLock(project_plan).acquire(blocking=False)
+        # Readers never save
+        first.add("bonds", 30)
+    assert children_of(project_plan) == ["stocks"]
+
+
+def test_writers_are_serialized(project_plan):
+    opened, release, done = threading.Event(), threading.Event(), threading.Event()
+    seen = []
+
+    def first_writer():
+        with Portfolio(project_plan) as p:
+            opened.set()
+            release.wait(5)
+            p.add("bonds", 30)
+
+    def second_writer():
+        opened.wait(5)
+        with Portfolio(project_plan) as p:
+            seen.extend(node.name for node in p._plan.children)
+            p.add("cash", 0.5)
+        done.set()
+
+    threads = [
+        threading.Thread(target=first_writer),
+        threading.Thread(target=second_writer),
+    ]
+    for thread in threads:
+        thread.start()
+    # The second writer waits for the first one to be done
+    time.sleep(0.1)
+    assert not done.is_set()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert seen == ["stocks", "bonds"]
+    assert children_of(project_plan) == ["stocks", "bonds", "cash"]
+    # Without optimistic concurrency, no version is written
+    assert "version" not in yaml.safe_load(project_plan.read_text())
+
+
+def test_optimistic_writers_replay_on_conflict(project_plan):
+    first = Portfolio(project_plan, optimistic=True)
+    second = Portfolio(project_plan, optimistic=True)
+    first.open()
+    second.open()
+    # Both are open at once: the lock is only held to load and save
+    lock = PlanLock(project_plan)
+    assert lock.acquire(blocking=False)
+    lock.release()
+    first.add("bonds", 20)
+    second.add("cash", 10)
+    second.add("stocks", 70)
+    first.close()
+    assert yaml.safe_load(project_plan.read_text())["version"] == 1
+    # The edits of the second writer are replayed on the plan of the first
+    second.close()
+    assert children_of(project_plan) == ["stocks", "bonds", "cash"]
+    assert yaml.safe_load(project_plan.read_text())["version"] == 2
+    with Portfolio(project_plan, read_only=True) as p:
+        assert p.invalid_allocations() == []
+
+
+def test_rejected_edits_are_not_replayed(project_plan, capsys):
+    with PortfolioShell(project_plan, flush_delay=60) as shell:
+        shell.execute("add crypto -p 300")
+        shell.execute("add cash -p 5")
+        # A concurrent writer saves meanwhile: the shell edits are replayed
+        with Portfolio(project_plan) as p:
+            p.add("bonds", 25)
+    assert "percentage = 300.0 is not allowed" in capsys.readouterr().out
+    assert children_of(project_plan) == ["stocks", "bonds", "cash"]
+
+
+def test_optimistic_replay_failure_saves_nothing(project_plan):
+    first = Portfolio(project_plan, optimistic=True)
+    second = Portfolio(project_plan, optimistic=True)
+    first.open()
+    second.open()
+    first.remove("stocks")
+    second.add_node("stocks/tech", 100)
+    first.close()
+    with pytest.raises(TypeError, match="stocks has to be added before tech"):
+        second.commit()
+    assert children_of(project_plan) == []
+    # Without conflict, nothing is replayed
+    with Portfolio(project_plan, optimistic=True) as p:
+        p.add("bonds", 100)
+    assert children_of(project_plan) == ["bonds"]
@@ -0,0 +1,61 @@
+import io
+import pytest
+from rich.console import Console
+from investporto.plan_render import PlanRenderer, walk_plan
+from investporto.plan_tree import PlanNode
+
+plan = {
+    "name": "entry",
+    "children": [
+        {
+            "name": "stocks",
+            "percentage": 70,
+            "children": [
+                {"name": "large_caps", "percentage": 50},
+                {"name": "small_caps", "percentage": 40},
+            ],
+        },
+        {"name": "bonds", "percentage": 30},
+    ],
+}
+
+
+def render(method: str, terminal: bool, **arguments) -> str:
+    output = io.StringIO()
+    console = Console(file=output, force_terminal=terminal, color_system="standard")
+    root = PlanNode.from_dict(plan)
+    getattr(PlanRenderer(console), method)(root, {"stocks"}, **arguments)
+    return output.getvalue()
+
+
+def test_walk_plan():
+    root = PlanNode.from_dict(plan)
+    assert [(prefix, path) for prefix, _, path, _ in walk_plan(root)] == [
+        ("", ""),
+        ("├── ", "stocks"),
+        ("│   ├── ", "stocks/large_caps"),
+        ("│   └── ", "stocks/small_caps"),
+        ("└── ", "bonds"),
+    ]
+
+
+def test_plain_rendering_limits():
+    assert render("visualize", False, max_depth=1) == (
+        "entry\n├── ( stocks , 70 )\n└── ( bonds , 30 )\n"
+    )
+    stocks = PlanNode.from_dict(plan).child("stocks")
+    output = io.StringIO()
+    PlanRenderer(Console(file=output)).visualize(stocks, set(), "stocks")
+    assert output.getvalue() == (
+        "( stocks , 70 )\n├── ( large_caps , 50 )\n└── ( small_caps , 40 )\n"
+    )
+
+
+def test_terminal_rendering_has_colors():
+    output = render("check", True)
+    # red for the stocks, green for the entry
+    assert "\x1b[31mstocks -> allocation error!" in output
+    assert "\x1b[32mentry -> ok!" in output
+    output = render("visualize", True)
+    assert "\x1b[31m( stocks , 70 )" in output
+    assert "large_caps" in output
@@ -0,0 +1,76 @@
+import pickle
+import pytest
+from anytree import RenderTree
+from anytree.exporter import DictExporter
+from anytree.importer import DictImporter
+from investporto.plan_tree import PlanNode
+
+plan = {
+    "name": "entry",
+    "budget": 1000.0,
+    "children": [
+        {
+            "name": "stocks",
+            "percentage": 70,
+            "currency": "EUR",
+            "children": [{"name": "large_caps", "percentage": 100}],
+        },
+        {"name": "bonds", "percentage": 30},
+    ],
+}
+
+
+def test_dict_round_trip():
+    root = PlanNode.from_dict(plan)
+    assert root.to_dict() == plan
+    # Compatible with the anytree importer/exporter
+    assert DictExporter().export(DictImporter().import_(root.to_dict())) == plan
+
+
+def test_tree_navigation():
+    root = PlanNode.from_dict(plan)
+    stocks = root.child("stocks")
+    large_caps = stocks.child("large_caps")
+    assert [node.name for node in root.children] == ["stocks", "bonds"]
+    assert large_caps.parent is stocks
+    assert large_caps.path == (root, stocks, large_caps)
+    assert large_caps.depth == 2
+    assert stocks.extra == {"currency": "EUR"}
+    assert [node.name for node in root.descendants] == [
+        "stocks",
+        "large_caps",
+        "bonds",
+    ]
+    assert root.child("etfs") is None
+    # Compatible with the anytree rendering
+    assert [node.name for _, _, node in RenderTree(root)] == [
+        "entry",
+        "stocks",
+        "large_caps",
+        "bonds",
+    ]
+
+
+def test_tree_modification():
+    root = PlanNode.from_dict(plan)
+    bonds = root.child("bonds")
+    # Detach
+    bonds.parent = None
+    assert root.child("bonds") is None
+    assert bonds.is_root
+    # Attach elsewhere and rename
+    bonds.parent = root.child("stocks")
+    bonds.name = "corporate_bonds"
+    assert root.child("stocks").child("corporate_bonds") is bonds
+    # Siblings have unique names and no loop can be built
+    with pytest.raises(ValueError):
+        PlanNode("large_caps", root.child("stocks"))
+    with pytest.raises(ValueError):
+        root.parent = bonds
+    # Leaves do not keep any children container
+    assert bonds.is_leaf and bonds._children is None
+
+
+def test_pickle():
+    root = PlanNode.from_dict(plan)
+    assert pickle.loads(pickle.dumps(root)).to_dict() == plan
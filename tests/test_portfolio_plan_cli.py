@@ -3,7 +3,9 @@ from investporto.portfolio_plan_cli import Portfolio, portfolio_plan
 from click.testing import CliRunner, Result
 from pathlib import Path
 import collections
+import os
 from investporto.types_and_vars import portfolio_plan_name
+from investporto.plan_cache import PlanCache
 
 file_content = """
 'name': 'entry'
@@ -94,6 +96,13 @@ def test_portfolio_tree_allocate_budget(create_dummy_project):
     portfolio.open()
     assert portfolio._plan.budget == 200.0
     portfolio.close()
+    # With the currency of the budget
+    with portfolio as p:
+        assert p.currency is None
+        p.allocate_budget(200.0, "eur")
+    portfolio.open()
+    assert portfolio.currency == "EUR"
+    portfolio.close()
 
 
 def test_portfolio_tree_class_empty_start(create_dummy_project):
@@ -267,3 +276,373 @@ def test_validate_allocation(create_dummy_project, capsys):
         captured.out
         == "entry -> ok!\n├── etfs -> ok!\n└── stocks -> allocation error!\n"
     )
+
+
+def test_apply_batch(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    portfolio = Portfolio(project_plan)
+    operations = [
+        {"op": "allocate_budget", "budget": 1000},
+        {"op": "add", "asset_class_name": "bonds", "percentage": 10},
+        {"op": "remove", "asset_class_name": "etfs"},
+    ]
+    with portfolio as p:
+        assert p.apply_batch(operations) == 3
+    # Verify that all the operations were saved
+    with portfolio as p:
+        assert p._plan.budget == 1000
+        assert sorted(node.name for node in p._plan.children) == ["bonds", "stocks"]
+
+
+def test_apply_batch_rejects_unknown_operation(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    portfolio = Portfolio(project_plan)
+    operations = [
+        {"op": "add", "asset_class_name": "bonds", "percentage": 10},
+        {"op": "rename", "asset_class_name": "etfs"},
+    ]
+    with portfolio as p:
+        with pytest.raises(TypeError):
+            p.apply_batch(operations)
+        # Nothing may have been applied
+        assert "bonds" not in [node.name for node in p._plan.children]
+
+
+def test_apply_batch_rejects_bad_budget(create_dummy_project):
+    _, _, project_plan = create_dummy_project
+    content = project_plan.read_text()
+    for budget in ("a lot", None, True):
+        operations = [
+            {"op": "add", "asset_class_name": "bonds", "percentage": 10},
+            {"op": "allocate_budget", "budget": budget},
+        ]
+        with pytest.raises(TypeError, match="operation 2 .* is not a number"):
+            with Portfolio(project_plan) as p:
+                p.apply_batch(operations)
+    # An operation failing while applied leaves the plan unsaved as well
+    operations = [
+        {"op": "allocate_budget", "budget": 1000},
+        {"op": "add", "asset_class_name": "bonds", "percentage": 10},
+        {"op": "add", "asset_class_name": "cash", "percentage": 300},
+    ]
+    with pytest.raises(TypeError, match="percentage = 300"):
+        with Portfolio(project_plan) as p:
+            p.apply_batch(operations)
+    assert project_plan.read_text() == content
+
+
+def test_apply_batch_rejects_bad_percentage(create_dummy_project):
+    _, _, project_plan = create_dummy_project
+    content = project_plan.read_text()
+    for operation in (
+        {"op": "add", "asset_class_name": "bonds", "percentage": "ten"},
+        {"op": "add_node", "path": "stocks/tech", "percentage": True},
+        {"op": "move_node", "path": "etfs", "new_parent": "stocks", "percentage": []},
+        {
+            "op": "add",
+            "asset_class_name": "bonds",
+            "asset_class_allocation_name": "government",
+            "allocation_percentage": "all",
+        },
+    ):
+        with pytest.raises(TypeError, match="operation 2 .* is not a number"):
+            with Portfolio(project_plan) as p:
+                p.apply_batch([{"op": "allocate_budget", "budget": 1000}, operation])
+    assert project_plan.read_text() == content
+
+
+def test_apply_cli_rejects_malformed_operations(create_dummy_project):
+    runner, project_path, _ = create_dummy_project
+    content = (project_path / portfolio_plan_name).read_text()
+    for operations, message in (
+        ("- op: add\n  asset_class_name: [bonds\n", "not valid yaml"),
+        ("- op: add\n  asset_class_name: bonds\n  percentage: ten\n", "not a number"),
+    ):
+        result = runner.invoke(
+            portfolio_plan, ["apply", "-pp", str(project_path)], input=operations
+        )
+        assert result.exit_code == os.EX_DATAERR
+        assert message in result.output
+        assert "not supported" not in result.output
+    assert (project_path / portfolio_plan_name).read_text() == content
+
+
+def test_apply_cli_from_stdin(create_dummy_project):
+    runner, project_path, _ = create_dummy_project
+    operations = """
+- op: add
+  asset_class_name: Bonds
+  percentage: 10
+- op: add
+  asset_class_name: bonds
+  asset_class_allocation_name: government
+  allocation_percentage: 100
+"""
+    result = runner.invoke(
+        portfolio_plan, ["apply", "-pp", str(project_path)], input=operations
+    )
+    assert result.exit_code == 0
+    assert "2 operations applied" in result.output
+    with Portfolio(project_path / portfolio_plan_name) as p:
+        bonds = [node for node in p._plan.children if node.name == "bonds"][0]
+        assert bonds.children[0].name == "government"
+
+
+def test_unchanged_plan_is_not_saved(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    mtime_before = project_plan.stat().st_mtime_ns
+    # Read only access
+    with Portfolio(project_plan) as p:
+        p.visualize_allocation()
+        p.add("stocks", 70)
+    # Neither content nor mtime may have changed
+    assert project_plan.stat().st_mtime_ns == mtime_before
+    with open(project_plan, "r") as portfolio_plan_file:
+        assert portfolio_plan_file.read() == file_content
+
+
+def test_plan_is_not_saved_on_error(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    with pytest.raises(TypeError):
+        with Portfolio(project_plan) as p:
+            p.add("bonds", 10)
+            p.add("crypto", 200)
+    # The first modification was dropped together with the failing one
+    with open(project_plan, "r") as portfolio_plan_file:
+        assert portfolio_plan_file.read() == file_content
+
+
+def test_save_is_atomic(create_dummy_project):
+    # Project opening
+    _, project_path, project_plan = create_dummy_project
+    with Portfolio(project_plan) as p:
+        p.add("bonds", 10)
+    # Only the plan (and its lock) remains, no temporary file
+    assert sorted(path.name for path in project_path.iterdir()) == [
+        f".{project_plan.name}.lock",
+        project_plan.name,
+    ]
+    with Portfolio(project_plan) as p:
+        assert "bonds" in [node.name for node in p._plan.children]
+
+
+def test_plan_cache(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    # Cold load creates the snapshot
+    with Portfolio(project_plan, use_cache=True) as p:
+        assert len(p._plan.children) == 2
+    cache = PlanCache(project_plan)
+    assert cache.path.is_file()
+    # Warm load reads the snapshot and a save refreshes it
+    with Portfolio(project_plan, use_cache=True) as p:
+        assert len(p._plan.children) == 2
+        p.add("bonds", 10)
+    with Portfolio(project_plan, use_cache=True) as p:
+        assert len(p._plan.children) == 3
+    # An edit of the yaml file outside of investporto invalidates the snapshot
+    with open(project_plan, "w") as portfolio_plan_file:
+        portfolio_plan_file.write(file_content)
+    with Portfolio(project_plan, use_cache=True) as p:
+        assert len(p._plan.children) == 2
+
+
+def test_path_index(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    portfolio = Portfolio(project_plan)
+    with portfolio as p:
+        assert sorted(p._index) == [
+            "etfs",
+            "etfs/big_market_caps",
+            "stocks",
+            "stocks/big_market_caps",
+            "stocks/mid_market_caps",
+        ]
+        # A wide subclass
+        for number in range(1000):
+            p.add("bonds", 10, f"bond_{number}", 0.1)
+        assert p._index["bonds/bond_999"].parent is p._index["bonds"]
+        # Removing a class drops its whole subtree
+        p.remove("stocks")
+        assert not [path for path in p._index if path.startswith("stocks")]
+    # The index is rebuilt consistently on the next open
+    with portfolio as p:
+        assert len(p._index) == 2 + 1 + 1000
+        assert p._index["bonds/bond_10"].percentage == 0.1
+
+
+def test_incremental_allocation_validation(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    with Portfolio(project_plan) as p:
+        assert p.invalid_allocations() == [("stocks", 90.0)]
+        # Fix the stocks, break the etfs
+        p.add("stocks", None, "mid_market_caps", 50)
+        p.add("etfs", None, "small_market_caps", 10)
+        assert p.invalid_allocations() == [("etfs", 110.0)]
+        # Thirds without spurious rounding errors
+        p.add("bonds", 10, "a", 33.3)
+        p.add("bonds", None, "b", 33.3)
+        p.add("bonds", None, "c", 33.4)
+        p.remove("etfs", "small_market_caps")
+        assert p.invalid_allocations() == [("", 110.0)]
+        p.remove("bonds")
+        assert p.invalid_allocations() == []
+
+
+def test_validate_on_write(create_dummy_project):
+    # Project opening
+    _, _, project_plan = create_dummy_project
+    with pytest.raises(TypeError, match="allocation errors in: stocks"):
+        with Portfolio(project_plan, validate_on_write=True) as p:
+            p.add("bonds", 10)
+            p.add("etfs", 20)
+    with Portfolio(project_plan, validate_on_write=True) as p:
+        p.add("stocks", None, "mid_market_caps", 50)
+    with Portfolio(project_plan) as p:
+        assert p.invalid_allocations() == []
+
+
+def test_validate_on_write_cli(create_dummy_project, monkeypatch):
+    runner, project_path, project_plan = create_dummy_project
+    monkeypatch.setenv("INVESTPORTO_VALIDATE_ON_WRITE", "1")
+    content = project_plan.read_text()
+    # The dummy plan has allocation errors (stocks subclasses sum up to 90%)
+    for arguments in (
+        ["add-asset-class", "bonds", "-p", "10"],
+        ["remove-asset-class", "etfs"],
+        ["add-node", "etfs/world", "-p", "100"],
+        ["allocate-budget", "1000"],
+    ):
+        result = runner.invoke(portfolio_plan, arguments + ["-pp", str(project_path)])
+        assert result.exit_code == os.EX_DATAERR
+        assert "Not saved: allocation errors in:" in result.output
+    assert project_plan.read_text() == content
+
+
+def test_verify_allocation_errors_only(create_dummy_project):
+    runner, project_path, _ = create_dummy_project
+    result = runner.invoke(
+        portfolio_plan, ["verify-allocation", "--errors-only", "-pp", str(project_path)]
+    )
+    assert result.exit_code == os.EX_DATAERR
+    assert result.output == "stocks -> allocation error! (90.0%)\n"
+
+
+def test_target_amounts(create_dummy_project):
+    runner, project_path, project_plan = create_dummy_project
+    with Portfolio(project_plan) as p:
+        p.allocate_budget(1000)
+        targets = p.compute_targets().set_index("path")
+        assert targets.loc["stocks/mid_market_caps", "target_amount"] == pytest.approx(
+            280.0
+        )
+    result = runner.invoke(
+        portfolio_plan, ["target-amounts", "--leaves-only", "-pp", str(project_path)]
+    )
+    assert result.exit_code == 0
+    assert [line.split()[0] for line in result.output.splitlines()[1:]] == [
+        "etfs/big_market_caps",
+        "stocks/big_market_caps",
+        "stocks/mid_market_caps",
+    ]
+
+
+def test_import_plan(create_dummy_project):
+    runner, project_path, project_plan = create_dummy_project
+    table = project_path / "plan.csv"
+    table.write_text(
+        "path,percentage,budget\n"
+        "Stocks/Large Caps,60,\n"
+        "stocks,70,4000\n"
+        "stocks/small_caps,40,\n"
+        "bonds,30,\n"
+    )
+    result = runner.invoke(
+        portfolio_plan, ["import-plan", str(table), "-pp", str(project_path)]
+    )
+    assert result.exit_code == 0, result.output
+    assert "4 nodes imported" in result.output
+    with Portfolio(project_plan) as p:
+        assert p._plan.budget == 4000
+        assert [node.name for node in p._plan.children] == ["stocks", "bonds"]
+        assert p._index["stocks/large_caps"].percentage == 60
+        assert p.invalid_allocations() == []
+    # Invalid tables leave the plan untouched
+    table.write_text("path,percentage\nstocks,70\nbonds,20\n")
+    result = runner.invoke(
+        portfolio_plan, ["import-plan", str(table), "-pp", str(project_path)]
+    )
+    assert result.exit_code == os.EX_DATAERR
+    assert "entry: children sum up to 90.0%" in result.output
+    with Portfolio(project_plan) as p:
+        assert len(p._index) == 4
+
+
+def test_path_operations(create_dummy_project):
+    _, _, project_plan = create_dummy_project
+    with Portfolio(project_plan) as p:
+        p.add_node("Stocks/Big_Market_Caps/Tech", 60)
+        p.add_node("stocks/big_market_caps/tech/aapl", 100)
+        p.add_node("stocks/big_market_caps/health", 40)
+        assert p.get_node("/stocks/big_market_caps/tech/aapl/").percentage == 100
+        assert p.get_node("") is p._plan
+        assert p.get_node("stocks/nothing") is None
+        with pytest.raises(TypeError, match="has to be added before"):
+            p.add_node("bonds/government", 100)
+        # A whole subtree changes of parent, the nodes are not copied
+        tech = p.get_node("stocks/big_market_caps/tech")
+        p.move_node("stocks/big_market_caps/tech", "etfs", 20)
+        assert p.get_node("etfs/tech") is tech
+        assert p.get_node("etfs/tech/aapl").parent is tech
+        assert p.get_node("stocks/big_market_caps/tech/aapl") is None
+        assert p.invalid_allocations() == [
+            ("etfs", 120.0),
+            ("stocks", 90.0),
+            ("stocks/big_market_caps", 40.0),
+        ]
+        with pytest.raises(TypeError, match="below itself"):
+            p.move_node("etfs", "etfs/tech")
+        with pytest.raises(TypeError, match="has already a big_market_caps"):
+            p.move_node("etfs/big_market_caps", "stocks")
+        p.remove_node("etfs/tech")
+        assert [path for path in p._index if path.startswith("etfs")] == [
+            "etfs",
+            "etfs/big_market_caps",
+        ]
+        p.move_node("stocks/big_market_caps/health", "")
+    with Portfolio(project_plan) as p:
+        assert p.get_node("health").percentage == 40
+        assert p.invalid_allocations() == [
+            ("", 140.0),
+            ("stocks", 90.0),
+        ]
+
+
+def test_path_operations_cli(create_dummy_project):
+    runner, project_path, project_plan = create_dummy_project
+    for arguments in (
+        ["add-node", "stocks/mid_market_caps/Tech Stocks", "-p", "100"],
+        ["move-node", "stocks/mid_market_caps", "--to", "etfs", "-p", "50"],
+        ["remove-node", "etfs/big_market_caps"],
+    ):
+        result = runner.invoke(portfolio_plan, arguments + ["-pp", str(project_path)])
+        assert result.exit_code == 0, result.output
+    with Portfolio(project_plan) as p:
+        assert sorted(p._index) == [
+            "etfs",
+            "etfs/mid_market_caps",
+            "etfs/mid_market_caps/tech_stocks",
+            "stocks",
+            "stocks/big_market_caps",
+        ]
+    result = runner.invoke(
+        portfolio_plan, ["add-node", "bonds/gov", "-p", "10", "-pp", str(project_path)]
+    )
+    assert result.exit_code == os.EX_DATAERR
+    assert "bonds has to be added before gov" in result.output
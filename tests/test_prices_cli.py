@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from datetime import date
+from investporto.prices_cli import PriceStore, prices
+from investporto.types_and_vars import prices_folder_name
+
+
+def test_update_and_history(tmp_path):
+    store = PriceStore(tmp_path)
+    days = np.array(["2022-01-03", "2022-01-04", "2022-01-06"], dtype="datetime64[D]")
+    store.update("aapl", days, [1.0, 2.0, 4.0])
+    price_file = tmp_path / prices_folder_name / "AAPL.f64"
+    assert price_file.stat().st_size == 4 * 8
+    # Appending a day only grows the file, a correction is written in place
+    store.update("AAPL", np.array(["2022-01-07"], dtype="datetime64[D]"), [5.0])
+    store.update("AAPL", np.array(["2022-01-05"], dtype="datetime64[D]"), [3.0])
+    assert price_file.stat().st_size == 5 * 8
+    # Reloaded from the disk
+    store = PriceStore(tmp_path)
+    history_days, history = store.history("aapl", date(2022, 1, 4), date(2022, 1, 6))
+    assert isinstance(history, np.memmap)
+    assert history.tolist() == [2.0, 3.0, 4.0]
+    assert str(history_days[0]) == "2022-01-04"
+    # Days before the first one
+    store.update("AAPL", np.array(["2022-01-01"], dtype="datetime64[D]"), [0.5])
+    _, history = store.history("AAPL")
+    assert history[0] == 0.5 and np.isnan(history[1]) and history[-1] == 5.0
+
+
+def test_latest(tmp_path):
+    store = PriceStore(tmp_path)
+    store.update_many(
+        pd.DataFrame(
+            {
+                "date": ["2022-01-03", "2022-01-10", "2022-01-03"],
+                "symbol": ["aapl", "aapl", "vti"],
+                "price": [1.0, 2.0, 10.0],
+            }
+        )
+    )
+    latest = store.latest(["AAPL", "VTI", "MSFT"])
+    assert latest["AAPL"] == 2.0
+    assert latest["VTI"] == 10.0
+    assert np.isnan(latest["MSFT"])
+    assert store.latest(["AAPL"], date(2022, 1, 9))["AAPL"] == 1.0
+    # Out of the lookback window
+    assert np.isnan(store.latest(["VTI"], date(2022, 3, 1))["VTI"])
+
+
+def test_commands(tmp_path):
+    csv_file = tmp_path / "prices.csv"
+    csv_file.write_text("date,symbol,price\n2022-01-03,aapl,1.5\n2022-01-05,aapl,2\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        prices, ["import-prices", str(csv_file), "-pp", str(tmp_path)]
+    )
+    assert "2 prices imported" in result.output
+    result = runner.invoke(prices, ["price-history", "aapl", "-pp", str(tmp_path)])
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 3
+    csv_file.write_text("date,symbol\n2022-01-03,aapl\n")
+    result = runner.invoke(
+        prices, ["import-prices", str(csv_file), "-pp", str(tmp_path)]
+    )
+    assert "Missing columns: price" in result.output
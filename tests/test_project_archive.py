@@ -0,0 +1,148 @@
+import os
+import pytest
+import shutil
+import pyzipper
+from pathlib import Path
+from investporto import project_archive
+from investporto.project_archive import extract_archive, write_archive
+
+files = {
+    "porto_plan.yaml": b"name: entry\n",
+    "prices/history.csv": b"2022-01-03,aapl,182.01\n" * 2000,
+    "prices/history.csv.gz": os.urandom(4096),
+    "notes/why.txt": b"because",
+}
+
+
+@pytest.fixture
+def project(tmp_path):
+    project = tmp_path / "project"
+    for name, content in files.items():
+        (project / name).parent.mkdir(parents=True, exist_ok=True)
+        (project / name).write_bytes(content)
+    return project
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_archive_round_trip(project, monkeypatch, jobs):
+    # Force the process pool even for a small project
+    monkeypatch.setattr(project_archive, "parallel_threshold", 0)
+    archive_path = project.parent / "project.zip"
+    write_archive(project, archive_path, "abcd", jobs=jobs)
+    with pyzipper.AESZipFile(archive_path) as archive:
+        infos = {info.filename: info for info in archive.infolist()}
+        assert sorted(infos) == sorted(files)
+        # Only the big uncompressed file is deflated (all are encrypted)
+        assert infos["prices/history.csv"].compress_size < 4096
+        assert infos["prices/history.csv.gz"].compress_size > 4096
+    destination = project.parent / "extracted"
+    extract_archive(archive_path, destination, "abcd", jobs=jobs)
+    for name, content in files.items():
+        assert (destination / name).read_bytes() == content
+
+
+def test_extract_some_members(project):
+    archive_path = project.parent / "project.zip"
+    write_archive(project, archive_path, "abcd")
+    destination = project.parent / "extracted"
+    extract_archive(archive_path, destination, "abcd", members=["porto_plan.yaml"])
+    assert [path.name for path in destination.iterdir()] == ["porto_plan.yaml"]
+
+
+def test_wrong_password(project):
+    archive_path = project.parent / "project.zip"
+    write_archive(project, archive_path, "abcd")
+    with pytest.raises(RuntimeError):
+        extract_archive(archive_path, project.parent / "extracted", "wrong")
+
+
+@pytest.mark.parametrize("name", ["../outside.txt", "notes/../../outside.txt"])
+def test_member_outside_of_the_destination(tmp_path, name):
+    archive_path = tmp_path / "crafted.zip"
+    with pyzipper.AESZipFile(archive_path, "w", encryption=pyzipper.WZ_AES) as archive:
+        archive.setpassword(b"abcd")
+        archive.writestr("porto_plan.yaml", b"name: entry\n")
+        archive.writestr(name, b"overwritten")
+    destination = tmp_path / "extracted"
+    with pytest.raises(ValueError, match="outside of"):
+        extract_archive(archive_path, destination, "abcd")
+    # Nothing is extracted, even the safe members
+    assert not (tmp_path / "outside.txt").exists()
+    assert not destination.exists()
+
+
+def object_names(archive_path: Path) -> set:
+    with pyzipper.AESZipFile(archive_path) as archive:
+        return {name for name in archive.namelist() if name.startswith("objects/")}
+
+
+def test_incremental_close(project, monkeypatch):
+    archive_path = project_archive.archive_project(project, "abcd")
+    shutil.rmtree(project)
+    objects = object_names(archive_path)
+    assert len(objects) == len(files)
+    # Reopen, change one file
+    project_archive.restore_project(archive_path, "abcd")
+    assert not archive_path.exists()
+    (project / "notes" / "why.txt").write_bytes(b"because of the dividends")
+    (project / "porto_plan.yaml").unlink()
+    # Only the modified file is read again
+    hashed = []
+    file_hash = project_archive.file_hash
+    monkeypatch.setattr(
+        project_archive,
+        "file_hash",
+        lambda path: hashed.append(path) or file_hash(path),
+    )
+    project_archive.archive_project(project, "abcd")
+    shutil.rmtree(project)
+    assert [Path(path).name for path in hashed] == ["why.txt"]
+    assert len(object_names(archive_path) - objects) == 1
+    # The deleted file is gone, the modified one up to date
+    project_archive.restore_project(archive_path, "abcd")
+    assert not (project / "porto_plan.yaml").exists()
+    assert (project / "notes" / "why.txt").read_bytes() == b"because of the dividends"
+    assert (project / "prices" / "history.csv").read_bytes() == files[
+        "prices/history.csv"
+    ]
+
+
+def test_partial_open(project):
+    archive_path = project_archive.archive_project(project, "abcd")
+    shutil.rmtree(project)
+    project_archive.restore_project(archive_path, "abcd", only=["*.yaml"])
+    assert not (project / "prices").exists()
+    (project / "porto_plan.yaml").write_bytes(b"name: entry\nbudget: 10\n")
+    # Closing keeps the files which were not extracted
+    project_archive.archive_project(project, "abcd")
+    shutil.rmtree(project)
+    project_archive.restore_project(archive_path, "abcd", only=["porto_plan.yaml"])
+    assert project_archive.fetch_files(project, "abcd", ["prices/*"]) == [
+        "prices/history.csv",
+        "prices/history.csv.gz",
+    ]
+    assert (project / "porto_plan.yaml").read_bytes() == b"name: entry\nbudget: 10\n"
+    assert (project / "prices" / "history.csv.gz").read_bytes() == files[
+        "prices/history.csv.gz"
+    ]
+    assert not (project / "notes").exists()
+
+
+def test_compaction(project):
+    archive_path = project_archive.archive_project(project, "abcd")
+    for number in range(3):
+        shutil.rmtree(project)
+        project_archive.restore_project(archive_path, "abcd")
+        (project / "prices" / "history.csv.gz").write_bytes(os.urandom(4096))
+        project_archive.archive_project(project, "abcd")
+    # The replaced contents were dropped
+    assert len(object_names(archive_path)) <= len(files) + 1
+
+
+def test_plain_archive_is_still_supported(project):
+    archive_path = project.parent / "project.zip"
+    write_archive(project, archive_path, "abcd")
+    shutil.rmtree(project)
+    project_archive.restore_project(archive_path, "abcd")
+    for name, content in files.items():
+        assert (project / name).read_bytes() == content
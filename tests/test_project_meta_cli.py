@@ -82,3 +82,26 @@ def test_open_a_project():
         assert (project_path / portfolio_plan_name).is_file()
         for number in range(5):
             assert Path(project_path / (str(number) + "file.csv")).is_file()
+
+
+def test_partial_open_and_fetch():
+    """Open only the plan, fetch the rest later"""
+    runner = CliRunner()
+    project_path = Path("temp/test1")
+    # Run test isolated
+    with runner.isolated_filesystem():
+        create_dummy_project(runner, project_path)
+        runner.invoke(project_meta, ["close", "--password=abcd", str(project_path)])
+        result = runner.invoke(
+            project_meta,
+            ["open", "--password=abcd", "--only=*.yaml", f"{project_path}.zip"],
+        )
+        assert result.exit_code == os.EX_OK
+        assert (project_path / portfolio_plan_name).is_file()
+        assert not Path(project_path / "0file.csv").is_file()
+        result = runner.invoke(
+            project_meta, ["fetch", "--password=abcd", str(project_path), "*.csv"]
+        )
+        assert result.exit_code == os.EX_OK
+        for number in range(5):
+            assert Path(project_path / (str(number) + "file.csv")).is_file()
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+from investporto.plan_analytics import compute_targets
+from investporto.plan_tree import PlanNode
+from investporto.rebalance import greedy_fill, rebalance_orders
+
+plan = {
+    "name": "entry",
+    "children": [
+        {"name": "stocks", "percentage": 60},
+        {"name": "bonds", "percentage": 30},
+        {"name": "gold", "percentage": 10},
+    ],
+}
+
+
+def positions_of(rows):
+    positions = pd.DataFrame(
+        rows, columns=["symbol", "path", "quantity", "last_price", "lot_size"]
+    )
+    return positions.assign(value=positions["quantity"] * positions["last_price"])
+
+
+@pytest.fixture
+def targets():
+    return compute_targets(PlanNode.from_dict(plan))
+
+
+def test_greedy_fill():
+    filled = greedy_fill(np.array([10.0, 30.0, 20.0]), 45.0)
+    assert filled.tolist() == [0.0, 30.0, 15.0]
+
+
+def test_rebalance_within_tolerance(targets):
+    positions = positions_of(
+        [
+            ["AAPL", "stocks", 61, 10.0, 1.0],
+            ["BND", "bonds", 29, 10.0, 1.0],
+            ["GLD", "gold", 10, 10.0, 1.0],
+        ]
+    )
+    orders, left = rebalance_orders(targets, positions, tolerance=0.02)
+    assert orders.empty
+    assert left == 0.0
+
+
+def test_rebalance_sells_and_buys(targets):
+    positions = positions_of(
+        [
+            ["AAPL", "stocks", 40, 10.0, 1.0],
+            ["MSFT", "stocks", 20, 20.0, 1.0],
+            ["BND", "bonds", 10, 10.0, 5.0],
+            ["GLD", "gold", 5, 10.0, 1.0],
+            # Outside of the plan: counted in the total, never traded
+            ["XYZ", None, 5, 10.0, 1.0],
+        ]
+    )
+    # Total 1000: stocks 800 -> 600, bonds 100 -> 300, gold 50 -> 100
+    orders, left = rebalance_orders(targets, positions, tolerance=0.01)
+    orders = orders.set_index("symbol")
+    assert orders.loc["AAPL", "side"] == "sell"
+    assert orders.loc["AAPL", "quantity"] == 10
+    assert orders.loc["MSFT", "quantity"] == 5
+    # Lots of 5 units
+    assert orders.loc["BND", "side"] == "buy"
+    assert orders.loc["BND", "quantity"] == 20
+    # The sales only cover the largest need
+    assert "GLD" not in orders.index
+    assert "XYZ" not in orders.index
+    assert left == pytest.approx(0.0)
+
+
+def test_rebalance_buy_only(targets):
+    positions = positions_of(
+        [
+            ["AAPL", "stocks", 60, 10.0, 1.0],
+            ["BND", "bonds", 20, 10.0, 1.0],
+            ["GLD", "gold", 20, 10.0, 1.0],
+        ]
+    )
+    # Total 1100: stocks 660 (needs 60), bonds 330 (needs 130), gold overweight
+    orders, left = rebalance_orders(targets, positions, cash=100.0, buy_only=True)
+    assert (orders["side"] == "buy").all()
+    assert orders.set_index("symbol")["quantity"].to_dict() == {"BND": 10}
+    assert left == pytest.approx(0.0)
+
+
+def test_rebalance_without_value(targets):
+    positions = positions_of(
+        [
+            ["AAPL", "stocks", 40, 10.0, 1.0],
+            ["BND", "bonds", 10, 10.0, 1.0],
+            ["GLD", "gold", 5, 10.0, 1.0],
+        ]
+    )
+    # No exchange rate for the bonds
+    positions.loc[1, ["value", "last_price"]] = np.nan
+    orders, left = rebalance_orders(targets, positions, cash=50.0)
+    # Total 500 (bonds left out): stocks 400 -> 300, gold 50 -> 50
+    assert orders.set_index("symbol")["quantity"].to_dict() == {"AAPL": 10}
+    assert np.isfinite(orders["amount"]).all()
+    assert left == pytest.approx(150.0)
+
+
+def test_rebalance_large_portfolio():
+    assets = 10000
+    root = PlanNode("entry")
+    for number in range(assets):
+        PlanNode(f"asset_{number}", root, percentage=100 / assets)
+    generator = np.random.default_rng(0)
+    positions = positions_of(
+        {
+            "symbol": [f"SYM{number}" for number in range(assets)],
+            "path": [f"asset_{number}" for number in range(assets)],
+            "quantity": generator.integers(1, 100, assets).astype(float),
+            "last_price": generator.uniform(1, 10, assets),
+            "lot_size": np.ones(assets),
+        }
+    )
+    targets = compute_targets(root)
+    orders, left = rebalance_orders(targets, positions, cash=1e5)
+    assert left >= 0
+    bought = orders.loc[orders["side"] == "buy", "amount"].sum()
+    sold = orders.loc[orders["side"] == "sell", "amount"].sum()
+    assert bought == pytest.approx(1e5 + sold - left)
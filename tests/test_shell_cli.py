@@ -0,0 +1,76 @@
+import os
+
+import pytest
+import time
+from click.testing import CliRunner
+from pathlib import Path
+from investporto.portfolio_plan_cli import Portfolio
+from investporto.shell_cli import PortfolioShell, portfolio_shell
+from investporto.types_and_vars import portfolio_plan_name
+
+file_content = """
+'name': 'entry'
+'children':
+    - 'name': 'stocks'
+      'percentage': 70
+"""
+
+
+@pytest.fixture
+def project_plan():
+    runner = CliRunner()
+    project_path = Path("temp/test1")
+    with runner.isolated_filesystem():
+        project_path.mkdir(parents=True)
+        with open(project_path / portfolio_plan_name, "w") as portfolio_plan_file:
+            portfolio_plan_file.write(file_content)
+        yield project_path / portfolio_plan_name
+
+
+def children_of(project_plan: Path) -> list:
+    with Portfolio(project_plan) as p:
+        return [node.name for node in p._plan.children]
+
+
+def test_shell_flushes_on_exit(project_plan, capsys):
+    with PortfolioShell(project_plan, flush_delay=60) as shell:
+        shell.execute("add bonds -p 30")
+        shell.execute("add stocks large_caps -p 100")
+        shell.execute("show")
+        # Nothing written yet, the plan is kept in memory
+        assert children_of(project_plan) == ["stocks"]
+    assert children_of(project_plan) == ["stocks", "bonds"]
+    assert "( large_caps , 100.0 )" in capsys.readouterr().out
+
+
+def test_shell_flushes_after_debounce(project_plan):
+    with PortfolioShell(project_plan, flush_delay=0.05) as shell:
+        shell.execute("budget 1000")
+        shell.execute("add bonds -p 30")
+        time.sleep(0.3)
+        assert children_of(project_plan) == ["stocks", "bonds"]
+
+
+def test_shell_reports_errors(project_plan, capsys):
+    with PortfolioShell(project_plan, flush_delay=60) as shell:
+        shell.execute("add crypto -p 300")
+        shell.execute("rename stocks")
+        shell.execute("help")
+    output = capsys.readouterr()
+    assert "percentage = 300.0 is not allowed" in output.out
+    assert "No such command" in output.err
+    assert "Verify the allocation" in output.out
+    assert children_of(project_plan) == ["stocks"]
+
+
+def test_shell_reports_rejected_plan_on_exit(project_plan, monkeypatch):
+    monkeypatch.setenv("INVESTPORTO_VALIDATE_ON_WRITE", "1")
+    runner = CliRunner()
+    result = runner.invoke(
+        portfolio_shell,
+        ["-pp", str(project_plan.parent.resolve())],
+        input="add bonds -p 10\nexit\n",
+    )
+    assert result.exit_code == os.EX_DATAERR
+    assert "Not saved: allocation errors in: entry" in result.output
+    assert children_of(project_plan) == ["stocks"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from investporto.simulation import (
+    SimulationModel,
+    chunk_sizes,
+    outcome_percentiles,
+    period_returns,
+    simulate,
+)
+
+
+@pytest.fixture
+def model():
+    generator = np.random.default_rng(0)
+    history = generator.normal([0.01, 0.0, 0.002], [0.05, 0.0, 0.01], (120, 3))
+    membership = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    return SimulationModel(
+        history, np.array([0.3, 0.2, 0.5]), membership, 1000.0, horizon=24
+    )
+
+
+def test_period_returns():
+    daily = np.ones((260, 2))
+    periods = period_returns(daily, 12)
+    # 21 trading days a period, the oldest days left out
+    assert periods.shape == (12, 2)
+    assert (periods == 21).all()
+    with pytest.raises(ValueError):
+        period_returns(daily[:5], 12)
+
+
+def test_chunk_sizes():
+    assert chunk_sizes(10, 2, 3, 2 * 3 * 8 * 2 * 4) == [4, 4, 2]
+    assert chunk_sizes(10, 2, 3, 1) == [1] * 10
+
+
+@pytest.mark.parametrize("model_name", ["bootstrap", "parametric"])
+def test_simulate(model, model_name):
+    model.model = model_name
+    outcomes = simulate(model, 1000, seed=1, jobs=1)
+    assert outcomes.shape == (1000, 3)
+    # The groups add up to the total, the cash asset keeps its value
+    assert outcomes[:, :2].sum(axis=1) == pytest.approx(outcomes[:, 2])
+    table = outcome_percentiles(outcomes)
+    assert table.shape == (5, 3)
+    assert (np.diff(table, axis=0) >= 0).all()
+    model.rebalance = True
+    rebalanced = simulate(model, 1000, seed=1, jobs=1)
+    assert rebalanced[:, 0] / rebalanced[:, 2] == pytest.approx(0.5)
+
+
+def test_simulate_chunks_and_processes(model):
+    small_chunks = 24 * 3 * 8 * 2 * 100
+    inline = simulate(model, 1000, seed=3, jobs=1, budget=small_chunks)
+    parallel = simulate(model, 1000, seed=3, jobs=2, budget=small_chunks)
+    # Same streams whatever the number of processes
+    assert parallel == pytest.approx(inline)
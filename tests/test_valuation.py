@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date
+from investporto.prices_cli import PriceStore
+from investporto.types_and_vars import fx_folder_name
+from investporto.valuation import FxRates, to_base_currency
+
+
+@pytest.fixture
+def rates(tmp_path):
+    store = PriceStore(tmp_path, fx_folder_name)
+    days = np.array(["2022-01-03", "2022-01-04"], dtype="datetime64[D]")
+    store.update("EURUSD", days, [1.10, 1.20])
+    store.update("USDJPY", days, [100.0, 110.0])
+    return FxRates(tmp_path)
+
+
+def test_rate(rates):
+    assert rates.rate("EUR", "EUR") == 1.0
+    assert rates.rate("EUR", "USD") == 1.20
+    assert rates.rate("EUR", "USD", date(2022, 1, 3)) == 1.10
+    assert rates.rate("JPY", "USD") == pytest.approx(1 / 110)
+    assert np.isnan(rates.rate("GBP", "USD"))
+    # Looked up once per pair and date
+    rates.rate("EUR", "USD")
+    assert rates.rate.cache_info().hits == 1
+
+
+def test_convert(rates):
+    converted = rates.convert(
+        np.array([10.0, 1100.0, 5.0, 1.0]), ["EUR", "jpy", None, "EUR"], "USD"
+    )
+    assert converted == pytest.approx([12.0, 10.0, 5.0, 1.2])
+
+
+def test_to_base_currency(rates):
+    positions = pd.DataFrame(
+        {
+            "symbol": ["SAP", "AAPL"],
+            "quantity": [2.0, 1.0],
+            "invested": [200.0, 100.0],
+            "last_price": [110.0, 120.0],
+            "value": [220.0, 120.0],
+            "currency": ["EUR", "USD"],
+        }
+    )
+    converted = to_base_currency(positions, "usd", rates)
+    assert converted["value"].tolist() == pytest.approx([264.0, 120.0])
+    assert converted["last_price"].tolist() == pytest.approx([132.0, 120.0])
+    assert (converted["currency"] == "USD").all()